@@ -3,34 +3,68 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_migrate import Migrate
 from .config import Config
+from .replica import REPLICA, RoutingSession
 from werkzeug.security import generate_password_hash, check_password_hash  # Updated hashing method
 
 
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 migrate = Migrate()
 
 
-def create_app():
+def create_app(config_class=Config):
     app = Flask(__name__)
     
     # Enable CORS for all routes
     CORS(app, resources={r"/*": {"origins": "*"}}, 
-         methods=["GET", "POST", "DELETE", "PUT", "OPTIONS"])
+         methods=["GET", "POST", "DELETE", "PUT", "OPTIONS"],
+         expose_headers=["X-Next-Cursor", "Server-Timing"])
 
     # Load configurations
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
+    app.logger.setLevel(app.config['LOG_LEVEL'])
+
+    # Pool sizing and per-connection SQLite pragmas (see app.engine)
+    from app.engine import configure_engine, engine_options, replica_binds
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    app.config['SQLALCHEMY_BINDS'] = {
+        **replica_binds(app.config),
+        **(app.config.get('SQLALCHEMY_BINDS') or {}),
+    }
 
     # Initialize extensions
     db.init_app(app)
+    # No model lives on the replica bind, it only takes reads of the primary's
+    # tables; drop the empty metadata init_app registers for it so that
+    # create_all()/drop_all() in other apps of this process (scratch databases
+    # for the bench and check commands) don't look for the bind
+    db.metadatas.pop(REPLICA, None)
     migrate.init_app(app, db)
+    configure_engine(app, db)
+
+    # Shared cache backend for the term, fee, transport and response caches
+    from app.cache import init_cache
+    init_cache(app)
 
+    # A shared cache outlives restarts; drop a fee matrix loaded before
+    # migrations or seeding
+    from app.fees import fee_schedule
+    with app.app_context():
+        fee_schedule.invalidate()
+
+    # Opt-in request timing, SQL instrumentation and /metrics (PROFILING_ENABLED)
+    from app.profiling import init_profiling
+    init_profiling(app, db)
 
     # Import and register routes
     from app.routes import routes  # Use a relative import to get the routes
     app.register_blueprint(routes)  # Register the blueprint
 
+    # Register CLI commands (flask <command>)
+    from app.commands import register_commands
+    register_commands(app)
+
 
     return app
     
\ No newline at end of file
@@ -0,0 +1,35 @@
+import csv
+import io
+import json
+
+TRUE_STRINGS = ('1', 'true', 'yes', 'y')
+
+
+def parse_batch(raw, content_type, key):
+    """
+    Turn a CSV or JSON upload into a list of line dicts.
+
+    CSV is used when the content type says so; JSON may be a bare list or an
+    object holding the list under `key`.
+    """
+    if 'csv' in (content_type or ''):
+        text = raw.decode('utf-8-sig') if isinstance(raw, bytes) else raw
+        return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+
+    data = json.loads(raw or 'null')
+    if isinstance(data, dict):
+        data = data.get(key)
+    if not isinstance(data, list):
+        raise ValueError(f"Expected a list of {key} or {{\"{key}\": [...]}}")
+    return data
+
+
+def content_type_for(path):
+    return 'text/csv' if path.lower().endswith('.csv') else 'application/json'
+
+
+def as_bool(value):
+    """Booleans from JSON or CSV cells ('true', '1', 'yes')."""
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_STRINGS
+    return bool(value)
@@ -0,0 +1,295 @@
+import os
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from app import db
+from app.diagnostics import ScratchConfig, count_queries, seed_scratch_data
+
+
+def scratch_file_config(path, **overrides):
+    """Scratch config on a file, so several threads can hold their own connections."""
+    return type(
+        'ScratchFileConfig',
+        (ScratchConfig,),
+        {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', **overrides},
+    )
+
+
+def latency_summary(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1),
+    }
+
+
+def bench_payment_import(lines=10000, students=2000):
+    """Post `lines` random payments through /payments/bulk on a scratch database."""
+    from app import create_app
+    from app.models import Student
+
+    app = create_app(ScratchConfig)
+    with app.app_context():
+        db.create_all()
+        seed_scratch_data(students)
+        admission_numbers = [
+            number for (number,) in db.session.query(Student.admission_number)
+        ]
+        batch = [{
+            "admission_number": random.choice(admission_numbers),
+            "amount": random.randint(100, 5000),
+            "method": random.choice(["mpesa", "bank", "cash"]),
+            "description": f"Statement line {i}",
+        } for i in range(lines)]
+
+        client = app.test_client()
+        with count_queries() as counter:
+            started = time.perf_counter()
+            response = client.post('/payments/bulk', json={"payments": batch})
+            elapsed = time.perf_counter() - started
+        result = response.get_json()
+        db.session.remove()
+
+    return {
+        "lines": lines,
+        "imported": result["imported"],
+        "failed": result["failed"],
+        "seconds": round(elapsed, 3),
+        "lines_per_second": round(lines / elapsed),
+        "sql_statements": counter.count,
+    }
+
+
+def bench_student_import(students=2000):
+    """Admit `students` new students through /students/bulk on a scratch database."""
+    from app import create_app
+    from app.models import Grade
+
+    app = create_app(ScratchConfig)
+    with app.app_context():
+        db.create_all()
+        seed_scratch_data(10)
+        grade_ids = [grade_id for (grade_id,) in db.session.query(Grade.id)]
+        batch = [{
+            "name": f"Intake Student {i}",
+            "admission_number": f"INTAKE{i:06d}",
+            "grade_id": random.choice(grade_ids),
+            "phone": "0700000000",
+            "is_boarding": random.random() < 0.2,
+        } for i in range(students)]
+
+        client = app.test_client()
+        with count_queries() as counter:
+            started = time.perf_counter()
+            response = client.post('/students/bulk', json={"students": batch})
+            elapsed = time.perf_counter() - started
+        result = response.get_json()
+        db.session.remove()
+
+    return {
+        "students": students,
+        "imported": result["imported"],
+        "failed": result["failed"],
+        "seconds": round(elapsed, 3),
+        "students_per_second": round(students / elapsed),
+        "sql_statements": counter.count,
+    }
+
+
+def bench_login(concurrency=20, requests=200, users=50):
+    """Time `requests` /login calls from `concurrency` threads at a scratch database."""
+    from app import create_app
+    from app.models import Student
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    try:
+        app = create_app(scratch_file_config(path))
+        with app.app_context():
+            db.create_all()
+            seed_scratch_data(users)
+            students = Student.query.all()
+            for student in students:
+                student.set_password()
+            db.session.commit()
+            admission_numbers = [student.admission_number for student in students]
+            db.session.remove()
+
+        def one_login(i):
+            client = app.test_client()
+            number = admission_numbers[i % len(admission_numbers)]
+            started = time.perf_counter()
+            response = client.post(
+                '/login', json={"identifier": number, "password": number}
+            )
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(one_login, range(requests)))
+        elapsed = time.perf_counter() - started
+    finally:
+        os.unlink(path)
+
+    result = latency_summary([latency for latency, _ in outcomes], elapsed)
+    result.update({
+        "concurrency": concurrency,
+        "hash_method": app.config['PASSWORD_HASH_METHOD'],
+        "status_codes": {
+            str(code): sum(1 for _, c in outcomes if c == code)
+            for code in {c for _, c in outcomes}
+        },
+    })
+    return result
+
+
+def bench_statements(students=2000, payments_per_student=6):
+    """Time rendering a whole school's fee statements into a zip (scratch database)."""
+    from app import create_app
+    from app.models import Student
+    from app.payments import import_payments
+    from app.statements import generate_statements
+
+    app = create_app(ScratchConfig)
+    with app.app_context():
+        db.create_all()
+        seed_scratch_data(students)
+        admission_numbers = [
+            number for (number,) in db.session.query(Student.admission_number)
+        ]
+        import_payments([{
+            "admission_number": random.choice(admission_numbers),
+            "amount": random.randint(100, 5000),
+            "method": random.choice(["mpesa", "bank", "cash"]),
+        } for _ in range(students * payments_per_student)])
+
+        handle, path = tempfile.mkstemp(suffix='.zip')
+        os.close(handle)
+        try:
+            with count_queries() as counter:
+                result = generate_statements(path)
+            size = os.path.getsize(path)
+        finally:
+            os.unlink(path)
+        db.session.remove()
+
+    return {
+        "students": students,
+        "statements": result["statements"],
+        "grades": result["grades"],
+        "seconds": result["seconds"],
+        "statements_per_second": round(result["statements"] / result["seconds"]),
+        "zip_bytes": size,
+        "sql_statements": counter.count,
+    }
+
+
+def _mixed_load_worker(path, profile, role, requests, student_ids, term_id):
+    """One gunicorn-like worker: its own app and pool on the shared scratch file."""
+    from app import create_app
+
+    app = create_app(scratch_file_config(path, SQLITE_PROFILE=profile))
+    client = app.test_client()
+    rng = random.Random()
+    outcomes = []
+    for _ in range(requests):
+        student_id = rng.choice(student_ids)
+        started = time.perf_counter()
+        if role == 'write':
+            response = client.post(
+                '/payments',
+                json={
+                    "student_id": student_id,
+                    "amount": rng.randint(100, 5000),
+                    "method": "mpesa",
+                    "term_id": term_id,
+                },
+            )
+        elif rng.random() < 0.5:
+            response = client.get('/students?limit=50')
+        else:
+            response = client.get(f'/students/{student_id}/ledger')
+        outcomes.append((time.perf_counter() - started, response.status_code))
+    return outcomes
+
+
+def bench_sqlite_concurrency(
+    readers=4, writers=2, requests=100, students=500, profiles=('default', 'tuned')
+):
+    """
+    Run concurrent reader and payment-writer processes against a scratch SQLite
+    file, once per SQLITE_PROFILE.
+
+    Each process builds its own app like a gunicorn worker. Reports
+    throughput, latency and failed requests per profile, so the rollback
+    journal ('default') can be compared with WAL and the other pragmas ('tuned').
+    """
+    from app import create_app
+    from app.models import Student, Term
+
+    results = {}
+    for profile in profiles:
+        handle, path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        try:
+            app = create_app(scratch_file_config(path, SQLITE_PROFILE=profile))
+            with app.app_context():
+                db.create_all()
+                seed_scratch_data(students)
+                student_ids = [
+                    student_id for (student_id,) in db.session.query(Student.id)
+                ]
+                term_id = db.session.query(Term.id).scalar()
+                db.session.remove()
+                db.engine.dispose()
+
+            roles = ['read'] * readers + ['write'] * writers
+            started = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=len(roles)) as executor:
+                futures = [
+                    (role, executor.submit(
+                        _mixed_load_worker, path, profile, role, requests,
+                        student_ids, term_id,
+                    ))
+                    for role in roles
+                ]
+                outcomes = [
+                    (role, outcome)
+                    for role, future in futures
+                    for outcome in future.result()
+                ]
+            elapsed = time.perf_counter() - started
+        finally:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.unlink(path + suffix)
+
+        result = {}
+        for role in ('read', 'write'):
+            role_outcomes = [
+                outcome for outcome_role, outcome in outcomes if outcome_role == role
+            ]
+            if role_outcomes:
+                result[role] = latency_summary(
+                    [latency for latency, _ in role_outcomes], elapsed
+                )
+                result[role]["failed"] = sum(
+                    1 for _, status in role_outcomes if status >= 500
+                )
+        result["requests_per_second"] = round(len(outcomes) / elapsed, 1)
+        results[profile] = result
+
+    return {
+        "readers": readers,
+        "writers": writers,
+        "requests_per_process": requests,
+        "students": students,
+        **results,
+    }
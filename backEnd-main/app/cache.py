@@ -0,0 +1,369 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+
+# Marks a miss, so None can be cached like any other value
+MISSING = object()
+
+
+class MemoryBackend:
+    """
+    Per-process LRU with TTLs, one bounded OrderedDict per namespace.
+
+    Fast and dependency-free, but every worker holds its own copy and
+    invalidation only reaches the process that calls it. Use it for a single
+    worker, the CLI and scratch apps.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._namespaces = {}  # namespace -> OrderedDict(key -> (value, expires_at))
+        self._counters = {}
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, namespace, key):
+        now = time.time()
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            entry = entries.get(key) if entries else None
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                del entries[key]
+                self.expirations += 1
+                return MISSING
+            entries.move_to_end(key)
+            return value
+
+    def set(self, namespace, key, value, ttl, max_entries):
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            entries[key] = (value, expires_at)
+            entries.move_to_end(key)
+            while len(entries) > max_entries:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, namespace, key):
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            if entries:
+                entries.pop(key, None)
+
+    def clear(self, namespace):
+        with self._lock:
+            self._namespaces.pop(namespace, None)
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def incr(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+            return self._counters[name]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.name,
+                "entries": {
+                    namespace: len(entries)
+                    for namespace, entries in self._namespaces.items()
+                },
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class SQLiteBackend:
+    """
+    Cache shared by every worker on the host, kept in a SQLite file in WAL mode.
+
+    Readers never block the writer, so a lookup costs one indexed SELECT on a
+    local file plus unpickling. Entries, clears and counters are visible to all
+    processes as soon as they are written, which is how invalidation reaches
+    every gunicorn worker. Eviction is LRU per namespace; the last-access time
+    is refreshed at most once every TOUCH_INTERVAL seconds to keep reads from
+    turning into writes.
+    """
+
+    name = 'sqlite'
+    TOUCH_INTERVAL = 1.0
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS cache_entry ("
+        " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,"
+        " expires_at REAL, accessed_at REAL NOT NULL, PRIMARY KEY (namespace, key))",
+        "CREATE INDEX IF NOT EXISTS ix_cache_entry_namespace_accessed_at"
+        " ON cache_entry (namespace, accessed_at)",
+        "CREATE TABLE IF NOT EXISTS cache_counter"
+        " (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    )
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path, timeout=5, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        # One connection per thread, reopened after a fork (gunicorn --preload)
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conn, local.pid = self._connect(), os.getpid()
+        return local.conn
+
+    def get(self, namespace, key):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM cache_entry"
+            " WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            return MISSING
+        value, expires_at, accessed_at = row
+        now = time.time()
+        if expires_at is not None and expires_at <= now:
+            conn.execute(
+                "DELETE FROM cache_entry"
+                " WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                (namespace, key, now),
+            )
+            with self._lock:
+                self.expirations += 1
+            return MISSING
+        if now - accessed_at > self.TOUCH_INTERVAL:
+            conn.execute(
+                "UPDATE cache_entry SET accessed_at = ?"
+                " WHERE namespace = ? AND key = ?",
+                (now, namespace, key),
+            )
+        return pickle.loads(value)
+
+    def set(self, namespace, key, value, ttl, max_entries):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entry"
+                " (namespace, key, value, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                 now + ttl if ttl is not None else None, now),
+            )
+            evicted = conn.execute(
+                "DELETE FROM cache_entry WHERE namespace = ? AND key IN ("
+                " SELECT key FROM cache_entry WHERE namespace = ? ORDER BY accessed_at"
+                " LIMIT max("
+                "(SELECT COUNT(*) FROM cache_entry WHERE namespace = ?) - ?, 0))",
+                (namespace, namespace, namespace, max_entries),
+            ).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+
+    def delete(self, namespace, key):
+        self._conn().execute(
+            "DELETE FROM cache_entry WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+
+    def clear(self, namespace):
+        self._conn().execute(
+            "DELETE FROM cache_entry WHERE namespace = ?", (namespace,)
+        )
+
+    def counter(self, name):
+        row = (
+            self._conn()
+            .execute("SELECT value FROM cache_counter WHERE name = ?", (name,))
+            .fetchone()
+        )
+        return row[0] if row else 0
+
+    def incr(self, name):
+        return (
+            self._conn()
+            .execute(
+                "INSERT INTO cache_counter (name, value) VALUES (?, 1) "
+                "ON CONFLICT (name) DO UPDATE SET value = value + 1 RETURNING value",
+                (name,),
+            )
+            .fetchone()[0]
+        )
+
+    def stats(self):
+        entries = dict(
+            self._conn().execute(
+                "SELECT namespace, COUNT(*) FROM cache_entry GROUP BY namespace"
+            )
+        )
+        with self._lock:
+            return {
+                "backend": self.name,
+                "path": self.path,
+                "entries": entries,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def create_backend(config, instance_path):
+    """Backend named by CACHE_BACKEND ('memory' or 'sqlite')."""
+    kind = config.get('CACHE_BACKEND', 'memory')
+    if kind == 'memory':
+        return MemoryBackend()
+    if kind == 'sqlite':
+        return SQLiteBackend(
+            config.get('CACHE_PATH') or os.path.join(instance_path, 'cache.sqlite3')
+        )
+    raise ValueError(f"Unknown CACHE_BACKEND {kind!r}; expected 'memory' or 'sqlite'")
+
+
+def init_cache(app):
+    app.extensions['cache'] = create_backend(app.config, app.instance_path)
+
+
+# Used outside an app context (imports, plain scripts)
+_fallback_backend = MemoryBackend()
+
+
+def get_backend():
+    """The current app's cache backend; one per app, so scratch apps share nothing."""
+    if has_app_context():
+        backend = current_app.extensions.get('cache')
+        if backend is not None:
+            return backend
+    return _fallback_backend
+
+
+class Cache:
+    """
+    One namespace of the configured cache backend.
+
+    Entries expire after `ttl` seconds (None: only on invalidation or
+    eviction) and each namespace holds at most `max_entries`, evicting the
+    least recently used. invalidate() empties the namespace on the shared
+    backend, so every worker sees it. Hit/miss counters are per process.
+
+    Keys are stored under the namespace's generation, a backend counter that
+    invalidate() bumps. get_or_load() reads the generation before loading, so
+    a value loaded while another worker invalidates is written under the
+    retired generation and never served.
+    """
+
+    def __init__(self, namespace, ttl=None, max_entries=1024):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _setting(self, value):
+        # Settings may name a config key, read when used so each app's config applies
+        return (
+            current_app.config[value]
+            if isinstance(value, str) and has_app_context()
+            else value
+        )
+
+    def _generation(self, backend):
+        return backend.counter(f"generation:{self.namespace}")
+
+    def _get(self, backend, generation, key, default):
+        value = backend.get(self.namespace, f"{generation}|{key}")
+        with self._lock:
+            if value is MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def _set(self, backend, generation, key, value, ttl):
+        ttl = self._setting(self.ttl) if ttl is MISSING else ttl
+        backend.set(
+            self.namespace,
+            f"{generation}|{key}",
+            value,
+            ttl,
+            self._setting(self.max_entries),
+        )
+
+    def get(self, key, default=None):
+        backend = get_backend()
+        return self._get(backend, self._generation(backend), key, default)
+
+    def set(self, key, value, ttl=MISSING):
+        backend = get_backend()
+        self._set(backend, self._generation(backend), key, value, ttl)
+
+    def get_or_load(self, key, loader, ttl=MISSING):
+        """
+        Cached value for key, calling loader() and caching its result on a miss.
+
+        ttl may be a function of the loaded value.
+        """
+        backend = get_backend()
+        generation = self._generation(backend)
+        value = self._get(backend, generation, key, MISSING)
+        if value is MISSING:
+            value = loader()
+            self._set(
+                backend, generation, key, value, ttl(value) if callable(ttl) else ttl
+            )
+        return value
+
+    def delete(self, key):
+        backend = get_backend()
+        backend.delete(self.namespace, f"{self._generation(backend)}|{key}")
+
+    def invalidate(self):
+        backend = get_backend()
+        backend.incr(f"generation:{self.namespace}")
+        backend.clear(self.namespace)
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
@@ -0,0 +1,308 @@
+import json
+
+import click
+
+from app.batches import content_type_for
+from app.jobs import process_term_rollover, promote_students
+
+
+def register_commands(app):
+    """Attach the maintenance commands to the app's `flask` CLI."""
+
+    @app.cli.command('rollover')
+    @click.option(
+        '--dry-run',
+        is_flag=True,
+        help='Report per-grade totals without changing anything.',
+    )
+    def rollover_command(dry_run):
+        """Roll balances over from the finished term into the next one."""
+        try:
+            result = process_term_rollover(dry_run=dry_run)
+        except ValueError as e:
+            raise click.ClickException(str(e)) from e
+        if result is None:
+            raise click.ClickException("No term found to process rollover")
+        click.echo(json.dumps(result, indent=2, default=str))
+
+    @app.cli.command('promote-students')
+    def promote_students_command():
+        """Promote every active student to the next grade."""
+        click.echo(json.dumps(promote_students(), indent=2))
+
+    @app.cli.command('import-payments')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option(
+        '--atomic', is_flag=True, help='Reject the whole batch if any line fails.'
+    )
+    def import_payments_command(path, atomic):
+        """Import a CSV or JSON batch of payments from PATH."""
+        from app.payments import import_payments, parse_payment_batch
+
+        with open(path, 'rb') as f:
+            raw = f.read()
+        try:
+            result = import_payments(
+                parse_payment_batch(raw, content_type_for(path)), atomic=atomic
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e)) from e
+
+        for line in result["results"]:
+            if not line["ok"]:
+                click.echo(f"line {line['line']}: {line['error']}", err=True)
+        click.echo(
+            f"Imported {result['imported']} payment(s), {result['failed']} failed"
+        )
+
+    @app.cli.command('import-bus-payments')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option(
+        '--atomic', is_flag=True, help='Reject the whole batch if any line fails.'
+    )
+    def import_bus_payments_command(path, atomic):
+        """Import a CSV or JSON batch of bus payments from PATH."""
+        from app.payments import import_bus_payments, parse_bus_payment_batch
+
+        with open(path, 'rb') as f:
+            raw = f.read()
+        try:
+            result = import_bus_payments(
+                parse_bus_payment_batch(raw, content_type_for(path)), atomic=atomic
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e)) from e
+
+        for line in result["results"]:
+            if not line["ok"]:
+                click.echo(f"line {line['line']}: {line['error']}", err=True)
+        click.echo(
+            f"Imported {result['imported']} bus payment(s), {result['failed']} failed"
+        )
+
+    @app.cli.command('explain-queries')
+    @click.option(
+        '--verbose',
+        is_flag=True,
+        help='Print every statement and plan, not only full scans.',
+    )
+    def explain_queries_command(verbose):
+        """EXPLAIN QUERY PLAN every GET route's SQL and flag full table scans."""
+        from app.diagnostics import explain_route_queries
+
+        flagged = 0
+        for entry in explain_route_queries():
+            if entry.get("error"):
+                click.echo(f"{'ERROR':20} {entry['route']}\n    {entry['error']}")
+                continue
+            if entry["full_scans"]:
+                flagged += 1
+            if entry["full_scans"] or verbose:
+                flag = (
+                    f"SCAN {', '.join(entry['full_scans'])}"
+                    if entry["full_scans"]
+                    else "ok"
+                )
+                click.echo(f"{flag:20} {entry['route']}\n    {entry['statement']}")
+                for step in entry["plan"]:
+                    click.echo(f"      {step}")
+        click.echo(f"{flagged} statement(s) with full table scans")
+
+    @app.cli.command('bench-payment-import')
+    @click.option('--lines', default=10000, help='Number of statement lines to import.')
+    def bench_payment_import_command(lines):
+        """Time /payments/bulk on a scratch database."""
+        from app.benchmarks import bench_payment_import
+
+        click.echo(json.dumps(bench_payment_import(lines), indent=2))
+
+    @app.cli.command('import-students')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option(
+        '--atomic', is_flag=True, help='Reject the whole batch if any row fails.'
+    )
+    def import_students_command(path, atomic):
+        """Admit a CSV or JSON batch of students from PATH."""
+        from app.students import import_students, parse_student_batch
+
+        with open(path, 'rb') as f:
+            raw = f.read()
+        try:
+            result = import_students(
+                parse_student_batch(raw, content_type_for(path)), atomic=atomic
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e)) from e
+
+        for row in result["results"]:
+            if not row["ok"]:
+                click.echo(f"line {row['line']}: {row['error']}", err=True)
+        click.echo(
+            f"Admitted {result['imported']} student(s), {result['failed']} failed"
+        )
+
+    @app.cli.command('bench-student-import')
+    @click.option('--students', default=2000, help='Number of students in the intake.')
+    def bench_student_import_command(students):
+        """Time /students/bulk on a scratch database."""
+        from app.benchmarks import bench_student_import
+
+        click.echo(json.dumps(bench_student_import(students), indent=2))
+
+    @app.cli.command('bench-login')
+    @click.option('--concurrency', default=20, help='Concurrent login clients.')
+    @click.option('--requests', default=200, help='Total login requests.')
+    def bench_login_command(concurrency, requests):
+        """Measure /login latency at a target concurrency on a scratch database."""
+        from app.benchmarks import bench_login
+
+        click.echo(json.dumps(bench_login(concurrency, requests), indent=2))
+
+    @app.cli.command('bench-sqlite')
+    @click.option('--readers', default=4, help='Reader processes.')
+    @click.option('--writers', default=2, help='Payment-posting processes.')
+    @click.option('--requests', default=100, help='Requests per process.')
+    @click.option(
+        '--profile',
+        'profiles',
+        multiple=True,
+        type=click.Choice(['default', 'tuned']),
+        help='SQLITE_PROFILE to run (repeatable; defaults to both).',
+    )
+    def bench_sqlite_command(readers, writers, requests, profiles):
+        """Compare read/write throughput under the default and tuned SQLite profiles."""
+        from app.benchmarks import bench_sqlite_concurrency
+
+        result = bench_sqlite_concurrency(
+            readers, writers, requests, profiles=profiles or ('default', 'tuned')
+        )
+        click.echo(json.dumps(result, indent=2))
+
+    @app.cli.command('rebuild-rollup')
+    def rebuild_rollup_command():
+        """Rebuild the daily payment rollup table from the payment ledger."""
+        from app.rollup import rebuild_rollup
+
+        click.echo(f"Rebuilt payment rollup: {rebuild_rollup()} bucket(s)")
+
+    @app.cli.command('compact-ledger')
+    @click.option(
+        '--max-replay',
+        type=int,
+        default=None,
+        help='Snapshot students with at least this many new entries.',
+    )
+    def compact_ledger_command(max_replay):
+        """Snapshot balances so as-of lookups replay a bounded number of entries."""
+        from app.ledger import compact_ledger
+
+        click.echo(json.dumps(compact_ledger(max_replay=max_replay), indent=2))
+
+    @app.cli.command('check-ledger')
+    def check_ledger_command():
+        """Fail if any student's stored balances disagree with their ledger."""
+        from app.ledger import ledger_mismatches
+
+        mismatches = ledger_mismatches()
+        for mismatch in mismatches:
+            fees, bus = mismatch['fees'], mismatch['bus']
+            click.echo(
+                f"student {mismatch['student_id']}: "
+                f"fees {fees[0]} stored vs {fees[1]} in ledger, "
+                f"bus {bus[0]} stored vs {bus[1]} in ledger (cents)"
+            )
+        if mismatches:
+            raise click.ClickException(
+                f"{len(mismatches)} student(s) out of step with the ledger"
+            )
+        click.echo("Ledger matches stored balances")
+
+    @app.cli.command('statements')
+    @click.argument('output', type=click.Path())
+    @click.option(
+        '--grade-id',
+        'grade_ids',
+        type=int,
+        multiple=True,
+        help='Only these grades (repeatable).',
+    )
+    @click.option(
+        '--term-id',
+        'term_ids',
+        type=int,
+        multiple=True,
+        help='Only these terms (repeatable).',
+    )
+    def statements_command(output, grade_ids, term_ids):
+        """Render fee statements to OUTPUT (a .zip file or a directory)."""
+        from app.statements import generate_statements
+
+        result = generate_statements(
+            output, grade_ids=list(grade_ids) or None, term_ids=list(term_ids) or None
+        )
+        click.echo(
+            f"Wrote {result['statements']} statement(s) for {result['grades']} "
+            f"grade(s) to {output} in {result['seconds']}s"
+        )
+
+    @app.cli.command('bench-statements')
+    @click.option(
+        '--students', default=2000, help='Number of students to render statements for.'
+    )
+    @click.option('--payments', default=6, help='Payments per student.')
+    def bench_statements_command(students, payments):
+        """Time statement generation for a whole school on a scratch database."""
+        from app.benchmarks import bench_statements
+
+        click.echo(json.dumps(bench_statements(students, payments), indent=2))
+
+    @app.cli.command('bill-bus')
+    @click.option(
+        '--term-id',
+        type=int,
+        default=None,
+        help='Term to bill (defaults to the active term).',
+    )
+    @click.option(
+        '--dry-run',
+        is_flag=True,
+        help='Report per-destination totals without billing anyone.',
+    )
+    def bill_bus_command(term_id, dry_run):
+        """Charge every bus rider their destination's termly fare."""
+        from app.models import Term
+        from app.transport import bill_term
+
+        if term_id is None:
+            active_term = Term.get_active_term()
+            if not active_term:
+                raise click.ClickException("No active term found")
+            term_id = active_term.id
+        result = bill_term(term_id, dry_run=dry_run)
+        if result is None:
+            raise click.ClickException(f"Term {term_id} not found")
+        click.echo(json.dumps(result, indent=2, default=str))
+
+    @app.cli.command('check-queries')
+    @click.option(
+        '--sizes', default='10,50', help='Comma-separated student counts to seed.'
+    )
+    def check_queries_command(sizes):
+        """Fail if a list endpoint's SQL statement count grows with its row count."""
+        from app.diagnostics import check_query_scaling
+
+        counts, growing = check_query_scaling(
+            sizes=[int(size) for size in sizes.split(',')]
+        )
+        for endpoint, by_size in counts.items():
+            flag = 'GROWS' if endpoint in growing else 'ok'
+            click.echo(
+                f"{flag:5} {endpoint}: "
+                + ", ".join(
+                    f"{size} rows -> {n} queries" for size, n in by_size.items()
+                )
+            )
+        if growing:
+            raise click.ClickException(
+                f"{len(growing)} endpoint(s) issue per-row queries"
+            )
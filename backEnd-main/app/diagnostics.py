@@ -0,0 +1,238 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import db
+from app.config import Config, database_url
+
+# List endpoints whose statement count must not grow with the rows returned
+LIST_ENDPOINTS = [
+    '/students',
+    '/students-with-destinations',
+    '/students-in-destination/{destination_id}',
+    '/fees/{term_id}/{grade_id}',
+    '/transport/rosters',
+    '/transport/summary?term_id={term_id}',
+]
+
+
+class ScratchConfig(Config):
+    """
+    Throwaway database for query-count checks: in-memory SQLite, or
+    SCRATCH_DATABASE_URL (e.g. a local Postgres).
+    """
+
+    SQLALCHEMY_DATABASE_URI = database_url('SCRATCH_DATABASE_URL', 'sqlite://')
+    DATABASE_REPLICA_URL = None
+    TESTING = True
+    CACHE_BACKEND = 'memory'
+
+
+class QueryCounter:
+    """Counts the SQL statements sent to an engine while active."""
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def __call__(self, statement, **_):
+        self.count += 1
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Context manager yielding a QueryCounter for statements run inside the block."""
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter, named=True)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+
+
+def seed_scratch_data(size):
+    """
+    Seed `size` students plus grades and destinations; returns the ids used in URLs.
+
+    Grades and destinations scale with `size` too, so lazy many-to-one loads
+    cannot hide behind the identity map.
+    """
+    from app.models import BusDestination, Fee, Grade, Student, Term
+
+    today = datetime.utcnow().date()
+    term = Term(
+        name="Scratch term",
+        start_date=today - timedelta(days=10),
+        end_date=today + timedelta(days=60),
+    )
+    grades = [Grade(name=f"g{i}") for i in range(max(size // 5, 1))]
+    destinations = [
+        BusDestination(name=f"d{i}", charge=100000) for i in range(max(size // 5, 1))
+    ]
+    db.session.add_all([term, *grades, *destinations])
+    db.session.flush()
+
+    db.session.add_all(
+        [Fee(term_id=term.id, grade_id=grade.id, amount=500000) for grade in grades]
+    )
+    db.session.add_all([
+        Student(
+            name=f"Student {i}",
+            admission_number=f"SCRATCH{i:06d}",
+            grade_id=grades[i % len(grades)].id,
+            phone="0700000000",
+            use_bus=True,
+            destination_id=destinations[i % len(destinations)].id,
+            password="-",
+        )
+        for i in range(size)
+    ])
+    db.session.commit()
+    return {
+        "term_id": term.id,
+        "grade_id": grades[0].id,
+        "destination_id": destinations[0].id,
+    }
+
+
+def check_query_scaling(endpoints=None, sizes=(10, 50)):
+    """
+    Call each list endpoint against scratch databases of different sizes.
+
+    Returns {endpoint: {size: statement_count}} plus the endpoints whose count
+    changed with the number of rows, i.e. that issue per-row queries.
+    """
+    from app import create_app
+
+    endpoints = endpoints or LIST_ENDPOINTS
+    counts = {endpoint: {} for endpoint in endpoints}
+
+    for size in sizes:
+        app = create_app(ScratchConfig)
+        with app.app_context():
+            db.create_all()
+            ids = seed_scratch_data(size)
+            client = app.test_client()
+            for endpoint in endpoints:
+                url = endpoint.format(**ids)
+                with count_queries() as counter:
+                    response = client.get(url)
+                    response.get_data()  # drain streamed bodies
+                if response.status_code >= 500:
+                    raise RuntimeError(f"{url} failed with {response.status_code}")
+                counts[endpoint][size] = counter.count
+            db.session.remove()
+            db.drop_all()
+
+    growing = [
+        endpoint
+        for endpoint, by_size in counts.items()
+        if len(set(by_size.values())) > 1
+    ]
+    return counts, growing
+
+
+# Small reference tables where reading every row is the point
+FULL_SCAN_OK = {
+    'grade', 'term', 'bus_destination', 'boarding_fee', 'staff', 'gallery',
+    'notification',
+}
+
+
+def _url_for_rule(rule, ids):
+    """Fill a GET rule's <int:...> arguments with seeded ids (1 when unknown)."""
+    url = rule.rule
+    for argument in rule.arguments:
+        value = ids.get(argument, ids.get(argument.replace('student_', ''), 1))
+        url = url.replace(f'<int:{argument}>', str(value)).replace(
+            f'<{argument}>', str(value)
+        )
+    return url
+
+
+def explain_route_queries(size=50):
+    """
+    Run every parameterless-or-integer GET route against a seeded scratch
+    SQLite database and EXPLAIN QUERY PLAN each statement it issues.
+
+    Returns a list of {route, statement, plan, full_scans} dicts where
+    full_scans names tables read without an index (outside FULL_SCAN_OK);
+    routes that raise get an entry with an `error` instead.
+    """
+    from app import create_app
+
+    # EXPLAIN QUERY PLAN is SQLite's, so this audit always runs on SQLite
+    # whatever SCRATCH_DATABASE_URL says
+    app = create_app(
+        type(
+            'SQLiteScratchConfig',
+            (ScratchConfig,),
+            {'SQLALCHEMY_DATABASE_URI': 'sqlite://'},
+        )
+    )
+    report = []
+    with app.app_context():
+        db.create_all()
+        ids = seed_scratch_data(size)
+        ids.setdefault('id', 1)
+        client = app.test_client()
+
+        captured = []
+
+        def capture(statement, parameters, **_):
+            if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+                captured.append((statement, parameters))
+
+        rules = sorted(
+            (
+                rule
+                for rule in app.url_map.iter_rules()
+                if 'GET' in rule.methods and rule.endpoint != 'static'
+            ),
+            key=lambda rule: rule.rule,
+        )
+        for rule in rules:
+            captured.clear()
+            event.listen(db.engine, 'before_cursor_execute', capture, named=True)
+            try:
+                client.get(_url_for_rule(rule, ids)).get_data()
+            except Exception as e:
+                # Broken routes are reported, not fatal, so the audit covers the rest
+                db.session.rollback()
+                report.append({
+                    "route": rule.rule,
+                    "statement": None,
+                    "plan": [],
+                    "full_scans": [],
+                    "error": repr(e),
+                })
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', capture)
+
+            for statement, parameters in list(captured):
+                plan = [row[-1] for row in db.session.connection().exec_driver_sql(
+                    'EXPLAIN QUERY PLAN ' + statement, tuple(parameters or ())
+                )]
+                full_scans = []
+                for step in plan:
+                    words = step.split()
+                    if (
+                        words[:1] == ['SCAN']
+                        and 'INDEX' not in words
+                        and len(words) > 1
+                    ):
+                        table = words[1]
+                        if table not in FULL_SCAN_OK:
+                            full_scans.append(table)
+                report.append({
+                    "route": rule.rule,
+                    "statement": ' '.join(statement.split()),
+                    "plan": plan,
+                    "full_scans": full_scans,
+                })
+        db.session.remove()
+        db.drop_all()
+    return report
@@ -0,0 +1,90 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def is_sqlite_memory(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config, uri=None):
+    """
+    Engine options for `uri` (the primary database by default) built from the
+    DB_POOL_* settings.
+
+    In-memory SQLite keeps Flask-SQLAlchemy's single shared connection, so
+    pool sizing only applies to file and server databases. Options already set
+    in SQLALCHEMY_ENGINE_OPTIONS win.
+    """
+    options = {}
+    if not is_sqlite_memory(uri or config['SQLALCHEMY_DATABASE_URI']):
+        options.update({
+            "pool_size": config['DB_POOL_SIZE'],
+            "max_overflow": config['DB_MAX_OVERFLOW'],
+            "pool_timeout": config['DB_POOL_TIMEOUT'],
+            "pool_recycle": config['DB_POOL_RECYCLE'],
+            "pool_pre_ping": config['DB_POOL_PRE_PING'],
+        })
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+
+def replica_binds(config):
+    """
+    SQLALCHEMY_BINDS entry for DATABASE_REPLICA_URL, pooled like the primary;
+    empty when no replica is set.
+    """
+    from app.replica import REPLICA
+
+    url = config.get('DATABASE_REPLICA_URL')
+    if not url:
+        return {}
+    return {REPLICA: {"url": url, **engine_options(config, url)}}
+
+
+def sqlite_pragmas(config):
+    """PRAGMA statements for each new SQLite connection under SQLITE_PROFILE."""
+    profile = config['SQLITE_PROFILE']
+    if profile == 'default':
+        return []
+    if profile != 'tuned':
+        raise ValueError(
+            f"Unknown SQLITE_PROFILE {profile!r}; expected 'tuned' or 'default'"
+        )
+    return [
+        # Readers keep reading while a payment commits; writers append to the WAL
+        # instead of locking the file
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        # Safe with WAL: a power cut can lose the last commits but never corrupts
+        # the database
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        # Negative: KiB rather than pages
+        f"PRAGMA cache_size={-int(config['SQLITE_CACHE_SIZE_KB'])}",
+        f"PRAGMA foreign_keys={'ON' if config['SQLITE_FOREIGN_KEYS'] else 'OFF'}",
+    ]
+
+
+def configure_engine(app, db):
+    """
+    Apply the SQLite connection profile to the app's SQLite engines (primary
+    and replica); call after db.init_app().
+    """
+    pragmas = sqlite_pragmas(app.config)
+    if not pragmas:
+        return
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    def apply_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', apply_pragmas)
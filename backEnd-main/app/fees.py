@@ -0,0 +1,91 @@
+from app.cache import Cache
+
+
+class FeeSchedule:
+    """
+    Cached copy of the fee structure.
+
+    Holds every Fee row as a {(grade_id, term_id): amount} matrix plus the
+    boarding surcharge, all in integer cents, in the shared cache backend (see
+    app.cache). It is loaded from the database on first use and reloaded
+    after invalidate(), which POST /fees and app startup call, or after
+    FEE_SCHEDULE_TTL seconds, which bounds how long writes made outside the
+    API go unseen. The structure changes a few times a year, so student
+    onboarding and rollover read it from here.
+    """
+
+    def __init__(self):
+        self._cache = Cache('fee_schedule', ttl='FEE_SCHEDULE_TTL', max_entries=1)
+
+    def _load(self):
+        from app.models import BoardingFee, Fee, db
+
+        matrix = {}
+        # Lowest id wins, matching the old Fee.query...first() lookups
+        for grade_id, term_id, amount in db.session.query(
+            Fee.grade_id, Fee.term_id, Fee.amount
+        ).order_by(Fee.id):
+            matrix.setdefault((grade_id, term_id), amount)
+        boarding = (
+            db.session.query(BoardingFee.extra_fee).order_by(BoardingFee.id).first()
+        )
+        return matrix, boarding[0] if boarding else 0
+
+    def _ensure_loaded(self):
+        return self._cache.get_or_load('schedule', self._load)
+
+    def invalidate(self):
+        self._cache.invalidate()
+
+    def fee(self, grade_id, term_id):
+        """Grade fee for a term, or None when no fee is set."""
+        matrix, _ = self._ensure_loaded()
+        return matrix.get((grade_id, term_id))
+
+    @property
+    def boarding_fee(self):
+        return self._ensure_loaded()[1]
+
+    def term_fees(self, term_id):
+        """{grade_id: amount} for every grade with a fee in the term."""
+        matrix, _ = self._ensure_loaded()
+        return {
+            grade_id: amount
+            for (grade_id, fee_term_id), amount in matrix.items()
+            if fee_term_id == term_id
+        }
+
+    def opening_balances(self, grade_id, term_id, students):
+        """
+        Opening (balance, prepayment) pairs for many students of one grade.
+
+        `students` is an iterable of (is_boarding, prepayment) tuples. The fee is
+        looked up once and applied to every row in a single pass; prepayments
+        are used up against the charge first. Raises ValueError when the grade
+        has no fee for the term.
+        """
+        matrix, boarding_fee = self._ensure_loaded()
+        fee = matrix.get((grade_id, term_id))
+        if fee is None:
+            raise ValueError("Fee structure not set for this grade and term.")
+
+        day_charge, boarder_charge = fee, fee + boarding_fee
+        result = []
+        for is_boarding, prepayment in students:
+            charge = boarder_charge if is_boarding else day_charge
+            prepayment = prepayment or 0
+            result.append(
+                (charge - prepayment, 0)
+                if prepayment < charge
+                else (0, prepayment - charge)
+            )
+        return result
+
+    def opening_balance(self, grade_id, term_id, is_boarding, prepayment=0):
+        return self.opening_balances(grade_id, term_id, [(is_boarding, prepayment)])[0]
+
+    def stats(self):
+        return self._cache.stats()
+
+
+fee_schedule = FeeSchedule()
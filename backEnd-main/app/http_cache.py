@@ -0,0 +1,100 @@
+import hashlib
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, current_app, request
+
+from app.cache import Cache, get_backend
+
+CachedBody = namedtuple('CachedBody', ['body', 'mimetype', 'etag', 'last_modified'])
+
+
+class ResponseCache:
+    """
+    LRU of serialized JSON bodies for reference-data GET routes, in the shared
+    cache backend (see app.cache).
+
+    Each entry is keyed by request path and the version of every table its
+    route reads. Write routes call bump() with the tables they change; the
+    versions are counters on the backend, so a bump in one worker retires the
+    cached bodies in all of them. Entries also expire after
+    RESPONSE_CACHE_TTL seconds. Responses carry a content ETag and
+    Last-Modified and are answered with 304 when the client's copy is current.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = Cache(
+            'responses', ttl='RESPONSE_CACHE_TTL', max_entries='RESPONSE_CACHE_SIZE'
+        )
+        self.not_modified = 0
+        self.bumps = 0
+
+    def versions(self, tables):
+        backend = get_backend()
+        return tuple(backend.counter(f"table:{table}") for table in tables)
+
+    def bump(self, *tables):
+        """Mark tables as written; cached bodies that read them are no longer served."""
+        backend = get_backend()
+        for table in tables:
+            backend.incr(f"table:{table}")
+        with self._lock:
+            self.bumps += 1
+
+    def clear(self):
+        self._cache.invalidate()
+
+    def respond(self, tables, render):
+        """Serve the cached body for this request, rendering it if missing or stale."""
+        versions = self.versions(tables)
+        key = f"{request.full_path}|{','.join(map(str, versions))}"
+        entry = self._cache.get(key)
+        if entry is None:
+            response = current_app.make_response(render())
+            # Only plain 200s are cached; errors and "not found" messages go through
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            entry = CachedBody(
+                body=body,
+                mimetype=response.mimetype,
+                etag=hashlib.sha1(body).hexdigest(),
+                last_modified=datetime.now(timezone.utc).replace(microsecond=0),
+            )
+            self._cache.set(key, entry)
+
+        response = Response(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        response.last_modified = entry.last_modified
+        # Browsers keep the body but revalidate on every use, which costs a 304 at most
+        response.cache_control.no_cache = True
+        response.make_conditional(request)
+        if response.status_code == 304:
+            with self._lock:
+                self.not_modified += 1
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._cache.stats(),
+                "not_modified": self.not_modified,
+                "bumps": self.bumps,
+            }
+
+
+response_cache = ResponseCache()
+
+
+def cached_response(*tables):
+    """Cache a GET view's JSON body in response_cache until a `tables` bump."""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return response_cache.respond(tables, lambda: view(*args, **kwargs))
+        return wrapper
+    return decorator
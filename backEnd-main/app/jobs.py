@@ -1,69 +1,246 @@
-from app.models import db, Student, Fee, BusPayment, Term
 from datetime import datetime
 
-def process_term_rollover():
-    # Fetch the current term
-    current_term = Term.query.filter_by(end_date__lt=datetime.now()).order_by(Term.end_date.desc()).first()
-    
-    if current_term:
-        # Update student balances for bus and fees after the current term ends
-        students = Student.query.all()
-        for student in students:
-            # Update fee arrears
-            fee_balance = Fee.query.filter_by(student_id=student.id).first()
-            if fee_balance:
-                fee_balance.arrears += fee_balance.amount_due
-                fee_balance.amount_due = current_term.fee  # Set the new fee for the next term
-                
-            # Update bus payment arrears
-            bus_payment_balance = BusPayment.query.filter_by(student_id=student.id).first()
-            if bus_payment_balance:
-                bus_payment_balance.arrears += bus_payment_balance.amount_due
-                bus_payment_balance.amount_due = current_term.bus_fee  # Set new bus fee for the next term
-            
-            db.session.commit()
-        
-        # Remove any prepayments (if student paid excess amount last term)
-        for student in students:
-            student_balance = Fee.query.filter_by(student_id=student.id).first()
-            if student_balance and student_balance.prepaid > 0:
-                student_balance.prepaid = 0
-                db.session.commit()
-
-        return True  # Return success status
-    else:
-        return False  # No term found to process rollover
+from app.fees import fee_schedule
+from app.ledger import FEES
+from app.models import Grade, LedgerEntry, Student, Term, db
+from app.money import from_cents
+
+
+def get_rollover_terms():
+    """Return (ending_term, next_term) for the most recently finished term."""
+    today = datetime.utcnow().date()
+    ending_term = (
+        Term.query.filter(Term.end_date < today).order_by(Term.end_date.desc()).first()
+    )
+    if not ending_term:
+        return None, None
+    next_term = (
+        Term.query.filter(Term.start_date > ending_term.end_date)
+        .order_by(Term.start_date)
+        .first()
+    )
+    return ending_term, next_term
+
+
+def _term_charge(next_term_id):
+    """
+    SQL expression for a student's charge in the next term (grade fee plus
+    boarding surcharge).
+
+    The fees come from the in-memory fee schedule and are inlined as integer-cent
+    literals in a CASE on grade_id; grades without a fee yield NULL.
+    """
+    grade_fees = fee_schedule.term_fees(next_term_id)
+    if not grade_fees:
+        return db.null()
+    grade_fee = db.case(grade_fees, value=Student.grade_id)
+    return grade_fee + db.case(
+        (Student.is_boarding, fee_schedule.boarding_fee), else_=0
+    )
+
+
+def _already_charged(term_id):
+    """
+    Students whose fees for term_id are already on the ledger: rolled over, or
+    admitted straight into the term.
+    """
+    return db.exists().where(
+        LedgerEntry.student_id == Student.id,
+        LedgerEntry.account == FEES,
+        LedgerEntry.kind.in_(('rollover', 'charge')),
+        LedgerEntry.term_id == term_id,
+    )
+
+
+def _pending(next_term_id):
+    return [Student.is_archived.is_(False), ~_already_charged(next_term_id)]
+
+
+def rollover_summary(next_term_id):
+    """Per-grade totals of what a rollover into next_term_id would move (one query)."""
+    charge = _term_charge(next_term_id)
+    prepayment = db.func.coalesce(Student.prepayment, 0)
+    rows = (
+        db.session.query(
+            Grade.id,
+            Grade.name,
+            db.func.count(Student.id),
+            db.func.coalesce(db.func.sum(Student.balance), 0),
+            db.func.coalesce(db.func.sum(charge), 0),
+            db.func.coalesce(
+                db.func.sum(db.case((prepayment < charge, prepayment), else_=charge)), 0
+            ),
+            db.func.count(charge),
+        )
+        .join(Student, Student.grade_id == Grade.id)
+        .filter(*_pending(next_term_id))
+        .group_by(Grade.id, Grade.name)
+        .order_by(Grade.id)
+        .all()
+    )
+
+    return [{
+        "grade_id": grade_id,
+        "grade": name,
+        "students": students,
+        "moved_to_arrears": from_cents(moved),
+        "new_charges": from_cents(charged),
+        "prepayment_applied": from_cents(applied),
+        "fee_missing": priced == 0,
+    } for grade_id, name, students, moved, charged, applied, priced in rows]
+
+
+def process_term_rollover(dry_run=False):
+    """
+    Close the most recently finished term and open the next one for every student.
+
+    Outstanding balances move into arrears, the next term's grade fee (plus the
+    boarding surcharge) becomes the new balance and any prepayment is applied
+    against it. All students are updated by a single UPDATE and each student's
+    new charge is then appended to the ledger with one INSERT ... SELECT, in one
+    transaction.
+    Students who already have a rollover or charge entry for the next term are
+    skipped, so running it again (or after admitting students straight into the
+    next term) charges nobody twice.
+    Returns None when there is no finished term with a following term.
+    """
+    ending_term, next_term = get_rollover_terms()
+    if not ending_term or not next_term:
+        return None
+
+    grades = rollover_summary(next_term.id)
+    missing = [grade["grade"] for grade in grades if grade["fee_missing"]]
+    if missing:
+        raise ValueError(
+            f"Fee structure not set for grade(s) {', '.join(missing)} "
+            f"in {next_term.name}."
+        )
+
+    result = {
+        "ending_term": ending_term.to_dict(),
+        "next_term": next_term.to_dict(),
+        "dry_run": dry_run,
+        "grades": grades,
+        "rows_updated": 0,
+    }
+    if dry_run:
+        return result
+
+    # SET expressions all see the pre-update row, so arrears, balance and
+    # prepayment can be rolled together in one statement.
+    charge = _term_charge(next_term.id)
+    prepayment = db.func.coalesce(Student.prepayment, 0)
+    pending = _pending(next_term.id)
+    try:
+        # Update first: the pending filter looks for next-term ledger entries,
+        # which the INSERT then adds
+        result["rows_updated"] = Student.query.filter(*pending).update(
+            {
+                Student.arrears: db.func.coalesce(Student.arrears, 0)
+                + db.func.coalesce(Student.balance, 0),
+                Student.balance: db.case(
+                    (prepayment < charge, charge - prepayment), else_=0
+                ),
+                Student.prepayment: db.case(
+                    (prepayment > charge, prepayment - charge), else_=0
+                ),
+                Student.version: Student.version + 1,
+            },
+            synchronize_session=False,
+        )
+        # Net owed grows by exactly the new charge, whatever mix of balance and
+        # prepayment it lands in
+        entries = db.select(
+            Student.id,
+            db.literal(FEES),
+            db.literal('rollover'),
+            charge,
+            db.literal(next_term.id),
+            db.literal(datetime.utcnow()),
+            db.literal(f"Rollover from {ending_term.name}"),
+        ).where(*pending, charge != 0)
+        db.session.execute(
+            db.insert(LedgerEntry).from_select(
+                ['student_id', 'account', 'kind', 'amount', 'term_id', 'posted_at',
+                 'description'],
+                entries,
+            )
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return result
 
 
 def promote_students():
-    # Logic for promoting students to the next class after the year ends
-    students = Student.query.all()
-    
-    for student in students:
-        # Check current grade and promote the student
-        if student.grade == 'baby':
-            student.grade = 'pp1'
-        elif student.grade == 'pp1':
-            student.grade = 'pp2'
-        elif student.grade == 'pp2':
-            student.grade = '1'
-        elif student.grade == '1':
-            student.grade = '2'
-        elif student.grade == '2':
-            student.grade = '3'
-        elif student.grade == '3':
-            student.grade = '4'
-        elif student.grade == '4':
-            student.grade = '5'
-        elif student.grade == '5':
-            student.grade = '6'
-        elif student.grade == '6':
-            student.grade = '7'
-        elif student.grade == '7':
-            student.grade = '8'
-        elif student.grade == '8':
-            student.grade = '9'
-        # Optionally add logic for handling cases when the student is in grade 9
-
-        db.session.commit()  # Save the changes for each student
-                
+    """
+    Move every active student up one grade at the end of the year.
+
+    The progression is read from Grade.next_grade_id. Students in a grade marked
+    is_final are archived as graduates; grades with no next grade are left as is.
+    Runs a fixed number of statements in one transaction regardless of enrollment.
+    """
+    grades = Grade.query.order_by(Grade.id).all()
+    progression = {
+        grade.id: grade.next_grade_id
+        for grade in grades
+        if grade.next_grade_id and not grade.is_final
+    }
+    final_grades = [grade.id for grade in grades if grade.is_final]
+
+    # Per-grade counts before anything moves
+    counts = dict(
+        db.session.query(Student.grade_id, db.func.count(Student.id))
+        .filter(Student.is_archived.is_(False))
+        .group_by(Student.grade_id)
+        .all()
+    )
+
+    try:
+        graduated = 0
+        if final_grades:
+            graduated = Student.query.filter(
+                Student.is_archived.is_(False), Student.grade_id.in_(final_grades)
+            ).update(
+                {Student.is_archived: True, Student.version: Student.version + 1},
+                synchronize_session=False,
+            )
+
+        promoted = 0
+        if progression:
+            promoted = Student.query.filter(
+                Student.is_archived.is_(False), Student.grade_id.in_(list(progression))
+            ).update(
+                {
+                    Student.grade_id: db.case(progression, value=Student.grade_id),
+                    Student.version: Student.version + 1,
+                },
+                synchronize_session=False,
+            )
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    grades_by_id = {grade.id: grade for grade in grades}
+    summary = []
+    for grade in grades:
+        count = counts.get(grade.id, 0)
+        if grade.is_final:
+            action, to_grade = "graduated", None
+        elif grade.next_grade_id:
+            action, to_grade = "promoted", grades_by_id[grade.next_grade_id].name
+        else:
+            action, to_grade = "unchanged", None
+        summary.append({
+            "grade_id": grade.id,
+            "grade": grade.name,
+            "students": count,
+            "action": action,
+            "to_grade": to_grade,
+        })
+
+    return {"promoted": promoted, "graduated": graduated, "grades": summary}
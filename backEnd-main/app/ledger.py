@@ -0,0 +1,211 @@
+from datetime import datetime
+
+from flask import current_app
+
+from app.models import BalanceSnapshot, LedgerEntry, Student, db
+
+# Ledger accounts; bus charges are owed separately from school fees
+FEES = 'fees'
+BUS = 'bus'
+
+# Entry kinds that record money paid rather than charged; statements list the
+# payments themselves and leave these out of the charges
+PAYMENT_KINDS = ('payment', 'payment_adjustment', 'payment_reversal')
+
+
+def fees_owed(account):
+    """Net fees owed by a Student (or anything with the same columns), in cents."""
+    return (account.arrears or 0) + (account.balance or 0) - (account.prepayment or 0)
+
+
+def record_entry(
+    student, kind, amount, account=FEES, term_id=None, payment=None, description=""
+):
+    """
+    Append one ledger entry for a Student row; zero amounts are skipped.
+
+    `student` may be a pending Student without an id yet, the foreign key is
+    filled in on flush. Caller commits.
+    """
+    if not amount:
+        return None
+    entry = LedgerEntry(
+        student=student,
+        account=account,
+        kind=kind,
+        amount=amount,
+        term_id=term_id,
+        payment=payment,
+        description=description or "",
+        posted_at=datetime.utcnow(),
+    )
+    db.session.add(entry)
+    return entry
+
+
+def balance_as_of(student_id, when=None):
+    """
+    What a student owed at `when` (now by default), in cents.
+
+    Starts from the newest snapshot taken at or before `when` and replays only
+    the entries posted after it, so the cost is bounded by the compaction
+    interval rather than the length of the student's history.
+    """
+    when = when or datetime.utcnow()
+    snapshot = (
+        BalanceSnapshot.query.filter(
+            BalanceSnapshot.student_id == student_id, BalanceSnapshot.as_of <= when
+        )
+        .order_by(BalanceSnapshot.as_of.desc(), BalanceSnapshot.last_entry_id.desc())
+        .first()
+    )
+
+    owed = (
+        {FEES: snapshot.fees_owed, BUS: snapshot.bus_owed}
+        if snapshot
+        else {FEES: 0, BUS: 0}
+    )
+    replayed = 0
+    delta = (
+        db.session.query(
+            LedgerEntry.account,
+            db.func.sum(LedgerEntry.amount),
+            db.func.count(LedgerEntry.id),
+        )
+        .filter(
+            LedgerEntry.student_id == student_id,
+            LedgerEntry.id > (snapshot.last_entry_id if snapshot else 0),
+            LedgerEntry.posted_at <= when,
+        )
+        .group_by(LedgerEntry.account)
+    )
+    for account, amount, count in delta:
+        owed[account] = owed.get(account, 0) + int(amount)
+        replayed += count
+
+    return {
+        "student_id": student_id,
+        "as_of": when,
+        "fees_owed": owed[FEES],
+        "bus_owed": owed[BUS],
+        "snapshot_id": snapshot.id if snapshot else None,
+        "replayed_entries": replayed,
+    }
+
+
+def compact_ledger(max_replay=None):
+    """
+    Snapshot every student with at least `max_replay` entries since their last snapshot.
+
+    One grouped query finds those students together with their previous
+    snapshot, and the new snapshots are written with a single executemany, so
+    as-of lookups never replay more than about max_replay entries. Ledger
+    entries themselves are never changed. Returns a summary dict.
+    """
+    max_replay = max_replay or current_app.config['LEDGER_SNAPSHOT_INTERVAL']
+
+    latest = db.session.query(
+        BalanceSnapshot.student_id.label('student_id'),
+        db.func.max(BalanceSnapshot.last_entry_id).label('last_entry_id'),
+    ).group_by(BalanceSnapshot.student_id).subquery()
+
+    is_bus = LedgerEntry.account == BUS
+    pending = (
+        db.session.query(
+            LedgerEntry.student_id,
+            db.func.count(LedgerEntry.id),
+            db.func.max(LedgerEntry.id),
+            db.func.max(LedgerEntry.posted_at),
+            db.func.coalesce(
+                db.func.sum(db.case((is_bus, 0), else_=LedgerEntry.amount)), 0
+            ),
+            db.func.coalesce(
+                db.func.sum(db.case((is_bus, LedgerEntry.amount), else_=0)), 0
+            ),
+            BalanceSnapshot.fees_owed,
+            BalanceSnapshot.bus_owed,
+            BalanceSnapshot.as_of,
+        )
+        .outerjoin(latest, latest.c.student_id == LedgerEntry.student_id)
+        .outerjoin(
+            BalanceSnapshot,
+            db.and_(
+                BalanceSnapshot.student_id == latest.c.student_id,
+                BalanceSnapshot.last_entry_id == latest.c.last_entry_id,
+            ),
+        )
+        .filter(LedgerEntry.id > db.func.coalesce(latest.c.last_entry_id, 0))
+        .group_by(
+            LedgerEntry.student_id,
+            BalanceSnapshot.fees_owed,
+            BalanceSnapshot.bus_owed,
+            BalanceSnapshot.as_of,
+        )
+        .having(db.func.count(LedgerEntry.id) >= max_replay)
+        .all()
+    )
+
+    snapshots = [
+        {
+            "student_id": student_id,
+            "last_entry_id": last_entry_id,
+            "as_of": max(posted_at, previous_as_of) if previous_as_of else posted_at,
+            "fees_owed": (previous_fees or 0) + int(fees),
+            "bus_owed": (previous_bus or 0) + int(bus),
+        }
+        for (
+            student_id, _, last_entry_id, posted_at, fees, bus,
+            previous_fees, previous_bus, previous_as_of,
+        ) in pending
+    ]
+
+    try:
+        if snapshots:
+            db.session.execute(db.insert(BalanceSnapshot), snapshots)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        "max_replay": max_replay,
+        "snapshots": len(snapshots),
+        "entries_compacted": sum(count for _, count, *rest in pending),
+    }
+
+
+def ledger_mismatches():
+    """
+    Students whose stored balances disagree with the sum of their ledger;
+    amounts are (stored, ledger) cents.
+    """
+    is_bus = LedgerEntry.account == BUS
+    totals = db.session.query(
+        LedgerEntry.student_id.label('student_id'),
+        db.func.sum(db.case((is_bus, 0), else_=LedgerEntry.amount)).label('fees'),
+        db.func.sum(db.case((is_bus, LedgerEntry.amount), else_=0)).label('bus'),
+    ).group_by(LedgerEntry.student_id).subquery()
+
+    stored_fees = (
+        db.func.coalesce(Student.arrears, 0)
+        + db.func.coalesce(Student.balance, 0)
+        - db.func.coalesce(Student.prepayment, 0)
+    )
+    stored_bus = db.func.coalesce(Student.bus_balance, 0)
+    ledger_fees = db.func.coalesce(totals.c.fees, 0)
+    ledger_bus = db.func.coalesce(totals.c.bus, 0)
+    rows = (
+        db.session.query(Student.id, stored_fees, ledger_fees, stored_bus, ledger_bus)
+        .outerjoin(totals, totals.c.student_id == Student.id)
+        .filter(db.or_(stored_fees != ledger_fees, stored_bus != ledger_bus))
+        .order_by(Student.id)
+        .all()
+    )
+    return [
+        {
+            "student_id": student_id,
+            "fees": (stored, ledger),
+            "bus": (stored_bus_, ledger_bus_),
+        }
+        for student_id, stored, ledger, stored_bus_, ledger_bus_ in rows
+    ]
@@ -1,7 +1,12 @@
 from datetime import datetime
+
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+
 from . import db
+from .money import from_cents
+from .passwords import hash_password, verify_password
+
+# Money columns hold integer cents (see app.money); to_dict() reports shillings.
 
 # Term model
 
@@ -13,10 +18,21 @@ class Term(db.Model):
     fees = db.relationship('Fee', back_populates='term', lazy=True)
     bus_payments = db.relationship('BusPayment', back_populates='term', lazy=True)
 
+    __table_args__ = (
+        # Active-term lookup
+        db.Index('ix_term_start_date_end_date', 'start_date', 'end_date'),
+    )
+
     def __repr__(self):
         return f"<Term(name={self.name}, start_date={self.start_date}, end_date={self.end_date})>"
     @classmethod
     def get_active_term(cls):
+        """Cached active term as an ActiveTerm snapshot (see app.terms), or None."""
+        from app.terms import active_term_cache
+        return active_term_cache.get(cls.query_active_term)
+
+    @classmethod
+    def query_active_term(cls):
         # Get the current date
         current_date = datetime.utcnow().date()
         return cls.query.filter(cls.start_date <= current_date, cls.end_date >= current_date).first()
@@ -34,32 +50,42 @@ class Staff(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
     phone = db.Column(db.String(25), nullable=False)
-    password = db.Column(db.String(100), nullable=False)
+    password = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     role = db.Column(db.String(50), nullable=False)
 
     classes = db.relationship('Class', back_populates='staff')
 
+    __table_args__ = (
+        # Case-insensitive login lookup
+        db.Index('ix_staff_name_lower', db.func.lower(name)),
+    )
+
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        return verify_password(self.password, password)
 
 # Grade model for fee structure
 class Grade(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(10), nullable=False, unique=True)
+    # Grade students are promoted into
+    next_grade_id = db.Column(db.Integer, db.ForeignKey('grade.id'))
+    # Students in this grade graduate
+    is_final = db.Column(db.Boolean, nullable=False, default=False)
     term_fees = db.relationship('Fee', back_populates='grade', lazy=True)
-    
+    next_grade = db.relationship('Grade', remote_side=[id])
 
-    
     def __repr__(self):
         return f"<Grade(name={self.name})>"
     def to_dict(self):
         return {
         "id": self.id,
-        "name": self.name
+        "name": self.name,
+        "next_grade_id": self.next_grade_id,
+        "is_final": self.is_final
     }
     
 
@@ -70,14 +96,18 @@ class Student(db.Model):
     admission_number = db.Column(db.String(50), unique=True, nullable=False)
     grade_id = db.Column(db.Integer, db.ForeignKey('grade.id'), nullable=False)
     phone = db.Column(db.String(20), nullable=False)
-    balance = db.Column(db.Float, default=0.0)
-    arrears = db.Column(db.Float, default=0.0)
-    prepayment = db.Column(db.Float, default=0.0)
+    balance = db.Column(db.BigInteger, default=0)
+    arrears = db.Column(db.BigInteger, default=0)
+    prepayment = db.Column(db.BigInteger, default=0)
     use_bus = db.Column(db.Boolean, nullable=False, default=False)
-    bus_balance = db.Column(db.Float, default=0.0)
+    bus_balance = db.Column(db.BigInteger, default=0)
     is_boarding = db.Column(db.Boolean, nullable=False, default=False)
-    password = db.Column(db.String(100), nullable=False)
+    password = db.Column(db.String(255), nullable=False)
     destination_id = db.Column(db.Integer, db.ForeignKey('bus_destination.id'))
+    # Graduated / left the school
+    is_archived = db.Column(db.Boolean, nullable=False, default=False)
+    # Optimistic lock for concurrent payments
+    version = db.Column(db.Integer, nullable=False, default=1)
 
     # Relationships
     grade = db.relationship('Grade', backref='students')
@@ -86,56 +116,62 @@ class Student(db.Model):
     bus_payments = db.relationship('BusPayment', back_populates='student', lazy='dynamic')
     assignments = db.relationship('Assignment', backref='student', lazy=True)
 
-    def set_password(self):
-        """Set password to the admission number."""
-        self.password = generate_password_hash(self.admission_number)
+    __mapper_args__ = {"version_id_col": version}
+    __table_args__ = (
+        # Case-insensitive login lookup
+        db.Index('ix_student_admission_number_lower', db.func.lower(admission_number)),
+        db.Index('ix_student_grade_id', 'grade_id'),
+        db.Index('ix_student_destination_id', 'destination_id'),
+    )
 
-    def check_password(self, password):
-        return check_password_hash(self.password, password)
+    def set_password(self, password=None):
+        """Set password, defaulting to the admission number."""
+        self.password = hash_password(password or self.admission_number)
 
-    def initialize_balance(self, term_id):
-        """Calculate initial balance for the term."""
-        active_term = Term.get_active_term()
-        if not active_term:
-            self.balance = 0.0
-            return
-        fee = Fee.query.filter_by(grade_id=self.grade_id, term_id=active_term.id).first()
-        if not fee:
-            raise ValueError("Fee structure not set for this grade and term.")
-
-        self.balance = fee.amount
-        if self.is_boarding:
-            boarding_fee = BoardingFee.query.first()
-            if boarding_fee:
-                self.balance += boarding_fee.extra_fee
-
-        self.balance -= self.prepayment
-        self.prepayment = 0
-        db.session.commit()
+    def check_password(self, password):
+        return verify_password(self.password, password)
+
+    def initialize_balance(self, term_id=None):
+        """
+        Calculate initial balance for the term (the active term by default) and
+        post the change to the ledger. Caller commits.
+        """
+        from app.fees import fee_schedule
+        from app.ledger import fees_owed, record_entry
+
+        owed_before = fees_owed(self)
+        if term_id is None:
+            active_term = Term.get_active_term()
+            term_id = active_term.id if active_term else None
+
+        if term_id is None:
+            self.balance = 0
+        else:
+            self.balance, self.prepayment = fee_schedule.opening_balance(
+                self.grade_id, term_id, self.is_boarding, self.prepayment
+            )
+        record_entry(
+            self,
+            'charge',
+            fees_owed(self) - owed_before,
+            term_id=term_id,
+            description="Term fees",
+        )
 
     def update_payment(self, amount):
-        """Update student balance, prepayment, and arrears for the current active term."""
+        """
+        Apply a payment of `amount` cents to arrears, balance and prepayment for
+        the active term. Caller commits.
+        """
+        from app.ledger import record_entry
+        from app.payments import apply_payment
+
         active_term = Term.get_active_term()
         if not active_term:
             raise ValueError("No active term found.")
 
-        # Handle arrears first
-        if self.arrears > 0:
-            if amount >= self.arrears:
-                amount -= self.arrears
-                self.arrears = 0
-            else:
-                self.arrears -= amount
-                db.session.commit()
-                return  # Payment fully applied to arrears
-
-        # Apply remaining amount to the current balance
-        self.balance -= amount
-        if self.balance < 0:
-            self.prepayment = -self.balance  # Convert negative balance to prepayment
-            self.balance = 0
-
-        db.session.commit()
+        apply_payment(self, amount)
+        record_entry(self, 'payment', -amount, term_id=active_term.id)
 
     def __repr__(self):
         return f"<Student(name={self.name}, balance={self.balance}, arrears={self.arrears})>"
@@ -147,39 +183,37 @@ class Student(db.Model):
             "admission_number": self.admission_number,
             "grade_id": self.grade_id,
             "phone": self.phone,
-            "balance": self.balance,
-            "arrears": self.arrears,
-            "prepayment": self.prepayment,
+            "balance": from_cents(self.balance),
+            "arrears": from_cents(self.arrears),
+            "prepayment": from_cents(self.prepayment),
             "use_bus": self.use_bus,
-            "bus_balance": self.bus_balance,
+            "bus_balance": from_cents(self.bus_balance),
             "is_boarding": self.is_boarding,
-            "destination_id": self.destination_id
+            "destination_id": self.destination_id,
+            "is_archived": self.is_archived
         }
         
 # Payment model
 class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(db.BigInteger, nullable=False)
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     method = db.Column(db.String(20), nullable=False)
     term_id = db.Column(db.Integer, db.ForeignKey('term.id'), nullable=False)
     description = db.Column(db.String(255), default="")
-    balance_after_payment = db.Column(db.Float, nullable=False)
-
-    def __init__(self, student_id, amount, method, term_id, description=""):
-        self.student_id = student_id
-        self.amount = amount
-        self.method = method
-        self.term_id = term_id
-        self.description = description or ""
-
-        student = Student.query.get(student_id)
-        if student:
-            student.update_payment(amount, term_id)
-            self.balance_after_payment = student.balance
-
-        db.session.commit()
+    balance_after_payment = db.Column(db.BigInteger, nullable=False)
+    # Student's grade when the payment was posted
+    grade_id = db.Column(db.Integer, db.ForeignKey('grade.id'))
+    # Client-supplied key so retries don't double-post
+    idempotency_key = db.Column(db.String(64), unique=True)
+
+    __table_args__ = (
+        # A student's statement, newest last
+        db.Index('ix_payment_student_id_date', 'student_id', 'date'),
+        db.Index('ix_payment_term_id', 'term_id'),
+        db.Index('ix_payment_date', 'date'),  # Date-range exports and reports
+    )
 
     def __repr__(self):
         return f"<Payment(student_id={self.student_id}, amount={self.amount}, balance_after_payment={self.balance_after_payment})>"
@@ -187,15 +221,108 @@ class Payment(db.Model):
         return {
         "id": self.id,
         "student_id": self.student_id,
-        "amount": self.amount,
+        "amount": from_cents(self.amount),
         "date": self.date.isoformat(),
         "method": self.method,
         "term_id": self.term_id,
         "description": self.description,
-        "balance_after_payment": self.balance_after_payment
+        "balance_after_payment": from_cents(self.balance_after_payment)
     }
     
        
+# Per-day payment totals, kept in step with the payment table by app.rollup
+class PaymentDailyRollup(db.Model):
+    __tablename__ = 'payment_daily_rollup'
+
+    # School-local calendar date of Payment.date (SCHOOL_TZ_OFFSET_MINUTES)
+    date = db.Column(db.Date, primary_key=True)
+    term_id = db.Column(db.Integer, db.ForeignKey('term.id'), primary_key=True)
+    grade_id = db.Column(db.Integer, db.ForeignKey('grade.id'), primary_key=True)
+    method = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return (
+            f"<PaymentDailyRollup(date={self.date}, term_id={self.term_id}, "
+            f"grade_id={self.grade_id}, method={self.method}, total={self.total})>"
+        )
+
+
+# Append-only record of every change to what a student owes (see app.ledger)
+class LedgerEntry(db.Model):
+    __tablename__ = 'ledger_entry'
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    account = db.Column(db.String(10), nullable=False)  # 'fees' or 'bus'
+    # opening, charge, payment, payment_adjustment, payment_reversal,
+    # rollover, adjustment
+    kind = db.Column(db.String(20), nullable=False)
+    # Signed cents; positive increases what is owed
+    amount = db.Column(db.BigInteger, nullable=False)
+    term_id = db.Column(db.Integer, db.ForeignKey('term.id'))
+    payment_id = db.Column(db.Integer, db.ForeignKey('payment.id'))
+    posted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    description = db.Column(db.String(255), default="")
+
+    student = db.relationship('Student')
+    payment = db.relationship('Payment')
+
+    __table_args__ = (
+        # Replay after a snapshot
+        db.Index('ix_ledger_entry_student_id_id', 'student_id', 'id'),
+    )
+
+    def __repr__(self):
+        return (
+            f"<LedgerEntry(student_id={self.student_id}, account={self.account}, "
+            f"kind={self.kind}, amount={self.amount})>"
+        )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "student_id": self.student_id,
+            "account": self.account,
+            "kind": self.kind,
+            "amount": from_cents(self.amount),
+            "term_id": self.term_id,
+            "payment_id": self.payment_id,
+            "posted_at": self.posted_at.isoformat(),
+            "description": self.description
+        }
+
+
+# What a student owed once every ledger entry up to last_entry_id was applied
+class BalanceSnapshot(db.Model):
+    __tablename__ = 'balance_snapshot'
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    last_entry_id = db.Column(db.Integer, nullable=False)
+    # posted_at of the newest entry covered
+    as_of = db.Column(db.DateTime, nullable=False)
+    # arrears + balance - prepayment, in cents
+    fees_owed = db.Column(db.BigInteger, nullable=False)
+    bus_owed = db.Column(db.BigInteger, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            'student_id',
+            'last_entry_id',
+            name='uq_balance_snapshot_student_id_last_entry_id',
+        ),
+        db.Index('ix_balance_snapshot_student_id_as_of', 'student_id', 'as_of'),
+    )
+
+    def __repr__(self):
+        return (
+            f"<BalanceSnapshot(student_id={self.student_id}, "
+            f"last_entry_id={self.last_entry_id}, fees_owed={self.fees_owed})>"
+        )
+
+
 # Fee model for each term and grade
 class Fee(db.Model):
     __tablename__ = 'fees'
@@ -203,10 +330,16 @@ class Fee(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     term_id = db.Column(db.Integer, db.ForeignKey('term.id'), nullable=False)
     grade_id = db.Column(db.Integer, db.ForeignKey('grade.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(db.BigInteger, nullable=False)
 
     # Relationships
     term = db.relationship('Term', back_populates='fees')
+
+    __table_args__ = (
+        # One fee per grade per term
+        db.UniqueConstraint('grade_id', 'term_id', name='uq_fees_grade_id_term_id'),
+        db.Index('ix_fees_term_id', 'term_id'),
+    )
     grade = db.relationship('Grade', back_populates='term_fees')
 
     def to_dict(self):
@@ -217,19 +350,27 @@ class Fee(db.Model):
             "term_name": self.term.name,  # Access related term's name
             "grade_id": self.grade_id,
             "grade_name": self.grade.name,  # Access related grade's name
-            "amount": self.amount
+            "amount": from_cents(self.amount)
         }
+    @staticmethod
     def get_fee_for_grade_and_term(grade_id, term_id):
         """Retrieve the fee amount for a specific grade and term."""
-        fee = Fee.query.filter_by(grade_id=grade_id, term_id=term_id).first()
-        if fee:
-            return fee.amount
-        return None
+        from app.fees import fee_schedule
+        return fee_schedule.fee(grade_id, term_id)
 
     def __repr__(self):
         return f"<Fee(term_id={self.term_id}, grade_id={self.grade_id}, amount={self.amount})>"
 
 
+# Boarding surcharge added on top of the grade fee for boarders
+class BoardingFee(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    extra_fee = db.Column(db.BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"<BoardingFee(extra_fee={self.extra_fee})>"
+
+
 # Assignment model related to multiple students
 class Assignment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -294,7 +435,7 @@ class Gallery(db.Model):
 class BusDestination(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    charge = db.Column(db.Float, nullable=False)
+    charge = db.Column(db.BigInteger, nullable=False)
     students = db.relationship("Student", back_populates="bus_destination", lazy="dynamic")
 
     def __repr__(self):
@@ -303,7 +444,7 @@ class BusDestination(db.Model):
         return {
         "id": self.id,
         "name": self.name,
-        "charge": self.charge
+        "charge": from_cents(self.charge)
     }
     
 
@@ -313,13 +454,18 @@ class BusPayment(db.Model):
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     term_id = db.Column(db.Integer, db.ForeignKey('term.id'), nullable=False)
     destination_id = db.Column(db.Integer, db.ForeignKey('bus_destination.id'))
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(db.BigInteger, nullable=False)
     payment_date = db.Column(db.DateTime, default=datetime.utcnow)
 
     student = db.relationship('Student', back_populates='bus_payments')
     term = db.relationship('Term', back_populates='bus_payments')
     destination = db.relationship('BusDestination', backref='payments')
 
+    __table_args__ = (
+        db.Index('ix_bus_payment_student_id', 'student_id'),
+        db.Index('ix_bus_payment_term_id', 'term_id'),
+    )
+
     def __repr__(self):
         return f"<BusPayment(student_id={self.student_id}, term_id={self.term_id}, amount={self.amount})>"
 
@@ -329,35 +475,17 @@ class BusPayment(db.Model):
         "student_id": self.student_id,
         "term_id": self.term_id,
         "destination_id": self.destination_id,
-        "amount": self.amount,
+        "amount": from_cents(self.amount),
         "payment_date": self.payment_date.isoformat()
     }
     
 
     @staticmethod
     def create_payment(student_id, amount):
-        # Fetch the current active term based on the current date
-        current_term = Term.query.filter(
-            Term.start_date <= datetime.utcnow(),
-            Term.end_date >= datetime.utcnow()
-        ).first()
-
-        if not current_term:
-            raise ValueError("No active term found to assign to the payment.")
-
-        # Fetch the student's assigned destination
-        student = Student.query.get(student_id)
-        if not student or not student.destination_id:
-            raise ValueError("Student does not have an assigned bus destination.")
-            
-
-        # Create a new bus payment
-        payment = BusPayment(student_id=student_id, term_id=current_term.id, destination_id=student.destination_id, amount=amount)
-    
-        db.session.add(payment)
-        db.session.commit()
-        return payment
-        
+        """Post a bus payment (in shillings) for the active term; see app.payments."""
+        from app.payments import post_bus_payment
+        return post_bus_payment(student_id, amount)
+
 # Notifications model
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
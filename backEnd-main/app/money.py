@@ -0,0 +1,29 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+# Money is stored and computed as integer cents so balances can be summed and
+# compared exactly. Requests and JSON responses keep using shillings.
+CENTS = 100
+
+
+def to_cents(value):
+    """
+    Convert an amount in shillings (number or numeric string) to integer cents,
+    rounding half-up to the nearest cent. Raises ValueError for anything that
+    isn't a finite number.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid amount: {value!r}")
+    try:
+        amount = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError) as e:
+        raise ValueError(f"Invalid amount: {value!r}") from e
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount: {value!r}")
+    return int((amount * CENTS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    """Integer cents back to shillings for JSON responses; None stays None."""
+    if cents is None:
+        return None
+    return int(cents) / CENTS
@@ -0,0 +1,129 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import lru_cache
+
+from flask import current_app, has_app_context
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_HASH_METHOD = 'scrypt:32768:8:1'  # werkzeug's own default
+DEFAULT_INTAKE_HASH_METHOD = 'pbkdf2:sha256:1000'
+
+
+class LoginBusy(Exception):
+    """Raised when the verification pool is saturated; callers answer 503."""
+
+
+def hash_method():
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD') or DEFAULT_HASH_METHOD
+    return DEFAULT_HASH_METHOD
+
+
+def intake_hash_method():
+    """Method for default passwords set at intake; login upgrades them."""
+    if has_app_context():
+        return (
+            current_app.config.get('INTAKE_HASH_METHOD') or DEFAULT_INTAKE_HASH_METHOD
+        )
+    return DEFAULT_INTAKE_HASH_METHOD
+
+
+def hash_password(password):
+    """Hash with the configured PASSWORD_HASH_METHOD."""
+    return generate_password_hash(password, method=hash_method())
+
+
+@lru_cache(maxsize=8)
+def _stored_method(method):
+    # werkzeug fills in omitted parameters ('scrypt' is stored as
+    # 'scrypt:32768:8:1'), so compare against what it actually writes; hashed
+    # once per method string
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    """True when a stored hash was made with different parameters than configured."""
+    if not password_hash:
+        return True
+    return password_hash.split('$', 1)[0] != _stored_method(hash_method())
+
+
+class VerificationPool:
+    """
+    Bounded thread pool for password checks.
+
+    hashlib's scrypt and pbkdf2 release the GIL, so checks run in parallel
+    without pinning request threads. At most `workers` run at once and at most
+    `queue` more may wait; beyond that, or after `timeout` seconds of waiting,
+    LoginBusy is raised instead of piling up work. A check the caller stopped
+    waiting for keeps its slot until it finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self.timeout = 5.0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._executor is None:
+                config = current_app.config if has_app_context() else {}
+                workers = config.get('LOGIN_HASH_WORKERS', 4)
+                self.timeout = config.get('LOGIN_HASH_TIMEOUT', 5.0)
+                self._slots = threading.BoundedSemaphore(
+                    workers + config.get('LOGIN_HASH_QUEUE', 16)
+                )
+                self._executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix='login-hash'
+                )
+
+    def verify(self, password_hash, password):
+        self._ensure_started()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise LoginBusy()
+        try:
+            future = self._executor.submit(check_password_hash, password_hash, password)
+        except BaseException:
+            self._slots.release()
+            raise
+        # Hold the slot until the hash finishes, not until this request gives up
+        # waiting on it
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError as e:
+            raise LoginBusy() from e
+
+
+verification_pool = VerificationPool()
+
+
+def verify_password(password_hash, password):
+    """Check a password on the bounded verification pool."""
+    if not password_hash:
+        return False
+    return verification_pool.verify(password_hash, password)
+
+
+def _serializer():
+    return URLSafeTimedSerializer(
+        current_app.config['SECRET_KEY'], salt='login-session'
+    )
+
+
+def issue_session_token(kind, principal_id, role):
+    """Signed token dashboards can send instead of credentials."""
+    return _serializer().dumps({"kind": kind, "id": principal_id, "role": role})
+
+
+def read_session_token(token):
+    """Payload of a valid, unexpired token, or None."""
+    try:
+        return _serializer().loads(
+            token, max_age=current_app.config.get('SESSION_TOKEN_TTL', 3600)
+        )
+    except (BadSignature, SignatureExpired):
+        return None
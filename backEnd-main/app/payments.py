@@ -0,0 +1,575 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.batches import parse_batch
+from app.ledger import BUS, FEES, record_entry
+from app.models import BusPayment, LedgerEntry, Payment, Student, Term, db
+from app.money import from_cents, to_cents
+from app.reports import rollup_tz_offset
+from app.rollup import (
+    add_many_to_rollup,
+    add_payment_to_rollup,
+    remove_payment_from_rollup,
+)
+from app.transport import transport_summary_cache
+
+# Attempts before giving up when another worker updates the same student first
+MAX_PAYMENT_ATTEMPTS = 3
+
+# Keep IN lists well under SQLite's bound-parameter limit
+IN_CHUNK_SIZE = 900
+
+
+def apply_payment(account, amount):
+    """
+    Apply a payment to anything with arrears/balance/prepayment attributes.
+
+    `amount` is in integer cents, like the columns it updates. Arrears are
+    cleared first, then the term balance; any excess becomes prepayment. Works
+    on Student rows and on plain in-memory objects alike.
+    """
+    arrears = account.arrears or 0
+    if arrears > 0:
+        if amount < arrears:
+            account.arrears = arrears - amount
+            return
+        amount -= arrears
+        account.arrears = 0
+
+    balance = (account.balance or 0) - amount
+    if balance < 0:
+        # Convert negative balance to prepayment
+        account.prepayment = (account.prepayment or 0) - balance
+        balance = 0
+    account.balance = balance
+
+
+def unapply_payment(account, amount):
+    """
+    Take back `amount` cents of payment from anything with balance/prepayment
+    attributes: prepayment is used up first and the rest goes back on the
+    term balance. Arrears the payment cleared stay cleared, but the net amount
+    owed rises by exactly `amount`.
+    """
+    prepayment = account.prepayment or 0
+    refunded = min(prepayment, amount)
+    account.prepayment = prepayment - refunded
+    account.balance = (account.balance or 0) + amount - refunded
+
+
+def _lock_student(student_id):
+    """
+    Load a student for update.
+
+    Databases with row locks take SELECT ... FOR UPDATE; SQLite has none, so it
+    relies on Student.version and the StaleDataError raised on a lost race.
+    """
+    query = Student.query.filter_by(id=student_id)
+    if db.engine.dialect.name != 'sqlite':
+        query = query.with_for_update()
+    return query.first()
+
+
+def post_payment(
+    student_id, amount, method, term_id, description="", idempotency_key=None
+):
+    """
+    Apply one payment to a student and record it, committing exactly once.
+
+    The student row is locked (or version-checked) so concurrent cashiers
+    cannot lose each other's updates. A repeated idempotency_key returns the
+    payment already recorded under it instead of posting again. `amount` is in
+    shillings as sent by the client and is converted to cents here.
+
+    Returns (payment, created). Raises ValueError for unknown students or terms
+    and for amounts that aren't positive numbers.
+    """
+    if idempotency_key:
+        existing = Payment.query.filter_by(idempotency_key=idempotency_key).first()
+        if existing:
+            return existing, False
+
+    amount = to_cents(amount)
+    if amount <= 0:
+        raise ValueError("Amount must be positive.")
+    if not db.session.get(Term, term_id):
+        raise ValueError(f"Term {term_id} not found.")
+
+    for attempt in range(1, MAX_PAYMENT_ATTEMPTS + 1):
+        try:
+            student = _lock_student(student_id)
+            if not student:
+                raise ValueError("Student not found.")
+
+            apply_payment(student, amount)
+            payment = Payment(
+                student_id=student.id,
+                grade_id=student.grade_id,
+                amount=amount,
+                method=method,
+                term_id=term_id,
+                description=description or "",
+                date=datetime.utcnow(),
+                balance_after_payment=student.balance,
+                idempotency_key=idempotency_key,
+            )
+            db.session.add(payment)
+            record_entry(student, 'payment', -amount, term_id=term_id, payment=payment)
+            add_payment_to_rollup(payment)
+            db.session.commit()
+            return payment, True
+        except StaleDataError:
+            db.session.rollback()
+            if attempt == MAX_PAYMENT_ATTEMPTS:
+                raise
+        except IntegrityError:
+            db.session.rollback()
+            # Another request committed the same idempotency key first
+            existing = (
+                Payment.query.filter_by(idempotency_key=idempotency_key).first()
+                if idempotency_key
+                else None
+            )
+            if existing:
+                return existing, False
+            raise
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def revise_payment(payment_id, changes):
+    """
+    Edit a payment and rebalance its student, committing exactly once.
+
+    `changes` may hold amount (shillings), method, term_id and description. A
+    new amount posts a 'payment_adjustment' ledger entry for the difference and
+    applies it to the student's balances, and the payment moves between
+    rollup buckets, all in one transaction. Retries like post_payment when
+    another worker updates the student first.
+
+    Returns the payment, or None if there is none. Raises ValueError for
+    amounts that aren't positive numbers and for unknown terms.
+    """
+    amount = None
+    if 'amount' in changes:
+        amount = to_cents(changes['amount'])
+        if amount <= 0:
+            raise ValueError("Amount must be positive.")
+    if 'term_id' in changes and not db.session.get(Term, changes['term_id']):
+        raise ValueError(f"Term {changes['term_id']} not found.")
+
+    for attempt in range(1, MAX_PAYMENT_ATTEMPTS + 1):
+        try:
+            payment = db.session.get(Payment, payment_id)
+            if not payment:
+                return None
+
+            remove_payment_from_rollup(payment)
+            payment.method = changes.get('method', payment.method)
+            payment.term_id = changes.get('term_id', payment.term_id)
+            payment.description = changes.get('description', payment.description)
+            if amount is not None and amount != payment.amount:
+                student = _lock_student(payment.student_id)
+                difference = amount - payment.amount
+                if difference > 0:
+                    apply_payment(student, difference)
+                else:
+                    unapply_payment(student, -difference)
+                record_entry(
+                    student,
+                    'payment_adjustment',
+                    -difference,
+                    term_id=payment.term_id,
+                    payment=payment,
+                    description=f"Payment {payment.id} amount corrected",
+                )
+                payment.amount = amount
+            add_payment_to_rollup(payment)
+            db.session.commit()
+            return payment
+        except StaleDataError:
+            db.session.rollback()
+            if attempt == MAX_PAYMENT_ATTEMPTS:
+                raise
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def reverse_payment(payment_id):
+    """
+    Delete a payment and restore what its student owes, committing exactly once.
+
+    A 'payment_reversal' ledger entry cancels the payment, the student's balances
+    are put back and the payment leaves its rollup bucket in the same
+    transaction. The ledger is append-only: entries that pointed at the
+    payment stay, only the link to the deleted row goes. Retries like
+    post_payment. Returns False if there is no such payment.
+    """
+    for attempt in range(1, MAX_PAYMENT_ATTEMPTS + 1):
+        try:
+            payment = db.session.get(Payment, payment_id)
+            if not payment:
+                return False
+
+            student = _lock_student(payment.student_id)
+            unapply_payment(student, payment.amount)
+            record_entry(
+                student,
+                'payment_reversal',
+                payment.amount,
+                term_id=payment.term_id,
+                description=f"Payment {payment.id} deleted",
+            )
+            remove_payment_from_rollup(payment)
+            LedgerEntry.query.filter_by(payment_id=payment.id).update(
+                {LedgerEntry.payment_id: None}, synchronize_session=False
+            )
+            db.session.delete(payment)
+            db.session.commit()
+            return True
+        except StaleDataError:
+            db.session.rollback()
+            if attempt == MAX_PAYMENT_ATTEMPTS:
+                raise
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def parse_payment_batch(raw, content_type):
+    """Turn a CSV or JSON request body into a list of payment line dicts."""
+    return parse_batch(raw, content_type, 'payments')
+
+
+def _parse_line(line, term_ids, default_term_id):
+    """Validate one batch line; returns a cleaned dict or raises ValueError."""
+    admission_number = str(line.get('admission_number') or '').strip()
+    if not admission_number:
+        raise ValueError("admission_number is required")
+    try:
+        amount = to_cents(line.get('amount'))
+    except ValueError as e:
+        raise ValueError("amount must be a number") from e
+    if amount <= 0:
+        raise ValueError("amount must be positive")
+    method = str(line.get('method') or '').strip()
+    if not method:
+        raise ValueError("method is required")
+
+    term_id = line.get('term_id') or default_term_id
+    try:
+        term_id = int(term_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("term_id is required when there is no active term") from e
+    if term_id not in term_ids:
+        raise ValueError(f"Term {term_id} not found")
+
+    date = line.get('date')
+    if date:
+        try:
+            date = datetime.fromisoformat(str(date))
+        except ValueError as e:
+            raise ValueError("date must be ISO formatted") from e
+    else:
+        date = datetime.utcnow()
+
+    return {
+        "admission_number": admission_number,
+        "amount": amount,
+        "method": method[:20],
+        "term_id": term_id,
+        "description": str(line.get('description') or '')[:255],
+        "date": date,
+    }
+
+
+def import_payments(lines, atomic=False):
+    """
+    Post a batch of payments in one transaction.
+
+    Students are resolved by admission number with chunked IN queries, the
+    arrears/balance/prepayment rules are applied in memory in line order, and
+    the payments, ledger entries and rollup buckets are written with bulk
+    statements. Student balances are flushed at commit as one versioned UPDATE
+    per student. Invalid lines are reported and skipped; with atomic=True any
+    invalid line rejects the whole batch.
+
+    Returns {"imported": n, "failed": n, "results": [per-line dicts]}.
+    """
+    active_term = Term.get_active_term()
+    default_term_id = active_term.id if active_term else None
+    term_ids = {term_id for (term_id,) in db.session.query(Term.id)}
+
+    results, parsed = [], []
+    for number, line in enumerate(lines, 1):
+        try:
+            parsed.append((number, _parse_line(line, term_ids, default_term_id)))
+        except (ValueError, AttributeError) as e:
+            results.append({"line": number, "ok": False, "error": str(e)})
+
+    admission_numbers = list({line["admission_number"] for _, line in parsed})
+    students = {}
+    for i in range(0, len(admission_numbers), IN_CHUNK_SIZE):
+        chunk = admission_numbers[i:i + IN_CHUNK_SIZE]
+        for student in Student.query.filter(Student.admission_number.in_(chunk)):
+            students[student.admission_number] = student
+
+    # Rollup buckets are school-local days, as in payment_rollup_key()
+    local_offset = timedelta(minutes=rollup_tz_offset())
+    payment_rows, rollup = [], {}
+    for number, line in parsed:
+        student = students.get(line["admission_number"])
+        if not student:
+            results.append({
+                "line": number,
+                "ok": False,
+                "error": f"Unknown admission number {line['admission_number']}",
+            })
+            continue
+
+        apply_payment(student, line["amount"])
+        payment_rows.append({
+            "student_id": student.id,
+            "grade_id": student.grade_id,
+            "amount": line["amount"],
+            "method": line["method"],
+            "term_id": line["term_id"],
+            "description": line["description"],
+            "date": line["date"],
+            "balance_after_payment": student.balance,
+        })
+        day = (line["date"] + local_offset).date()
+        key = (day, line["term_id"], student.grade_id, line["method"])
+        count, total = rollup.get(key, (0, 0))
+        rollup[key] = (count + 1, total + line["amount"])
+        results.append({
+            "line": number,
+            "ok": True,
+            "student_id": student.id,
+            "balance": from_cents(student.balance),
+        })
+
+    results.sort(key=lambda result: result["line"])
+    failed = sum(1 for result in results if not result["ok"])
+
+    if (atomic and failed) or not payment_rows:
+        db.session.rollback()
+        return {"imported": 0, "failed": failed, "results": results}
+
+    try:
+        # RETURNING carries everything the ledger rows need, so its row order
+        # doesn't matter
+        inserted = db.session.execute(
+            db.insert(Payment).returning(
+                Payment.id, Payment.student_id, Payment.amount, Payment.term_id
+            ),
+            payment_rows,
+        ).all()
+        posted_at = datetime.utcnow()
+        db.session.execute(db.insert(LedgerEntry), [{
+            "student_id": student_id,
+            "account": FEES,
+            "kind": 'payment',
+            "amount": -amount,
+            "term_id": term_id,
+            "payment_id": payment_id,
+            "posted_at": posted_at,
+            "description": "",
+        } for payment_id, student_id, amount, term_id in inserted])
+        add_many_to_rollup(rollup)
+        # Flushes the student balances: Student has a version counter, so this
+        # is one UPDATE per student, each failing on a concurrent change
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {"imported": len(payment_rows), "failed": failed, "results": results}
+
+
+def post_bus_payment(student_id, amount, term_id=None, destination_id=None):
+    """
+    Record one bus payment and take it off the student's bus balance,
+    committing exactly once.
+
+    The term defaults to the cached active term and the destination to the
+    student's own. The BusPayment row, the bus_balance change and the ledger
+    entry share a transaction, with the same row lock / version check as
+    post_payment. `amount` is in shillings and is converted to cents here.
+
+    Raises ValueError for unknown students or terms, a missing active term and
+    amounts that aren't positive numbers.
+    """
+    amount = to_cents(amount)
+    if amount <= 0:
+        raise ValueError("Amount must be positive.")
+    if term_id is None:
+        active_term = Term.get_active_term()
+        if not active_term:
+            raise ValueError("No active term found to assign to the payment.")
+        term_id = active_term.id
+    elif not db.session.get(Term, term_id):
+        raise ValueError(f"Term {term_id} not found.")
+
+    for attempt in range(1, MAX_PAYMENT_ATTEMPTS + 1):
+        try:
+            student = _lock_student(student_id)
+            if not student:
+                raise ValueError("Student not found.")
+
+            student.bus_balance = (student.bus_balance or 0) - amount
+            payment = BusPayment(
+                student_id=student.id,
+                term_id=term_id,
+                destination_id=destination_id or student.destination_id,
+                amount=amount,
+                payment_date=datetime.utcnow(),
+            )
+            db.session.add(payment)
+            record_entry(student, 'payment', -amount, account=BUS, term_id=term_id)
+            db.session.commit()
+            break
+        except StaleDataError:
+            db.session.rollback()
+            if attempt == MAX_PAYMENT_ATTEMPTS:
+                raise
+        except Exception:
+            db.session.rollback()
+            raise
+
+    transport_summary_cache.invalidate()
+    return payment
+
+
+def parse_bus_payment_batch(raw, content_type):
+    """Turn a CSV or JSON request body into a list of bus payment line dicts."""
+    return parse_batch(raw, content_type, 'bus_payments')
+
+
+def _parse_bus_line(line, term_ids, default_term_id):
+    """Validate one bus payment line; returns a cleaned dict or raises ValueError."""
+    admission_number = str(line.get('admission_number') or '').strip()
+    if not admission_number:
+        raise ValueError("admission_number is required")
+    try:
+        amount = to_cents(line.get('amount'))
+    except ValueError as e:
+        raise ValueError("amount must be a number") from e
+    if amount <= 0:
+        raise ValueError("amount must be positive")
+
+    term_id = line.get('term_id') or default_term_id
+    try:
+        term_id = int(term_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("term_id is required when there is no active term") from e
+    if term_id not in term_ids:
+        raise ValueError(f"Term {term_id} not found")
+
+    date = line.get('date')
+    if date:
+        try:
+            date = datetime.fromisoformat(str(date))
+        except ValueError as e:
+            raise ValueError("date must be ISO formatted") from e
+    else:
+        date = datetime.utcnow()
+
+    return {
+        "admission_number": admission_number,
+        "amount": amount,
+        "term_id": term_id,
+        "date": date,
+    }
+
+
+def import_bus_payments(lines, atomic=False):
+    """
+    Post a batch of bus payments in one transaction.
+
+    Works like import_payments: students are resolved with chunked IN
+    queries, bus balances are reduced in memory in line order, and the bus
+    payments and ledger entries are written with one executemany each before
+    a single commit, which flushes one versioned UPDATE per student. Each
+    payment is booked against the student's current destination. Invalid lines
+    are reported and skipped; with atomic=True any invalid line rejects the
+    whole batch.
+
+    Returns {"imported": n, "failed": n, "results": [per-line dicts]}.
+    """
+    active_term = Term.get_active_term()
+    default_term_id = active_term.id if active_term else None
+    term_ids = {term_id for (term_id,) in db.session.query(Term.id)}
+
+    results, parsed = [], []
+    for number, line in enumerate(lines, 1):
+        try:
+            parsed.append((number, _parse_bus_line(line, term_ids, default_term_id)))
+        except (ValueError, AttributeError) as e:
+            results.append({"line": number, "ok": False, "error": str(e)})
+
+    admission_numbers = list({line["admission_number"] for _, line in parsed})
+    students = {}
+    for i in range(0, len(admission_numbers), IN_CHUNK_SIZE):
+        chunk = admission_numbers[i:i + IN_CHUNK_SIZE]
+        for student in Student.query.filter(Student.admission_number.in_(chunk)):
+            students[student.admission_number] = student
+
+    payment_rows, ledger_rows = [], []
+    posted_at = datetime.utcnow()
+    for number, line in parsed:
+        student = students.get(line["admission_number"])
+        if not student:
+            results.append({
+                "line": number,
+                "ok": False,
+                "error": f"Unknown admission number {line['admission_number']}",
+            })
+            continue
+
+        student.bus_balance = (student.bus_balance or 0) - line["amount"]
+        payment_rows.append({
+            "student_id": student.id,
+            "term_id": line["term_id"],
+            "destination_id": student.destination_id,
+            "amount": line["amount"],
+            "payment_date": line["date"],
+        })
+        ledger_rows.append({
+            "student_id": student.id,
+            "account": BUS,
+            "kind": 'payment',
+            "amount": -line["amount"],
+            "term_id": line["term_id"],
+            "posted_at": posted_at,
+            "description": "",
+        })
+        results.append({
+            "line": number,
+            "ok": True,
+            "student_id": student.id,
+            "bus_balance": from_cents(student.bus_balance),
+        })
+
+    results.sort(key=lambda result: result["line"])
+    failed = sum(1 for result in results if not result["ok"])
+
+    if (atomic and failed) or not payment_rows:
+        db.session.rollback()
+        return {"imported": 0, "failed": failed, "results": results}
+
+    try:
+        db.session.execute(db.insert(BusPayment), payment_rows)
+        db.session.execute(db.insert(LedgerEntry), ledger_rows)
+        # One versioned UPDATE per student for the bus balances, as above
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    transport_summary_cache.invalidate()
+    return {"imported": len(payment_rows), "failed": failed, "results": results}
@@ -0,0 +1,100 @@
+from sqlalchemy import literal, union_all
+
+from app.cache import Cache
+from app.models import Staff, Student, db
+from app.passwords import verify_password
+
+
+def normalize_identifier(identifier):
+    return identifier.strip().lower()
+
+
+class NegativeLookupCache:
+    """
+    Short-lived, size-bounded set of identifiers that matched no principal.
+
+    Lets repeated attempts with unknown identifiers (typos, brute force) be
+    refused without touching the database. Entries expire after `ttl` seconds;
+    creating a student or staff member discards its identifier. Kept in the
+    shared cache backend (see app.cache), so every worker refuses them.
+    """
+
+    def __init__(self, ttl=60, max_entries=10000):
+        self._cache = Cache('unknown_login', ttl=ttl, max_entries=max_entries)
+
+    def __contains__(self, key):
+        return self._cache.get(key, False)
+
+    def add(self, key):
+        self._cache.set(key, True)
+
+    def discard(self, key):
+        self._cache.delete(normalize_identifier(key))
+
+    def clear(self):
+        self._cache.invalidate()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+unknown_identifiers = NegativeLookupCache()
+
+
+def find_principals(identifier):
+    """
+    Principals a login identifier could mean, as (kind, id, password_hash, role) tuples.
+
+    Students log in by admission number and staff by name, both matched
+    case-insensitively. A single UNION ALL statement probes the lower()
+    expression index on each table, so staff logins no longer pay for a
+    failed student query first. Candidates come in priority order: exact-case
+    matches first, then students before staff. Identifiers that match nobody
+    are remembered in unknown_identifiers.
+    """
+    key = normalize_identifier(identifier)
+    if not key or key in unknown_identifiers:
+        return []
+
+    students = db.select(
+        literal('student').label('kind'),
+        Student.id,
+        Student.password,
+        literal('student').label('role'),
+        Student.admission_number.label('login'),
+    ).where(
+        db.func.lower(Student.admission_number) == key, Student.is_archived.is_(False)
+    )
+    staff = db.select(
+        literal('staff').label('kind'),
+        Staff.id,
+        Staff.password,
+        Staff.role,
+        Staff.name.label('login'),
+    ).where(db.func.lower(Staff.name) == key)
+
+    rows = db.session.execute(union_all(students, staff)).all()
+    if not rows:
+        unknown_identifiers.add(key)
+        return []
+
+    exact = identifier.strip()
+    rows.sort(key=lambda row: (row.login != exact, row.kind != 'student'))
+    return [
+        (kind, principal_id, password_hash, role)
+        for kind, principal_id, password_hash, role, _ in rows
+    ]
+
+
+def authenticate(identifier, password):
+    """
+    The first candidate for identifier whose password matches, or None.
+
+    Like the old student-then-staff lookups, a failed check falls through to
+    the next candidate, so a staff name that collides with an admission number
+    can still log in.
+    """
+    for principal in find_principals(identifier):
+        if verify_password(principal[2], password):
+            return principal
+    return None
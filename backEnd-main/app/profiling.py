@@ -0,0 +1,333 @@
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from datetime import datetime
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Longest SQL text kept for the slowest statement of a request
+STATEMENT_PREVIEW = 300
+
+
+class RequestProfile:
+    """Timings for the request in flight, kept on flask.g."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.slowest_sql = None
+        self.slowest_sql_time = 0.0
+        self.profiler = None
+
+    def record_sql(self, statement, elapsed):
+        self.sql_count += 1
+        self.sql_time += elapsed
+        if elapsed >= self.slowest_sql_time:
+            self.slowest_sql_time = elapsed
+            self.slowest_sql = statement
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return '{' + pairs + '}'
+
+
+def _family(name, kind, help_text):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+class RequestMetrics:
+    """
+    Per-route request counters, a duration histogram and SQL totals, as Prometheus text.
+
+    Routes are labelled by their URL rule (/students/<int:student_id>), not the
+    raw path, so the series count stays bounded. The registry is per process:
+    under gunicorn each scrape of /metrics reports the worker that answered it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._requests = {}   # (method, endpoint, status) -> count
+            self._durations = {}  # (method, endpoint) -> [bucket counts..., sum, count]
+            self._sql = {}        # (method, endpoint) -> [statements, seconds, slowest]
+            self._slow = {}       # (method, endpoint) -> count
+            self.profiles = 0
+
+    def observe(self, method, endpoint, status, profile, duration, slow):
+        route = (method, endpoint)
+        with self._lock:
+            key = (method, endpoint, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+            histogram = self._durations.setdefault(
+                route, [0] * len(DURATION_BUCKETS) + [0.0, 0]
+            )
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    histogram[i] += 1
+            histogram[-2] += duration
+            histogram[-1] += 1
+
+            sql = self._sql.setdefault(route, [0, 0.0, 0.0])
+            sql[0] += profile.sql_count
+            sql[1] += profile.sql_time
+            sql[2] = max(sql[2], profile.slowest_sql_time)
+
+            if slow:
+                self._slow[route] = self._slow.get(route, 0) + 1
+
+    def count_profile(self):
+        with self._lock:
+            self.profiles += 1
+
+    def render(self):
+        with self._lock:
+            requests = sorted(self._requests.items())
+            durations = sorted(self._durations.items())
+            sql = sorted(self._sql.items())
+            slow = sorted(self._slow.items())
+            profiles = self.profiles
+
+        lines = _family(
+            'http_requests_total', 'counter',
+            "Requests handled, by method, route and status.",
+        )
+        lines += [
+            f"http_requests_total{_labels(method=m, endpoint=e, status=s)} {n}"
+            for (m, e, s), n in requests
+        ]
+
+        name = 'http_request_duration_seconds'
+        lines += _family(
+            name, 'histogram', "Wall time from the start of a request to its response."
+        )
+        for (method, endpoint), histogram in durations:
+            route = _labels(method=method, endpoint=endpoint)
+            bounds = [*DURATION_BUCKETS, '+Inf']
+            counts = [*histogram[:len(DURATION_BUCKETS)], histogram[-1]]
+            for bound, count in zip(bounds, counts, strict=True):
+                labels = _labels(method=method, endpoint=endpoint, le=bound)
+                lines.append(f"{name}_bucket{labels} {count}")
+            lines.append(f"{name}_sum{route} {histogram[-2]!r}")
+            lines.append(f"{name}_count{route} {histogram[-1]}")
+
+        for index, (name, kind, help_text) in enumerate((
+            ('http_request_sql_statements_total', 'counter',
+             "SQL statements executed while handling requests."),
+            ('http_request_sql_seconds_total', 'counter',
+             "Time spent executing SQL while handling requests."),
+            ('http_request_slowest_sql_seconds', 'gauge',
+             "Slowest single SQL statement seen for the route."),
+        )):
+            lines += _family(name, kind, help_text)
+            lines += [
+                f"{name}{_labels(method=m, endpoint=e)} {totals[index]!r}"
+                for (m, e), totals in sql
+            ]
+
+        lines += _family(
+            'http_slow_requests_total', 'counter',
+            "Requests slower than PROFILE_SLOW_MS.",
+        )
+        lines += [
+            f"http_slow_requests_total{_labels(method=m, endpoint=e)} {n}"
+            for (m, e), n in slow
+        ]
+        lines += _family(
+            'http_request_profiles_total', 'counter',
+            "Slow requests whose cProfile output was saved.",
+        )
+        lines.append(f"http_request_profiles_total {profiles}")
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
+
+# cProfile instruments the whole interpreter: one request per process at a time
+_profiler_lock = threading.Lock()
+
+
+def _current_profile():
+    return getattr(g, '_request_profile', None) if has_request_context() else None
+
+
+# Cursor listeners are registered with named=True and take only the arguments they use
+def _before_cursor_execute(conn, **_):
+    if _current_profile() is not None:
+        conn.info.setdefault('_profile_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, statement, **_):
+    profile = _current_profile()
+    started = conn.info.get('_profile_started')
+    if profile is not None and started:
+        profile.record_sql(statement, time.perf_counter() - started.pop())
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    conn = exception_context.connection
+    started = conn.info.get('_profile_started') if conn is not None else None
+    if started:
+        started.pop()
+
+
+def _stop_profiler(profile):
+    profiler, profile.profiler = profile.profiler, None
+    if profiler is not None:
+        profiler.disable()
+        _profiler_lock.release()
+    return profiler
+
+
+def _save_profile(profiler, endpoint, duration):
+    """Write a .prof file for snakeviz/pstats and log its slowest functions."""
+    config = current_app.config
+    directory = config.get('PROFILE_DIR') or os.path.join(
+        current_app.instance_path, 'profiles'
+    )
+    os.makedirs(directory, exist_ok=True)
+    route = f"{request.method} {endpoint}"
+    name = "_".join("".join(c if c.isalnum() else ' ' for c in route).split())
+    stamp = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}"
+    path = os.path.join(directory, f"{stamp}-{name}-{int(duration * 1000)}ms.prof")
+    profiler.dump_stats(path)
+
+    # Keep the newest PROFILE_KEEP dumps
+    dumps = sorted(f for f in os.listdir(directory) if f.endswith('.prof'))
+    for old in dumps[:-config['PROFILE_KEEP']]:
+        os.remove(os.path.join(directory, old))
+
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out).sort_stats('cumulative')
+    stats.print_stats(config['PROFILE_TOP'])
+    current_app.logger.info(
+        "Profile of %s %s saved to %s\n%s",
+        request.method, request.path, path, out.getvalue(),
+    )
+
+    request_metrics.count_profile()
+
+
+def start_request():
+    profile = g._request_profile = RequestProfile()
+    rate = current_app.config['PROFILE_SAMPLE_RATE']
+    if rate > 0 and random.random() < rate and _profiler_lock.acquire(blocking=False):
+        profile.profiler = cProfile.Profile()
+        profile.profiler.enable()
+
+
+def finish_request(response):
+    profile = _current_profile()
+    if profile is None:
+        return response
+    profiler = _stop_profiler(profile)
+    duration = profile.elapsed()
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    slow = duration * 1000 >= current_app.config['PROFILE_SLOW_MS']
+
+    request_metrics.observe(
+        request.method, endpoint, str(response.status_code), profile, duration, slow
+    )
+
+    timings = [
+        f"app;dur={duration * 1000:.1f}",
+        f'db;dur={profile.sql_time * 1000:.1f};desc="{profile.sql_count} queries"',
+    ]
+    if profile.sql_count:
+        timings.append(f"db-slowest;dur={profile.slowest_sql_time * 1000:.1f}")
+    response.headers.add('Server-Timing', ", ".join(timings))
+    # The front end is on another origin; browsers hide Server-Timing from it otherwise
+    response.headers.setdefault('Timing-Allow-Origin', '*')
+
+    if slow:
+        message = (
+            f"Slow request {request.method} {request.path}: {duration * 1000:.1f} ms, "
+            f"{profile.sql_count} SQL statement(s) in {profile.sql_time * 1000:.1f} ms"
+        )
+        if profile.sql_count:
+            slowest = profile.slowest_sql[:STATEMENT_PREVIEW]
+            message += f"; slowest {profile.slowest_sql_time * 1000:.1f} ms: {slowest}"
+        current_app.logger.warning(message)
+        if profiler is not None:
+            try:
+                _save_profile(profiler, endpoint, duration)
+            except OSError as e:
+                current_app.logger.error(f"Error saving request profile: {e}")
+    return response
+
+
+def abandon_request(_exc):
+    # after_request is skipped when no response could be built; never leave cProfile on
+    profile = _current_profile()
+    if profile is not None:
+        _stop_profiler(profile)
+
+
+def metrics():
+    """Prometheus scrape endpoint; requires 'Authorization: Bearer <METRICS_TOKEN>'."""
+    header = request.headers.get('Authorization', '')
+    token = header[7:] if header.startswith('Bearer ') else ''
+    expected = current_app.config['METRICS_TOKEN']
+    if not hmac.compare_digest(token.encode(), expected.encode()):
+        return Response(
+            "Unauthorized\n", status=401, headers={"WWW-Authenticate": "Bearer"}
+        )
+    return Response(
+        request_metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+def init_profiling(app, db):
+    """
+    Time requests and their SQL when PROFILING_ENABLED is set; call after db.init_app().
+
+    Responses get a Server-Timing header (wall time, SQL time and count, the
+    slowest statement), requests slower than PROFILE_SLOW_MS are logged with
+    their slowest statement, and a PROFILE_SAMPLE_RATE fraction of requests
+    run under cProfile, saved to PROFILE_DIR when they turn out slow. When
+    METRICS_TOKEN is set, /metrics serves request_metrics in Prometheus text
+    format to clients presenting it. Streamed responses are timed up to the
+    first byte; SQL run while streaming the body is not counted.
+    """
+    if not app.config['PROFILING_ENABLED']:
+        return
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(
+            engine, 'before_cursor_execute', _before_cursor_execute, named=True
+        )
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute, named=True)
+        event.listen(engine, 'handle_error', _handle_error)
+
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(abandon_request)
+    if app.config.get('METRICS_TOKEN'):
+        app.add_url_rule('/metrics', 'metrics', metrics, methods=['GET'])
+    else:
+        app.logger.info("METRICS_TOKEN is not set; /metrics is disabled")
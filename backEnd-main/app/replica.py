@@ -0,0 +1,46 @@
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+# Bind key of the read replica in SQLALCHEMY_BINDS
+REPLICA = 'replica'
+
+
+def replica_requested():
+    return has_app_context() and g.get('_use_replica', False)
+
+
+class RoutingSession(Session):
+    """
+    db.session that sends the reads of replica_reads views to the replica bind.
+
+    Flushes, INSERT/UPDATE/DELETE statements and raw SQL always go to the
+    primary, as does everything when no replica is configured, so a view that
+    unexpectedly writes still writes to the right database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and replica_requested() and not self._flushing
+                and not isinstance(clause, (UpdateBase, TextClause))):
+            engine = self._db.engines.get(REPLICA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_reads(view):
+    """
+    Run a read-only view (report, export, listing) against the read replica
+    when one is configured.
+
+    The choice holds for the rest of the request, so streamed responses keep
+    reading from the replica after the view returns.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g._use_replica = True
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,163 @@
+from datetime import timedelta
+
+from flask import current_app
+
+from app.models import (
+    BusDestination,
+    BusPayment,
+    Grade,
+    Payment,
+    PaymentDailyRollup,
+    Term,
+    db,
+)
+
+# Dimensions a payment total can be grouped by
+PAYMENT_DIMENSIONS = ("day", "month", "method", "grade", "term")
+
+
+def local_date(column, tz_offset_minutes):
+    """SQL calendar date of a UTC timestamp column shifted by tz_offset_minutes."""
+    if db.engine.dialect.name == 'sqlite':
+        return db.func.date(column, f'{tz_offset_minutes:+d} minutes')
+    return db.cast(column + timedelta(minutes=tz_offset_minutes), db.Date)
+
+
+def rollup_tz_offset():
+    """Minutes east of UTC of the PaymentDailyRollup days (SCHOOL_TZ_OFFSET_MINUTES)."""
+    return current_app.config.get('SCHOOL_TZ_OFFSET_MINUTES', 0)
+
+
+def local_month(column, tz_offset_minutes):
+    """SQL YYYY-MM month of a UTC timestamp column shifted by tz_offset_minutes."""
+    if db.engine.dialect.name == 'sqlite':
+        return db.func.strftime('%Y-%m', column, f'{tz_offset_minutes:+d} minutes')
+    return db.func.to_char(column + timedelta(minutes=tz_offset_minutes), 'YYYY-MM')
+
+
+def utc_bounds(start, end, tz_offset_minutes):
+    """Turn an inclusive local [start, end] date range into half-open UTC bounds."""
+    shift = timedelta(minutes=tz_offset_minutes)
+    return (
+        start - shift if start else None,
+        end + timedelta(days=1) - shift if end else None,
+    )
+
+
+def payment_totals(by, start=None, end=None, term_id=None, tz_offset_minutes=0):
+    """
+    Count and sum payments grouped by one or more of PAYMENT_DIMENSIONS.
+
+    start and end are inclusive local dates; Payment.date is stored in UTC and
+    shifted by tz_offset_minutes (minutes east of UTC) before bucketing by day
+    or month. Grade is the student's grade when the payment was posted. Totals
+    are integer cents.
+
+    Reports in the school's timezone (SCHOOL_TZ_OFFSET_MINUTES, what the front
+    end sends from the office) are answered from the PaymentDailyRollup table,
+    so their cost does not depend on the size of the ledger. Other offsets do
+    not line up with the rollup's days and fall back to a single GROUP BY over
+    payments.
+    """
+    unknown = [dimension for dimension in by if dimension not in PAYMENT_DIMENSIONS]
+    if unknown or not by:
+        raise ValueError(
+            f"group by must be one or more of: {', '.join(PAYMENT_DIMENSIONS)}"
+        )
+
+    if tz_offset_minutes == rollup_tz_offset():
+        # Rollup dates are already local, so months are taken from them unshifted
+        source, month_offset = PaymentDailyRollup, 0
+        day = PaymentDailyRollup.date
+        count = db.func.coalesce(db.func.sum(PaymentDailyRollup.count), 0)
+        total = db.func.coalesce(db.func.sum(PaymentDailyRollup.total), 0)
+    else:
+        source, month_offset = Payment, tz_offset_minutes
+        day = local_date(Payment.date, tz_offset_minutes)
+        count = db.func.count(Payment.id)
+        total = db.func.coalesce(db.func.sum(Payment.amount), 0)
+
+    columns, group_by = [], []
+    join_grade = join_term = False
+    for dimension in by:
+        if dimension == "day":
+            columns.append(day.label("day"))
+            group_by.append(day)
+        elif dimension == "month":
+            month = local_month(source.date, month_offset)
+            columns.append(month.label("month"))
+            group_by.append(month)
+        elif dimension == "method":
+            columns.append(source.method.label("method"))
+            group_by.append(source.method)
+        elif dimension == "grade":
+            join_grade = True
+            columns += [Grade.id.label("grade_id"), Grade.name.label("grade")]
+            group_by += [Grade.id, Grade.name]
+        elif dimension == "term":
+            join_term = True
+            columns += [Term.id.label("term_id"), Term.name.label("term")]
+            group_by += [Term.id, Term.name]
+
+    query = db.session.query(
+        *columns, count.label("count"), total.label("total")
+    ).select_from(source)
+    if join_grade:
+        query = query.join(Grade, Grade.id == source.grade_id)
+    if join_term:
+        query = query.join(Term, Term.id == source.term_id)
+
+    if source is PaymentDailyRollup:
+        if start:
+            query = query.filter(PaymentDailyRollup.date >= start.date())
+        if end:
+            query = query.filter(PaymentDailyRollup.date <= end.date())
+    else:
+        start_utc, end_utc = utc_bounds(start, end, tz_offset_minutes)
+        if start_utc:
+            query = query.filter(Payment.date >= start_utc)
+        if end_utc:
+            query = query.filter(Payment.date < end_utc)
+    if term_id is not None:
+        query = query.filter(source.term_id == term_id)
+
+    rows = query.group_by(*group_by).order_by(*group_by).all()
+    return [
+        {
+            key: (value.isoformat() if hasattr(value, 'isoformat') else value)
+            for key, value in row._asdict().items()
+        }
+        for row in rows
+    ]
+
+
+def bus_collection_totals(term_id=None, by_destination=False):
+    """
+    Count and sum bus payments per term, optionally split by destination.
+
+    One GROUP BY over bus payments; terms without bus payments are omitted.
+    Totals are integer cents.
+    """
+    columns = [Term.id.label("term_id"), Term.name.label("term")]
+    group_by = [Term.id, Term.name]
+    if by_destination:
+        columns += [
+            BusDestination.id.label("destination_id"),
+            BusDestination.name.label("destination"),
+        ]
+        group_by += [BusDestination.id, BusDestination.name]
+
+    query = db.session.query(
+        *columns,
+        db.func.count(BusPayment.id).label("count"),
+        db.func.coalesce(db.func.sum(BusPayment.amount), 0).label("total"),
+    ).select_from(BusPayment).join(Term, Term.id == BusPayment.term_id)
+    if by_destination:
+        query = query.outerjoin(
+            BusDestination, BusDestination.id == BusPayment.destination_id
+        )
+    if term_id is not None:
+        query = query.filter(BusPayment.term_id == term_id)
+
+    rows = query.group_by(*group_by).order_by(Term.start_date, *group_by).all()
+    return [row._asdict() for row in rows]
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.models import Payment, PaymentDailyRollup, Student, db
+from app.reports import local_date, rollup_tz_offset
+
+
+def payment_rollup_key(payment):
+    """(date, term_id, grade_id, method) bucket of a payment; date is school-local."""
+    grade_id = payment.grade_id
+    if grade_id is None:
+        grade_id = (
+            db.session.query(Student.grade_id)
+            .filter(Student.id == payment.student_id)
+            .scalar()
+        )
+    date = (
+        (payment.date or datetime.utcnow()) + timedelta(minutes=rollup_tz_offset())
+    ).date()
+    return date, payment.term_id, grade_id, payment.method
+
+
+def _rollup_upsert():
+    """INSERT ... ON CONFLICT statement adding count/total into an existing bucket."""
+    insert = (
+        postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+    )
+    stmt = insert(PaymentDailyRollup)
+    return stmt.on_conflict_do_update(
+        index_elements=['date', 'term_id', 'grade_id', 'method'],
+        set_={
+            'count': PaymentDailyRollup.count + stmt.excluded.count,
+            'total': PaymentDailyRollup.total + stmt.excluded.total,
+        },
+    )
+
+
+def apply_to_rollup(key, count, amount):
+    """
+    Add count/amount to one rollup bucket with a single upsert.
+
+    Runs inside the caller's transaction; pass negative values to take a
+    payment back out. Buckets that drop to zero payments are removed.
+    """
+    date, term_id, grade_id, method = key
+    db.session.execute(
+        _rollup_upsert().values(
+            date=date,
+            term_id=term_id,
+            grade_id=grade_id,
+            method=method,
+            count=count,
+            total=amount,
+        )
+    )
+
+    if count < 0:
+        PaymentDailyRollup.query.filter_by(
+            date=date, term_id=term_id, grade_id=grade_id, method=method
+        ).filter(PaymentDailyRollup.count <= 0).delete(synchronize_session=False)
+
+
+def add_many_to_rollup(buckets):
+    """Add {key: (count, amount)} increments to the rollup in one executemany upsert."""
+    if not buckets:
+        return
+    db.session.execute(
+        _rollup_upsert(),
+        [
+            {
+                "date": date,
+                "term_id": term_id,
+                "grade_id": grade_id,
+                "method": method,
+                "count": count,
+                "total": amount,
+            }
+            for (date, term_id, grade_id, method), (count, amount) in buckets.items()
+        ],
+    )
+
+
+def add_payment_to_rollup(payment):
+    apply_to_rollup(payment_rollup_key(payment), 1, payment.amount)
+
+
+def remove_payment_from_rollup(payment):
+    apply_to_rollup(payment_rollup_key(payment), -1, -payment.amount)
+
+
+def rebuild_rollup():
+    """
+    Recompute the whole rollup table from the payment table in one transaction;
+    returns the bucket count.
+    """
+    day = local_date(Payment.date, rollup_tz_offset())
+    grade_id = db.func.coalesce(Payment.grade_id, Student.grade_id)
+    totals = db.session.query(
+        day,
+        Payment.term_id,
+        grade_id,
+        Payment.method,
+        db.func.count(Payment.id),
+        db.func.sum(Payment.amount),
+    ).join(Student, Student.id == Payment.student_id) \
+        .group_by(day, Payment.term_id, grade_id, Payment.method)
+
+    try:
+        PaymentDailyRollup.query.delete(synchronize_session=False)
+        db.session.execute(
+            PaymentDailyRollup.__table__.insert().from_select(
+                ['date', 'term_id', 'grade_id', 'method', 'count', 'total'], totals
+            )
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return PaymentDailyRollup.query.count()
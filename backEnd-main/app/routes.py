@@ -1,12 +1,60 @@
-from flask import request, jsonify, Blueprint
-from .models import db, Staff,  Student, Payment, Fee, BusPayment, BusDestination, Term, Gallery, Notification, Grade
+import csv
+import io
+import json
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Blueprint, Response, jsonify, request, send_file, stream_with_context
 from flask import current_app as app
-import logging
-from datetime import datetime
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+
+from app.batches import as_bool
+from app.cache import get_backend
+from app.fees import fee_schedule
+from app.http_cache import cached_response, response_cache
 from app.jobs import process_term_rollover, promote_students
+from app.ledger import BUS, balance_as_of, compact_ledger, record_entry
+from app.money import from_cents, to_cents
+from app.passwords import (
+    LoginBusy,
+    issue_session_token,
+    needs_rehash,
+    read_session_token,
+)
+from app.payments import (
+    import_bus_payments,
+    import_payments,
+    parse_bus_payment_batch,
+    parse_payment_batch,
+    post_bus_payment,
+    post_payment,
+    reverse_payment,
+    revise_payment,
+)
+from app.principals import authenticate, unknown_identifiers
+from app.replica import replica_reads
+from app.reports import bus_collection_totals, payment_totals
+from app.statements import generate_statements, render_statement
+from app.students import import_students, parse_student_batch
+from app.terms import active_term_cache
+from app.transport import bill_term, outstanding, rosters, transport_summary_cache
+
+from .models import (
+    BusDestination,
+    Fee,
+    Gallery,
+    Grade,
+    LedgerEntry,
+    Notification,
+    Payment,
+    Staff,
+    Student,
+    Term,
+    db,
+)
 
-logging.basicConfig(level=logging.DEBUG)
 routes = Blueprint('routes', __name__)
 
 @routes.route('/login', methods=['POST'])
@@ -19,23 +67,49 @@ def login():
         if not identifier or not password:
             return jsonify({"error": "Missing identifier or password"}), 400
 
-        # Check if it's a student login
-        student = Student.query.filter_by(admission_number=identifier).first()
-        if student and student.check_password(password):
-            return jsonify({"message": "Student login successful", "role": "student"}), 200
+        # One indexed lookup across students and staff, then the password of
+        # each match in turn
+        principal = authenticate(identifier, password)
+        if not principal:
+            return jsonify({"error": "Invalid credentials"}), 401
+
+        kind, principal_id, password_hash, role = principal
 
-        # Check for staff login
-        staff = Staff.query.filter_by(name=identifier).first()
-        if staff and staff.check_password(password):
-            return jsonify({"message": "Staff login successful", "role": staff.role}), 200
+        # Upgrade hashes made with outdated parameters
+        if needs_rehash(password_hash):
+            model = Student if kind == "student" else Staff
+            db.session.get(model, principal_id).set_password(password)
+            db.session.commit()
 
-        # If no match is found
-        return jsonify({"error": "Invalid credentials"}), 401
+        return jsonify({
+            "message": "Student login successful" if kind == "student"
+            else "Staff login successful",
+            "role": role,
+            "token": issue_session_token(kind, principal_id, role),
+            "expires_in": app.config.get('SESSION_TOKEN_TTL', 3600),
+        }), 200
 
+    except LoginBusy:
+        return (
+            jsonify({"error": "Login service busy, please retry"}),
+            503,
+            {"Retry-After": "1"},
+        )
     except Exception as e:
         app.logger.error(f"Error during login: {e}")
         return jsonify({"error": "Internal server error"}), 500
     # return jsonify({"message": "Invalid credentials"}), 401
+
+# Resolve a session token issued by /login (Authorization: Bearer <token>)
+@routes.route('/session', methods=['GET'])
+def get_session():
+    header = request.headers.get('Authorization', '')
+    token = header[7:] if header.startswith('Bearer ') else None
+    session = read_session_token(token) if token else None
+    if not session:
+        return jsonify({"error": "Invalid or expired session"}), 401
+    return jsonify(session), 200
+
 # Add/Register Student
 @routes.route('/students', methods=['POST'])
 def add_student():
@@ -58,6 +132,11 @@ def add_student():
         if not grade:
             return jsonify({"error": "Grade not found."}), 400
 
+        try:
+            bus_balance = to_cents(data.get("bus_balance") or 0)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         # Create a new student (without password, balance-related fields will be set later)
         student = Student(
             name=data["name"],
@@ -66,9 +145,16 @@ def add_student():
             phone=data["phone"],
             is_boarding=data.get("is_boarding", False),
             use_bus=data.get("use_bus", False),
-            bus_balance=data.get("bus_balance", 0.0),
+            bus_balance=bus_balance,
             destination_id=data.get("destination_id")
         )
+        record_entry(
+            student,
+            'opening',
+            bus_balance,
+            account=BUS,
+            description="Opening bus balance",
+        )
 
         # Set the password to be the admission number
         student.set_password(data["admission_number"])
@@ -99,6 +185,7 @@ def add_student():
         # Commit student to the database
         db.session.add(student)
         db.session.commit()
+        unknown_identifiers.discard(student.admission_number)
 
         return jsonify({"message": "Student added successfully", "student": student.id}), 201
 
@@ -109,20 +196,144 @@ def add_student():
         shel
 
 
+# Admit a whole intake from a spreadsheet
+@routes.route('/students/bulk', methods=['POST'])
+def add_students_bulk():
+    """
+    Import students from a JSON list or a CSV body (Content-Type text/csv).
+
+    Columns follow POST /students; grade and destination may be given by id or
+    name. Pass ?atomic=true to reject the whole batch if any row fails.
+    """
+    try:
+        rows = parse_student_batch(request.get_data(), request.content_type)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    started = time.perf_counter()
+    try:
+        result = import_students(rows, atomic=bool(parse_bool_arg('atomic')))
+        unknown_identifiers.clear()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Error importing students: {e}")
+        return jsonify({"error": str(e)}), 500
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    status = 201 if result["imported"] else 400
+    return jsonify(result), status
+
+
+# Columns /students can project, keyed by the name used in the response
+STUDENT_LIST_FIELDS = {
+    "id": Student.id,
+    "name": Student.name,
+    "admission_number": Student.admission_number,
+    "grade": Grade.name,
+    "grade_id": Student.grade_id,
+    "phone": Student.phone,
+    "balance": Student.balance,
+    "arrears": Student.arrears,
+    "prepayment": Student.prepayment,
+    "use_bus": Student.use_bus,
+    "bus_balance": Student.bus_balance,
+    "is_boarding": Student.is_boarding,
+    "destination_id": Student.destination_id,
+    "is_archived": Student.is_archived,
+}
+STUDENT_LIST_MONEY_FIELDS = {"balance", "arrears", "prepayment", "bus_balance"}
+STUDENT_LIST_DEFAULT_FIELDS = ["id", "name", "grade", "balance"]
+STUDENT_LIST_MAX_LIMIT = 1000
+
+
+def parse_bool_arg(name):
+    """Read an optional true/false query argument; None when absent."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+
 @routes.route('/students', methods=['GET'])
+@replica_reads
 def get_students():
-    students = Student.query.all()
-    # Serialize student data including necessary fields
-    student_data = [
-        {
-            "id": student.id,
-            "name": student.name,
-            "grade": student.grade.name if student.grade else "N/A",
-            "balance": student.balance
-        }
-        for student in students
-    ]
-    return jsonify(student_data)
+    """
+    List students a page at a time, keyset-paginated on id.
+
+    Query args: after (cursor, the last id already seen), limit, fields
+    (comma-separated), grade_id, destination_id, is_boarding, use_bus and
+    include_archived. The body is a JSON array; the cursor for the next page is
+    returned in the X-Next-Cursor header.
+    """
+    fields = request.args.get('fields')
+    fields = (
+        [f.strip() for f in fields.split(',') if f.strip()]
+        if fields
+        else STUDENT_LIST_DEFAULT_FIELDS
+    )
+    unknown = [f for f in fields if f not in STUDENT_LIST_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown field(s): {', '.join(unknown)}"}), 400
+
+    after = request.args.get('after', 0, type=int)
+    limit = min(
+        max(request.args.get('limit', 100, type=int), 1), STUDENT_LIST_MAX_LIMIT
+    )
+
+    filters = [Student.id > after]
+    if not parse_bool_arg('include_archived'):
+        filters.append(Student.is_archived.is_(False))
+    grade_id = request.args.get('grade_id', type=int)
+    if grade_id is not None:
+        filters.append(Student.grade_id == grade_id)
+    destination_id = request.args.get('destination_id', type=int)
+    if destination_id is not None:
+        filters.append(Student.destination_id == destination_id)
+    for flag in ('is_boarding', 'use_bus'):
+        value = parse_bool_arg(flag)
+        if value is not None:
+            filters.append(getattr(Student, flag).is_(value))
+
+    # Probe the index for the last id of this page and the first of the next
+    # so the cursor header can be sent before the rows are streamed.
+    edge = (
+        db.session.query(Student.id)
+        .filter(*filters)
+        .order_by(Student.id)
+        .offset(limit - 1)
+        .limit(2)
+        .all()
+    )
+    next_cursor = edge[0][0] if len(edge) == 2 else None
+
+    query = db.session.query(
+        *[STUDENT_LIST_FIELDS[f].label(f) for f in fields]
+    ).select_from(Student)
+    if "grade" in fields:
+        query = query.outerjoin(Grade, Grade.id == Student.grade_id)
+    query = (
+        query.filter(*filters)
+        .order_by(Student.id)
+        .limit(limit)
+        .execution_options(yield_per=500)
+    )
+
+    def generate():
+        yield '['
+        for i, row in enumerate(query):
+            item = row._asdict()
+            if "grade" in item and item["grade"] is None:
+                item["grade"] = "N/A"
+            for field in STUDENT_LIST_MONEY_FIELDS.intersection(item):
+                item[field] = from_cents(item[field])
+            yield (',' if i else '') + json.dumps(item)
+        yield ']'
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
     
 
 # Update Student
@@ -146,7 +357,18 @@ def update_student(student_id):
 
     # Reinitialize balance if necessary
     if 'is_boarding' in data or 'arrears' in data:
-        student.arrears = data.get('arrears', student.arrears)
+        if 'arrears' in data:
+            try:
+                arrears = to_cents(data['arrears'] or 0)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            record_entry(
+                student,
+                'adjustment',
+                arrears - (student.arrears or 0),
+                description="Arrears corrected",
+            )
+            student.arrears = arrears
         student.initialize_balance()
 
     # Commit changes
@@ -161,8 +383,16 @@ def delete_student(student_id):
     if not student:
         return jsonify({"error": "Student not found"}), 404
 
-    db.session.delete(student)
-    db.session.commit()
+    try:
+        db.session.delete(student)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # Payments and ledger entries still point at the student
+        return jsonify({
+            "error": "Student has payment history and cannot be deleted; "
+                     "archive them instead"
+        }), 409
     return jsonify({"message": "Student deleted successfully"}), 200
 
 
@@ -174,8 +404,11 @@ def delete_student(student_id):
             return jsonify({"error": "Student not found"}), 404
 
         data = request.get_json()
-        payment_amount = data.get('payment_amount')
-        if not payment_amount or payment_amount <= 0:
+        try:
+            payment_amount = to_cents(data.get('payment_amount'))
+        except ValueError:
+            payment_amount = 0
+        if payment_amount <= 0:
             return jsonify({"error": "Valid payment amount is required"}), 400
 
         # Record the payment
@@ -208,6 +441,7 @@ def register_staff():
     staff.set_password(password)  # Set password using bcrypt
     db.session.add(staff)
     db.session.commit()
+    unknown_identifiers.discard(name)
     
     return jsonify({"message": "Staff registered successfully"}), 201
 
@@ -237,14 +471,53 @@ def get_student(id):
         return jsonify({
             'id': student.id,
             'name': student.name,
-            'grade': student.grade,
-            'balance': student.balance,
-            'bus_balance': student.bus_balance,
+            'grade': student.grade.name if student.grade else None,
+            'balance': from_cents(student.balance),
+            'bus_balance': from_cents(student.bus_balance),
             'is_boarding': student.is_boarding
         })
     return jsonify({"error": "Student not found"}), 404
 
 
+# What a student owed at the end of a given day
+@routes.route('/students/<int:student_id>/balance', methods=['GET'])
+def get_student_balance(student_id):
+    """
+    Balance as of the end of ?as_of=YYYY-MM-DD (UTC), or now; read from the
+    ledger and its snapshots.
+    """
+    if not db.session.get(Student, student_id):
+        return jsonify({"error": "Student not found"}), 404
+    try:
+        as_of = parse_date_arg('as_of')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = balance_as_of(
+        student_id,
+        as_of + timedelta(days=1) - timedelta(microseconds=1) if as_of else None,
+    )
+    return jsonify({
+        "student_id": student_id,
+        "as_of": result["as_of"].isoformat(),
+        "fees_owed": from_cents(result["fees_owed"]),
+        "bus_owed": from_cents(result["bus_owed"]),
+        "snapshot_id": result["snapshot_id"],
+        "replayed_entries": result["replayed_entries"]
+    }), 200
+
+
+# A student's ledger, oldest first
+@routes.route('/students/<int:student_id>/ledger', methods=['GET'])
+def get_student_ledger(student_id):
+    entries = (
+        LedgerEntry.query.filter_by(student_id=student_id)
+        .order_by(LedgerEntry.id)
+        .all()
+    )
+    return jsonify([entry.to_dict() for entry in entries]), 200
+
+
 # Add Payment
 @routes.route('/payments', methods=['POST'])
 def add_payment():
@@ -259,22 +532,61 @@ def add_payment():
         if not all([student_id, amount, method, term_id]):
             return jsonify({"error": "Missing required fields"}), 400
 
-        payment = Payment.record_payment(
+        payment, created = post_payment(
             student_id=student_id,
             amount=amount,
             method=method,
             term_id=term_id,
             description=description,
+            idempotency_key=(
+                request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+            ),
         )
-        return jsonify({"message": "Payment added successfully", "payment_id": payment.id}), 201
+        if not created:
+            return jsonify({
+                "message": "Payment already recorded", "payment_id": payment.id
+            }), 200
+        return jsonify({
+            "message": "Payment added successfully",
+            "payment_id": payment.id,
+            "balance_after_payment": from_cents(payment.balance_after_payment)
+        }), 201
 
     except ValueError as e:
         return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": "An error occurred while adding payment", "details": str(e)}), 500
 
+# Bulk-post a bank / M-Pesa statement batch
+@routes.route('/payments/bulk', methods=['POST'])
+def add_payments_bulk():
+    """
+    Import a batch of payments from a JSON list or a CSV body (Content-Type text/csv).
+
+    Lines are matched to students by admission_number; term_id defaults to the
+    active term. Pass ?atomic=true to reject the whole batch if any line fails.
+    """
+    try:
+        lines = parse_payment_batch(request.get_data(), request.content_type)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    started = time.perf_counter()
+    try:
+        result = import_payments(lines, atomic=bool(parse_bool_arg('atomic')))
+    except Exception as e:
+        app.logger.error(f"Error importing payments: {e}")
+        return jsonify({
+            "error": "An error occurred while importing payments", "details": str(e)
+        }), 500
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    status = 201 if result["imported"] else 400
+    return jsonify(result), status
+
 # Fetch all payments
 @routes.route('/payments', methods=['GET'])
+@replica_reads
 def get_all_payments():
     try:
         payments = Payment.query.all()  # Fetch all payments from the database
@@ -283,58 +595,233 @@ def get_all_payments():
         return jsonify([payment.to_dict() for payment in payments]), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-        
+
+
+def parse_date_arg(name):
+    """Read an optional YYYY-MM-DD query argument; raises ValueError when malformed."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError as e:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format") from e
+
+
+PAYMENT_EXPORT_COLUMNS = [
+    ("id", Payment.id),
+    ("student_id", Payment.student_id),
+    ("admission_number", Student.admission_number),
+    ("amount", Payment.amount),
+    ("date", Payment.date),
+    ("method", Payment.method),
+    ("term_id", Payment.term_id),
+    ("description", Payment.description),
+    ("balance_after_payment", Payment.balance_after_payment),
+]
+PAYMENT_EXPORT_MONEY_COLUMNS = {"amount", "balance_after_payment"}
+
+
+# Stream the payments ledger for the accounting system
+@routes.route('/payments/export', methods=['GET'])
+@replica_reads
+def export_payments():
+    """
+    Stream payments as NDJSON (default) or CSV (format=csv).
+
+    Optional filters: start and end (inclusive YYYY-MM-DD dates on Payment.date)
+    and term_id. Rows are fetched in server-side batches, so memory stays flat
+    however large the ledger is.
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({"error": "format must be 'ndjson' or 'csv'"}), 400
+    try:
+        start = parse_date_arg('start')
+        end = parse_date_arg('end')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    query = db.session.query(
+        *[column.label(name) for name, column in PAYMENT_EXPORT_COLUMNS]
+    ).join(Student, Student.id == Payment.student_id)
+    if start:
+        query = query.filter(Payment.date >= start)
+    if end:
+        query = query.filter(Payment.date < end + timedelta(days=1))
+    term_id = request.args.get('term_id', type=int)
+    if term_id is not None:
+        query = query.filter(Payment.term_id == term_id)
+    query = query.order_by(Payment.id).execution_options(yield_per=1000)
+
+    names = [name for name, _ in PAYMENT_EXPORT_COLUMNS]
+
+    def generate_ndjson():
+        for row in query:
+            item = row._asdict()
+            item["date"] = item["date"].isoformat()
+            for name in PAYMENT_EXPORT_MONEY_COLUMNS:
+                item[name] = from_cents(item[name])
+            yield json.dumps(item) + '\n'
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        for i, row in enumerate(query, 1):
+            writer.writerow([
+                value.isoformat() if isinstance(value, datetime)
+                else from_cents(value) if name in PAYMENT_EXPORT_MONEY_COLUMNS
+                else value
+                for name, value in zip(names, row, strict=True)
+            ])
+            # Flush every few hundred rows to keep chunks a sensible size
+            if i % 500 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    if export_format == 'csv':
+        response = Response(stream_with_context(generate_csv()), mimetype='text/csv')
+        response.headers['Content-Disposition'] = 'attachment; filename=payments.csv'
+    else:
+        response = Response(
+            stream_with_context(generate_ndjson()), mimetype='application/x-ndjson'
+        )
+    return response
+
+# Payment totals grouped by day, month, method, grade and/or term
+@routes.route('/payments/summary', methods=['GET'])
+@replica_reads
+def get_payment_summary():
+    """
+    Aggregate payments server-side.
+
+    Query args: by (comma-separated dimensions, default day), start and end
+    (inclusive YYYY-MM-DD local dates), term_id and tz_offset (minutes east of
+    UTC, e.g. 180 for EAT; defaults to SCHOOL_TZ_OFFSET_MINUTES).
+    """
+    try:
+        by = [
+            dimension.strip()
+            for dimension in request.args.get('by', 'day').split(',')
+            if dimension.strip()
+        ]
+        start = parse_date_arg('start')
+        end = parse_date_arg('end')
+        tz_offset = request.args.get(
+            'tz_offset', app.config['SCHOOL_TZ_OFFSET_MINUTES'], type=int
+        )
+        if not -14 * 60 <= tz_offset <= 14 * 60:
+            raise ValueError("tz_offset must be between -840 and 840 minutes")
+
+        groups = payment_totals(
+            by,
+            start=start,
+            end=end,
+            term_id=request.args.get('term_id', type=int),
+            tz_offset_minutes=tz_offset,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    total = sum(group["total"] for group in groups)
+    for group in groups:
+        group["total"] = from_cents(group["total"])
+    return jsonify({
+        "by": by,
+        "groups": groups,
+        "count": sum(group["count"] for group in groups),
+        "total": from_cents(total),
+    }), 200
+
 # Edit Payment
 @routes.route('/payments/<int:payment_id>', methods=['PUT'])
 def edit_payment(payment_id):
     data = request.get_json()
     try:
-        payment = Payment.query.get(payment_id)
-        if not payment:
+        # Ledger adjustment, balances and rollup move together
+        if not revise_payment(payment_id, data):
             return jsonify({"error": "Payment not found"}), 404
-
-        payment.amount = data.get('amount', payment.amount)
-        payment.method = data.get('method', payment.method)
-        payment.term_id = data.get('term_id', payment.term_id)
-        payment.description = data.get('description', payment.description)
-
-        db.session.commit()
         return jsonify({"message": "Payment updated successfully"}), 200
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({"error": "An error occurred while updating payment", "details": str(e)}), 500
+        return jsonify({
+            "error": "An error occurred while updating payment",
+            "details": str(e),
+        }), 500
 
 
 # Delete Payment
 @routes.route('/payments/<int:payment_id>', methods=['DELETE'])
 def delete_payment(payment_id):
     try:
-        payment = Payment.query.get(payment_id)
-        if not payment:
+        if not reverse_payment(payment_id):
             return jsonify({"error": "Payment not found"}), 404
-
-        db.session.delete(payment)
-        db.session.commit()
         return jsonify({"message": "Payment deleted successfully"}), 200
 
     except Exception as e:
-        return jsonify({"error": "An error occurred while deleting payment", "details": str(e)}), 500
+        return jsonify({
+            "error": "An error occurred while deleting payment",
+            "details": str(e),
+        }), 500
+
+
+# Printable fee statement for one student
+@routes.route('/students/<int:student_id>/statement', methods=['GET'])
+def get_student_statement(student_id):
+    html = render_statement(
+        student_id, term_ids=request.args.getlist('term_id', type=int) or None
+    )
+    if html is None:
+        return jsonify({"error": "Student not found"}), 404
+    return Response(html, mimetype='text/html')
+
+
+# Zip of fee statements for whole grades (all grades by default)
+@routes.route('/statements', methods=['GET'])
+@replica_reads
+def get_statements():
+    archive = tempfile.TemporaryFile()  # noqa: SIM115 - send_file closes it
+    try:
+        generate_statements(
+            archive,
+            grade_ids=request.args.getlist('grade_id', type=int) or None,
+            term_ids=request.args.getlist('term_id', type=int) or None,
+        )
+    except Exception as e:
+        archive.close()
+        return jsonify({
+            "error": "An error occurred while generating statements",
+            "details": str(e),
+        }), 500
+    archive.seek(0)
+    return send_file(
+        archive,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name='statements.zip',
+    )
 
 
 # Get All Payments for a Student
 @routes.route('/payments/student/<int:student_id>', methods=['GET'])
 def get_payments_by_student(student_id):
     try:
-        payments = Payment.query.filter_by(student_id=student_id).all()
+        payments = (
+            Payment.query.filter_by(student_id=student_id).order_by(Payment.date).all()
+        )
         return jsonify([{
             "id": p.id,
-            "amount": p.amount,
+            "amount": from_cents(p.amount),
             "date": p.date,
             "method": p.method,
             "term_id": p.term_id,
-            "balance_after_payment": p.balance_after_payment,
-            "description": p.description,
-            "notes": p.notes
+            "balance_after_payment": from_cents(p.balance_after_payment),
+            "description": p.description
         } for p in payments]), 200
 
     except Exception as e:
@@ -351,19 +838,19 @@ def get_payment(payment_id):
 
         return jsonify({
             "id": payment.id,
-            "amount": payment.amount,
+            "amount": from_cents(payment.amount),
             "date": payment.date,
             "method": payment.method,
             "term_id": payment.term_id,
-            "balance_after_payment": payment.balance_after_payment,
-            "description": payment.description,
-            "notes": payment.notes
+            "balance_after_payment": from_cents(payment.balance_after_payment),
+            "description": payment.description
         }), 200
 
     except Exception as e:
         return jsonify({"error": "An error occurred while fetching payment", "details": str(e)}), 500
 
 @routes.route('/destinations', methods=['GET'])
+@cached_response('bus_destination')
 def get_destinations():
     try:
         # Fetch all bus destinations
@@ -382,11 +869,15 @@ def get_destinations():
         
 @routes.route('/students/<int:student_id>/payments/term/<int:term_id>', methods=['GET'])
 def get_student_payments_by_term(student_id, term_id):
-    payments = Payment.query.filter_by(student_id=student_id).join(Fee).filter(Fee.term_id == term_id).all()
+    payments = (
+        Payment.query.filter_by(student_id=student_id, term_id=term_id)
+        .order_by(Payment.date)
+        .all()
+    )
     return jsonify([
         {
             'id': payment.id,
-            'amount': payment.amount,
+            'amount': from_cents(payment.amount),
             'date': payment.date,
             'method': payment.method
         }
@@ -399,11 +890,12 @@ def get_student_bus_destinations(student_id):
     if not student:
         return jsonify({"error": "Student not found"}), 404
 
-    bus_destinations = student.bus_destinations  # Use the relationship to get bus destinations
+    # A student rides to at most one destination
+    destination = student.bus_destination
     result = [{
         'bus_destination': destination.name,
-        'charge': destination.charge
-    } for destination in bus_destinations]
+        'charge': from_cents(destination.charge)
+    }] if destination else []
 
     return jsonify(result), 200
 
@@ -417,6 +909,8 @@ def create_term():
     term = Term(name=name, start_date=start_date, end_date=end_date)
     db.session.add(term)
     db.session.commit()
+    active_term_cache.invalidate()
+    response_cache.bump('term')
     
     return jsonify({"message": "Term created successfully", "term": {
         'id': term.id,
@@ -425,7 +919,47 @@ def create_term():
         'end_date': term.end_date
     }})
 
+@routes.route('/term/<int:term_id>', methods=['PUT'])
+def update_term(term_id):
+    term = Term.query.get(term_id)
+    if not term:
+        return jsonify({"error": "Term not found"}), 404
+
+    data = request.get_json()
+    try:
+        if 'name' in data:
+            term.name = data['name']
+        if 'start_date' in data:
+            term.start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+        if 'end_date' in data:
+            term.end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({"error": "Dates must be in YYYY-MM-DD format"}), 400
+    if term.end_date < term.start_date:
+        return jsonify({"error": "end_date must not be before start_date"}), 400
+
+    db.session.commit()
+    active_term_cache.invalidate()
+    response_cache.bump('term')
+
+    return jsonify({
+        "message": "Term updated successfully", "term": term.to_dict()
+    }), 200
+
+
+@routes.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({
+        "active_term": active_term_cache.stats(),
+        "fee_schedule": fee_schedule.stats(),
+        "unknown_login_identifiers": unknown_identifiers.stats(),
+        "transport_summary": transport_summary_cache.stats(),
+        "responses": response_cache.stats(),
+        "backend": get_backend().stats()
+    }), 200
+
 @routes.route('/terms', methods=['GET'])
+@cached_response('term')
 def get_terms():
     terms = Term.query.all()
     return jsonify([{
@@ -438,31 +972,89 @@ def get_terms():
 @routes.route('/bus-payments', methods=['POST'])
 def create_bus_payment():
     data = request.get_json()
-    student_id = data['student_id']
-    amount = data['amount']
-    term_id = data['term_id']
-    destination_id = data.get('destination_id', None)
-
-    bus_payment = BusPayment(
-        student_id=student_id,
-        term_id=term_id,
-        amount=amount,
-        destination_id=destination_id
-    )
-    db.session.add(bus_payment)
-    db.session.commit()
+    try:
+        student_id = data.get('student_id')
+        amount = data.get('amount')
+        if not all([student_id, amount]):
+            return jsonify({"error": "Missing required fields"}), 400
 
-    # Update the student's bus balance
-    bus_payment.update_student_bus_balance()
+        # term_id defaults to the active term, destination_id to the student's
+        # destination
+        bus_payment = post_bus_payment(
+            student_id=student_id,
+            amount=amount,
+            term_id=data.get('term_id'),
+            destination_id=data.get('destination_id'),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            "error": "An error occurred while adding bus payment", "details": str(e)
+        }), 500
 
     return jsonify({
         'message': 'Bus payment created successfully',
         'bus_payment': {
-            'student_id': student_id,
-            'amount': amount,
+            'id': bus_payment.id,
+            'student_id': bus_payment.student_id,
+            'term_id': bus_payment.term_id,
+            'destination_id': bus_payment.destination_id,
+            'amount': from_cents(bus_payment.amount),
             'payment_date': bus_payment.payment_date
-        }
-    })
+        },
+        'bus_balance': from_cents(bus_payment.student.bus_balance)
+    }), 200
+
+# Bulk-post bus payments from a JSON list or a CSV body
+@routes.route('/bus-payments/bulk', methods=['POST'])
+def add_bus_payments_bulk():
+    """
+    Import a batch of bus payments from a JSON list or a CSV body
+    (Content-Type text/csv).
+
+    Lines are matched to students by admission_number; term_id defaults to the
+    active term. Pass ?atomic=true to reject the whole batch if any line fails.
+    """
+    try:
+        lines = parse_bus_payment_batch(request.get_data(), request.content_type)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    started = time.perf_counter()
+    try:
+        result = import_bus_payments(lines, atomic=bool(parse_bool_arg('atomic')))
+    except Exception as e:
+        app.logger.error(f"Error importing bus payments: {e}")
+        return jsonify({
+            "error": "An error occurred while importing bus payments",
+            "details": str(e),
+        }), 500
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    status = 201 if result["imported"] else 400
+    return jsonify(result), status
+
+# Bus fare collected per term, optionally split by destination (?by=destination)
+@routes.route('/bus-payments/totals', methods=['GET'])
+@replica_reads
+def get_bus_payment_totals():
+    by = request.args.get('by')
+    if by not in (None, 'term', 'destination'):
+        return jsonify({"error": "by must be 'term' or 'destination'"}), 400
+
+    groups = bus_collection_totals(
+        term_id=request.args.get('term_id', type=int),
+        by_destination=by == 'destination',
+    )
+    total = sum(group["total"] for group in groups)
+    for group in groups:
+        group["total"] = from_cents(group["total"])
+    return jsonify({
+        "groups": groups,
+        "count": sum(group["count"] for group in groups),
+        "total": from_cents(total),
+    }), 200
 
 @routes.route('/assign-student-to-bus', methods=['POST'])
 def assign_student_to_bus():
@@ -483,8 +1075,10 @@ def assign_student_to_bus():
         return jsonify({"error": "Bus destination not found"}), 404
 
     # Assign the bus destination to the student
-    student.bus_destination_id = destination.id
+    student.destination_id = destination.id
+    student.use_bus = True
     db.session.commit()
+    transport_summary_cache.invalidate()
 
     return jsonify({
         "message": f"Student '{student.name}' assigned to destination '{destination.name}' successfully.",
@@ -493,52 +1087,136 @@ def assign_student_to_bus():
     })
 
 @routes.route('/students-with-destinations', methods=['GET'])
+@replica_reads
 def get_students_with_destinations():
-    # Query all students
-    students = Student.query.all()
-
-    # Prepare a list of students with their destinations
-    result = []
-    for student in students:
-        result.append({
-            "student_id": student.id,
-            "name": student.name,
-            "admission_number": student.admission_number,
-            "grade": student.grade.name if student.grade else None,
-            "destination": {
-                "id": student.bus_destination.id if student.bus_destination else None,
-                "name": student.bus_destination.name if student.bus_destination else "No destination assigned",
-                "charge": student.bus_destination.charge if student.bus_destination else None
-            }
-        })
+    # Only the columns the list shows, with grade and destination joined in the
+    # same statement
+    rows = db.session.query(
+        Student.id, Student.name, Student.admission_number, Grade.name,
+        BusDestination.id, BusDestination.name, BusDestination.charge,
+    ).outerjoin(Grade, Grade.id == Student.grade_id) \
+        .outerjoin(BusDestination, BusDestination.id == Student.destination_id) \
+        .order_by(Student.id)
+
+    result = [{
+        "student_id": student_id,
+        "name": name,
+        "admission_number": admission_number,
+        "grade": grade,
+        "destination": {
+            "id": destination_id,
+            "name": destination if destination_id is not None
+            else "No destination assigned",
+            "charge": from_cents(charge)
+        }
+    } for (
+        student_id, name, admission_number, grade,
+        destination_id, destination, charge,
+    ) in rows]
 
     return jsonify(result)
 
 @routes.route('/students-in-destination/<int:destination_id>', methods=['GET'])
+@replica_reads
 def get_students_in_destination(destination_id):
     destination = BusDestination.query.get(destination_id)
 
     if not destination:
         return jsonify({"error": "Bus Destination not found"}), 404
 
+    # Only the columns the roster shows, in one query
+    roster = db.session.query(Student.id, Student.name, Student.admission_number) \
+        .filter(Student.destination_id == destination.id) \
+        .order_by(Student.id) \
+        .all()
+
     students = [
         {
-            'id': student.id,
-            'name': student.name,
-            'admission_number': student.admission_number
+            'id': student_id,
+            'name': name,
+            'admission_number': admission_number
         }
-        for student in destination.students
+        for student_id, name, admission_number in roster
     ]
 
     return jsonify({
         'destination': {
             'id': destination.id,
             'name': destination.name,
-            'charge': destination.charge
+            'charge': from_cents(destination.charge)
         },
         'students': students
     })
 
+# Riders per destination, for drivers
+@routes.route('/transport/rosters', methods=['GET'])
+@replica_reads
+def get_transport_rosters():
+    result = rosters(destination_id=request.args.get('destination_id', type=int))
+    for roster in result:
+        roster["charge"] = from_cents(roster["charge"])
+        for student in roster["students"]:
+            student["bus_balance"] = from_cents(student["bus_balance"])
+    return jsonify(result), 200
+
+# Riders who still owe bus fare
+@routes.route('/transport/outstanding', methods=['GET'])
+@replica_reads
+def get_transport_outstanding():
+    result = outstanding(destination_id=request.args.get('destination_id', type=int))
+    total = sum(student["bus_balance"] for student in result)
+    for student in result:
+        student["bus_balance"] = from_cents(student["bus_balance"])
+    return jsonify({"students": result, "total": from_cents(total)}), 200
+
+# Per-destination riders, balances, billed and collected fares for a term
+# (the active term by default)
+@routes.route('/transport/summary', methods=['GET'])
+@replica_reads
+def get_transport_summary():
+    term_id = request.args.get('term_id', type=int)
+    if term_id is None:
+        active_term = Term.get_active_term()
+        if not active_term:
+            return jsonify({"error": "No active term found."}), 400
+        term_id = active_term.id
+
+    summary = transport_summary_cache.get(term_id)
+    money = ("charge", "outstanding", "billed", "collected")
+    return jsonify({
+        "term_id": term_id,
+        "destinations": [
+            {**row, **{key: from_cents(row[key]) for key in money}}
+            for row in summary
+        ],
+    }), 200
+
+# Bill every rider their termly bus fare
+@routes.route('/transport/bill', methods=['POST'])
+def bill_transport():
+    data = request.get_json(silent=True) or {}
+    dry_run = as_bool(data.get('dry_run', parse_bool_arg('dry_run')))
+    term_id = data.get('term_id')
+    if term_id is None:
+        active_term = Term.get_active_term()
+        if not active_term:
+            return jsonify({"error": "No active term found."}), 400
+        term_id = active_term.id
+
+    started = time.perf_counter()
+    result = bill_term(term_id, dry_run=dry_run)
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    if result is None:
+        return jsonify({"error": f"Term {term_id} not found"}), 404
+
+    for row in result["destinations"]:
+        row["charge"] = from_cents(row["charge"])
+        row["total"] = from_cents(row["total"])
+    message = (
+        "Bus billing dry run completed" if dry_run else "Bus fares billed successfully"
+    )
+    return jsonify({"message": message, "elapsed_ms": elapsed_ms, **result}), 200
+
 @routes.route('/gallery', methods=['POST'])
 def add_gallery_item():
     data = request.get_json()
@@ -585,17 +1263,52 @@ def add_notification():
 
 @routes.route('/process-rollover', methods=['POST'])
 def process_rollover():
-    success = process_term_rollover()  # Call the rollover function
-    if success:
-        return jsonify({"message": "Term rollover processed successfully"}), 200
-    else:
+    data = request.get_json(silent=True) or {}
+    dry_run = as_bool(data.get('dry_run', parse_bool_arg('dry_run')))
+
+    started = time.perf_counter()
+    try:
+        # Call the rollover function
+        result = process_term_rollover(dry_run=dry_run)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    if result is None:
         return jsonify({"message": "No term found to process rollover"}), 400
 
+    message = (
+        "Term rollover dry run completed"
+        if dry_run
+        else "Term rollover processed successfully"
+    )
+    return jsonify({"message": message, "elapsed_ms": elapsed_ms, **result}), 200
+
+@routes.route('/ledger/compact', methods=['POST'])
+def compact_ledger_route():
+    data = request.get_json(silent=True) or {}
+    max_replay = data.get('max_replay', request.args.get('max_replay', type=int))
+
+    started = time.perf_counter()
+    result = compact_ledger(max_replay=max_replay)
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    return jsonify({
+        "message": "Ledger compacted", "elapsed_ms": elapsed_ms, **result
+    }), 200
+
+
 @routes.route('/promote-students', methods=['POST'])
 
 def promote_students_route():
-    promote_students()  # Call the function for student promotion
-    return jsonify({"message": "students rollover was successfulll. congratulations 🎉"}),200
+    started = time.perf_counter()
+    result = promote_students()  # Call the function for student promotion
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    return jsonify({
+        "message": "students rollover was successfulll. congratulations 🎉",
+        "elapsed_ms": elapsed_ms,
+        **result,
+    }), 200
+
 
 # Route to add a grade
 @routes.route('/grades', methods=['POST'])
@@ -612,22 +1325,87 @@ def add_grade():
         if existing_grade:
             return jsonify({"error": "Grade already exists."}), 400
 
+        next_grade_id = data.get('next_grade_id')
+        if next_grade_id is not None and not Grade.query.get(next_grade_id):
+            return jsonify({"error": "Next grade not found."}), 400
+
         # Add new grade
-        grade = Grade(name=name)
+        grade = Grade(
+            name=name,
+            next_grade_id=next_grade_id,
+            is_final=bool(data.get('is_final', False)),
+        )
         db.session.add(grade)
         db.session.commit()
+        response_cache.bump('grade')
 
-        return jsonify({"message": f"Grade '{name}' added successfully."}), 201
+        return jsonify({
+            "message": f"Grade '{name}' added successfully.", "grade": grade.to_dict()
+        }), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+def _grade_chain_reaches(start_id, grade_id):
+    """True if following next_grade_id from start_id arrives at grade_id."""
+    links = dict(db.session.query(Grade.id, Grade.next_grade_id))
+    seen = set()
+    current = start_id
+    while current is not None and current not in seen:
+        if current == grade_id:
+            return True
+        seen.add(current)
+        current = links.get(current)
+    return False
+
+
+# Route to set where a grade's students go at promotion
+@routes.route('/grades/<int:grade_id>', methods=['PUT'])
+def update_grade(grade_id):
+    try:
+        grade = Grade.query.get(grade_id)
+        if not grade:
+            return jsonify({"error": "Grade not found."}), 404
+
+        data = request.get_json()
+        if 'name' in data:
+            grade.name = data['name']
+        if 'next_grade_id' in data:
+            next_grade_id = data['next_grade_id']
+            if next_grade_id is not None and not Grade.query.get(next_grade_id):
+                return jsonify({"error": "Invalid next grade."}), 400
+            # Promotion must end somewhere: no grade may lead back to itself
+            if next_grade_id is not None and _grade_chain_reaches(
+                next_grade_id, grade.id
+            ):
+                return jsonify({
+                    "error": "Next grade would make the progression loop back."
+                }), 400
+            grade.next_grade_id = next_grade_id
+        if 'is_final' in data:
+            grade.is_final = bool(data['is_final'])
+
+        db.session.commit()
+        response_cache.bump('grade')
+        return jsonify({
+            "message": "Grade updated successfully.", "grade": grade.to_dict()
+        }), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 # Route to get all grades
 @routes.route('/grades', methods=['GET'])
+@cached_response('grade')
 def get_grades():
     try:
         grades = Grade.query.all()
-        grades_data = [{"id": grade.id, "grade": grade.name} for grade in grades]
+        grades_data = [{
+            "id": grade.id,
+            "grade": grade.name,
+            "next_grade_id": grade.next_grade_id,
+            "is_final": grade.is_final
+        } for grade in grades]
         return jsonify(grades_data), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -641,7 +1419,7 @@ def add_fee():
             return jsonify({'error': 'No JSON data provided'}), 400
 
         # Log the incoming data
-        print("Received data:", data)
+        app.logger.debug(f"Received fee data: {data}")
 
         # Retrieve required fields
         term_id = data.get('term_id')
@@ -651,6 +1429,10 @@ def add_fee():
         # Validate fields
         if term_id is None or grade_id is None or amount is None:
             return jsonify({'error': 'Missing term_id, grade_id, or amount'}), 400
+        try:
+            amount = to_cents(amount)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
         # Query Term and Grade using their primary key (id)
         term = Term.query.get(term_id)  # Get term by id
@@ -661,22 +1443,37 @@ def add_fee():
         if not grade:
             return jsonify({'error': f'Grade with id {grade_id} not found'}), 404
 
-        # Create a new Fee entry
-        fee = Fee(term_id=term_id, grade_id=grade_id, amount=amount)
-        db.session.add(fee)
+        # One fee per grade and term: posting again replaces the amount
+        fee = Fee.query.filter_by(term_id=term_id, grade_id=grade_id).first()
+        created = fee is None
+        if created:
+            fee = Fee(term_id=term_id, grade_id=grade_id, amount=amount)
+            db.session.add(fee)
+        else:
+            fee.amount = amount
         db.session.commit()
+        fee_schedule.invalidate()
+        response_cache.bump('fee')
 
         # Return the fee data
-        return jsonify({'message': 'Fee added successfully!', 'fee': fee.to_dict()}), 201
+        if created:
+            return jsonify({'message': 'Fee added successfully!', 'fee': fee.to_dict()}), 201
+        return jsonify({
+            'message': 'Fee updated successfully!', 'fee': fee.to_dict()
+        }), 200
 
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @routes.route('/fees/<int:term_id>/<int:grade_id>', methods=['GET'])
+@cached_response('fee', 'term', 'grade')
 def get_fees_for_grade_in_term(term_id, grade_id):
     try:
         # Query the Fee for the specific term and grade
-        fees = Fee.query.filter_by(term_id=term_id, grade_id=grade_id).all()
+        fees = Fee.query.options(joinedload(Fee.term), joinedload(Fee.grade)) \
+            .filter_by(term_id=term_id, grade_id=grade_id) \
+            .all()
 
         if not fees:
             return jsonify({'message': f'No fees found for term {term_id} and grade {grade_id}'}), 404
@@ -687,6 +1484,7 @@ def get_fees_for_grade_in_term(term_id, grade_id):
         return jsonify({'error': str(e)}), 500
 
 @routes.route('/fee-structure/<int:term_id>', methods=['GET'])
+@cached_response('fee', 'grade')
 def generate_fee_structure_for_term(term_id):
     try:
         # Query all grades for the specific term and their associated fees
@@ -700,7 +1498,12 @@ def generate_fee_structure_for_term(term_id):
             return jsonify({'message': f'No fee structure found for term {term_id}'}), 404
 
         # Return the fee structure
-        return jsonify({'fee_structure': [{'grade_name': grade_name, 'total_fee': total_fee} for grade_name, total_fee in fee_structure]}), 200
+        return jsonify({
+            'fee_structure': [
+                {'grade_name': grade_name, 'total_fee': from_cents(total_fee)}
+                for grade_name, total_fee in fee_structure
+            ]
+        }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
         
\ No newline at end of file
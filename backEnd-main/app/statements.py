@@ -0,0 +1,314 @@
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+from flask import current_app, has_request_context
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from app.ledger import BUS, PAYMENT_KINDS
+from app.models import (
+    BusDestination,
+    BusPayment,
+    Grade,
+    LedgerEntry,
+    Payment,
+    Student,
+    Term,
+    db,
+)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+# Below this many students a process pool costs more than it saves
+POOL_THRESHOLD = 200
+
+
+@lru_cache(maxsize=None)
+def _template():
+    """Compiled statement template, loaded once per process."""
+    environment = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        autoescape=select_autoescape(['html']),
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    environment.filters['money'] = lambda cents: f"{(cents or 0) / 100:,.2f}"
+    return environment.get_template('statements/statement.html')
+
+
+def _filename(value):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', str(value)) or '_'
+
+
+def load_statement_data(grade_id=None, student_ids=None, term_ids=None):
+    """
+    Everything the statements of one grade (or a list of students) need,
+    pre-grouped per student.
+
+    Students, payments, bus payments and ledger charges are each read with one
+    set-based query for the whole batch, then grouped in memory into plain
+    dicts that can be handed to worker processes. Amounts stay in cents.
+    """
+    terms = [
+        (term_id, name)
+        for term_id, name in db.session.query(Term.id, Term.name).order_by(
+            Term.start_date, Term.id
+        )
+        if not term_ids or term_id in term_ids
+    ]
+    term_filter = [term_id for term_id, _ in terms]
+
+    if student_ids is not None:
+        batch = [Student.id.in_(student_ids)]
+    else:
+        batch = [Student.grade_id == grade_id, Student.is_archived.is_(False)]
+
+    def in_batch(query, student_id):
+        return query.join(Student, Student.id == student_id).filter(*batch)
+
+    rows = (
+        db.session.query(
+            Student.id,
+            Student.name,
+            Student.admission_number,
+            Grade.name,
+            Student.is_boarding,
+            Student.use_bus,
+            BusDestination.name,
+            Student.balance,
+            Student.arrears,
+            Student.prepayment,
+            Student.bus_balance,
+        )
+        .outerjoin(Grade, Grade.id == Student.grade_id)
+        .outerjoin(BusDestination, BusDestination.id == Student.destination_id)
+        .filter(*batch)
+    )
+
+    students = {}
+    for (
+        student_id,
+        name,
+        admission_number,
+        grade,
+        is_boarding,
+        use_bus,
+        destination,
+        balance,
+        arrears,
+        prepayment,
+        bus_balance,
+    ) in rows.order_by(Student.admission_number):
+        students[student_id] = {
+            "id": student_id,
+            "name": name,
+            "admission_number": admission_number,
+            "grade": grade or "N/A",
+            "is_boarding": is_boarding,
+            "use_bus": use_bus,
+            "destination": destination,
+            "balance": balance or 0,
+            "arrears": arrears or 0,
+            "prepayment": prepayment or 0,
+            "bus_balance": bus_balance or 0,
+            "brought_forward": 0,
+            "terms": {
+                term_id: {
+                    "name": name,
+                    "charged": 0,
+                    "bus_charged": 0,
+                    "payments": [],
+                    "bus_payments": [],
+                    "paid": 0,
+                    "bus_paid": 0,
+                }
+                for term_id, name in terms
+            },
+        }
+    if not students:
+        return []
+
+    payments = (
+        in_batch(
+            db.session.query(
+                Payment.student_id,
+                Payment.term_id,
+                Payment.date,
+                Payment.method,
+                Payment.amount,
+                Payment.description,
+            ),
+            Payment.student_id,
+        )
+        .filter(Payment.term_id.in_(term_filter))
+        .order_by(Payment.student_id, Payment.date, Payment.id)
+    )
+    for student_id, term_id, date, method, amount, description in payments:
+        term = students[student_id]["terms"][term_id]
+        term["payments"].append({
+            "date": date.strftime('%Y-%m-%d'),
+            "method": method,
+            "amount": amount,
+            "description": description,
+        })
+        term["paid"] += amount
+
+    bus_payments = (
+        in_batch(
+            db.session.query(
+                BusPayment.student_id,
+                BusPayment.term_id,
+                BusPayment.payment_date,
+                BusPayment.amount,
+            ),
+            BusPayment.student_id,
+        )
+        .filter(BusPayment.term_id.in_(term_filter))
+        .order_by(BusPayment.student_id, BusPayment.payment_date, BusPayment.id)
+    )
+    for student_id, term_id, date, amount in bus_payments:
+        term = students[student_id]["terms"][term_id]
+        term["bus_payments"].append(
+            {"date": date.strftime('%Y-%m-%d') if date else "", "amount": amount}
+        )
+        term["bus_paid"] += amount
+
+    # Charges come from the ledger; payments are listed individually above
+    charges = (
+        in_batch(
+            db.session.query(
+                LedgerEntry.student_id,
+                LedgerEntry.term_id,
+                LedgerEntry.account,
+                db.func.sum(LedgerEntry.amount),
+            ),
+            LedgerEntry.student_id,
+        )
+        .filter(LedgerEntry.kind.notin_(PAYMENT_KINDS))
+        .group_by(LedgerEntry.student_id, LedgerEntry.term_id, LedgerEntry.account)
+    )
+    for student_id, term_id, account, amount in charges:
+        student = students[student_id]
+        if term_id is None:
+            student["brought_forward"] += int(amount) if account != BUS else 0
+        elif term_id in student["terms"]:
+            student["terms"][term_id][
+                "bus_charged" if account == BUS else "charged"
+            ] += int(amount)
+
+    for student in students.values():
+        student["terms"] = [
+            term
+            for term in student["terms"].values()
+            if term["charged"]
+            or term["bus_charged"]
+            or term["payments"]
+            or term["bus_payments"]
+        ]
+    return list(students.values())
+
+
+def render_statements(students, generated_at):
+    """Render pre-grouped statement data to [(relative path, html)] in a worker."""
+    template = _template()
+    return [
+        (f"{_filename(student['grade'])}/{_filename(student['admission_number'])}.html",
+         template.render(student=student, generated_at=generated_at))
+        for student in students
+    ]
+
+
+def render_statement(student_id, term_ids=None):
+    """HTML statement for a single student, or None when the student doesn't exist."""
+    students = load_statement_data(student_ids=[student_id], term_ids=term_ids)
+    if not students:
+        return None
+    return render_statements(
+        students, datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')
+    )[0][1]
+
+
+class _StatementWriter:
+    """
+    Writes rendered statements into a .zip archive (a path ending in .zip, or
+    an open file) or under a directory.
+    """
+
+    def __init__(self, output):
+        is_archive = hasattr(output, 'write') or str(output).endswith('.zip')
+        self.archive = (
+            zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) if is_archive else None
+        )
+        self.directory = None if self.archive else output
+        self.files = 0
+
+    def write(self, rendered):
+        for path, html in rendered:
+            if self.archive:
+                self.archive.writestr(path, html)
+            else:
+                target = os.path.join(self.directory, path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'w', encoding='utf-8') as f:
+                    f.write(html)
+            self.files += 1
+
+    def close(self):
+        if self.archive:
+            self.archive.close()
+
+
+def generate_statements(output, grade_ids=None, term_ids=None):
+    """
+    Render fee statements for every active student, one grade per batch.
+
+    Each grade's data is loaded with a fixed number of bulk queries and handed
+    to a process pool for rendering while the next grade loads; small runs,
+    and runs inside a request (GET /statements), are rendered in-process.
+    `output` is a path ending in .zip, an open binary file to write a zip
+    into, or a directory.
+    Returns a summary dict.
+    """
+    started = time.perf_counter()
+    if grade_ids is None:
+        grade_ids = [
+            grade_id for (grade_id,) in db.session.query(Grade.id).order_by(Grade.id)
+        ]
+    generated_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')
+    active = Student.query.filter(
+        Student.grade_id.in_(grade_ids), Student.is_archived.is_(False)
+    ).count()
+
+    writer = _StatementWriter(output)
+    grades = 0
+    try:
+        if active < POOL_THRESHOLD or has_request_context():
+            for grade_id in grade_ids:
+                students = load_statement_data(grade_id=grade_id, term_ids=term_ids)
+                grades += bool(students)
+                writer.write(render_statements(students, generated_at))
+        else:
+            workers = current_app.config.get('STATEMENT_WORKERS') or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = []
+                for grade_id in grade_ids:
+                    students = load_statement_data(grade_id=grade_id, term_ids=term_ids)
+                    if students:
+                        grades += 1
+                        futures.append(
+                            executor.submit(render_statements, students, generated_at)
+                        )
+                for future in futures:
+                    writer.write(future.result())
+    finally:
+        writer.close()
+
+    return {
+        "output": output if isinstance(output, str) else None,
+        "grades": grades,
+        "statements": writer.files,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,247 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+
+from flask import current_app, has_request_context
+from werkzeug.security import generate_password_hash
+
+from app.batches import as_bool, parse_batch
+from app.fees import fee_schedule
+from app.ledger import BUS, FEES
+from app.models import BusDestination, Grade, LedgerEntry, Student, Term, db
+from app.money import from_cents, to_cents
+from app.passwords import hash_method, intake_hash_method
+
+# Keep IN lists well under SQLite's bound-parameter limit
+IN_CHUNK_SIZE = 900
+# Below this many passwords a process pool costs more than it saves
+POOL_THRESHOLD = 32
+
+
+def parse_student_batch(raw, content_type):
+    """Turn a CSV or JSON request body into a list of student row dicts."""
+    return parse_batch(raw, content_type, 'students')
+
+
+def hash_passwords(rows):
+    """
+    Hash the passwords of admitted rows in place.
+
+    Default passwords (the admission number) use the cheap INTAKE_HASH_METHOD;
+    login upgrades them to PASSWORD_HASH_METHOD, so an intake does not pay a
+    scrypt per student. Chosen passwords get the configured method, spread
+    over a process pool for large batches outside a request (flask
+    import-students).
+    """
+    chosen = [row for row in rows if row["password"]]
+    intake_method = intake_hash_method()
+    for row in rows:
+        if not row["password"]:
+            row["password"] = generate_password_hash(
+                row["admission_number"], method=intake_method
+            )
+
+    hasher = partial(generate_password_hash, method=hash_method())
+    passwords = [row["password"] for row in chosen]
+    if len(passwords) < POOL_THRESHOLD or has_request_context():
+        hashes = [hasher(password) for password in passwords]
+    else:
+        workers = (
+            current_app.config.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1
+        )
+        chunksize = max(len(passwords) // (workers * 4), 1)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            hashes = list(executor.map(hasher, passwords, chunksize=chunksize))
+    for row, password_hash in zip(chosen, hashes, strict=True):
+        row["password"] = password_hash
+
+
+def _parse_row(row, grades, destinations):
+    """Validate one admission row against preloaded grades/destinations (ValueError)."""
+    cleaned = {}
+    for field in ("name", "admission_number", "phone"):
+        value = str(row.get(field) or '').strip()
+        if not value:
+            raise ValueError(f"{field} is required.")
+        cleaned[field] = value
+
+    if row.get("grade_id"):
+        grade_id = grades["id"].get(str(row["grade_id"]).strip())
+    else:
+        grade_id = grades["name"].get(str(row.get("grade") or '').strip())
+    if grade_id is None:
+        raise ValueError("Grade not found.")
+    cleaned["grade_id"] = grade_id
+
+    cleaned["is_boarding"] = as_bool(row.get("is_boarding", False))
+    cleaned["use_bus"] = as_bool(row.get("use_bus", False))
+    cleaned["destination_id"] = None
+    if cleaned["use_bus"]:
+        if row.get("destination_id"):
+            cleaned["destination_id"] = destinations["id"].get(
+                str(row["destination_id"]).strip()
+            )
+        elif row.get("destination"):
+            cleaned["destination_id"] = destinations["name"].get(
+                str(row["destination"]).strip()
+            )
+        else:
+            raise ValueError("Bus destination is required when 'use_bus' is True.")
+        if cleaned["destination_id"] is None:
+            raise ValueError("Invalid bus destination.")
+
+    try:
+        cleaned["arrears"] = to_cents(row.get("arrears") or 0)
+        cleaned["bus_balance"] = to_cents(row.get("bus_balance") or 0)
+    except (TypeError, ValueError) as e:
+        raise ValueError("arrears and bus_balance must be numbers.") from e
+
+    # Empty means the default, the admission number
+    cleaned["password"] = str(row.get("password") or '')
+    return cleaned
+
+
+def _opening_entries(students, term_id):
+    """
+    Ledger rows for newly admitted (student_id, cleaned row) pairs: carried
+    arrears, term fees and bus balance.
+    """
+    posted_at = datetime.utcnow()
+    entries = []
+    for student_id, cleaned in students:
+        for account, kind, amount, entry_term_id in (
+            (FEES, 'opening', cleaned["arrears"], None),
+            (FEES, 'charge', cleaned["balance"] - cleaned["prepayment"], term_id),
+            (BUS, 'opening', cleaned["bus_balance"], None),
+        ):
+            if amount:
+                entries.append({
+                    "student_id": student_id,
+                    "account": account,
+                    "kind": kind,
+                    "amount": amount,
+                    "term_id": entry_term_id,
+                    "payment_id": None,
+                    "posted_at": posted_at,
+                    "description": "",
+                })
+    return entries
+
+
+def import_students(rows, atomic=False):
+    """
+    Admit a batch of students in one transaction.
+
+    Grades, destinations and existing admission numbers are loaded with a
+    handful of set-based queries, opening balances come from the fee schedule
+    a grade at a time, default passwords get a cheap hash (see hash_passwords)
+    and all students are written with a single bulk INSERT, followed by one
+    for their opening ledger entries. Invalid rows are reported and skipped;
+    with atomic=True any invalid row rejects the whole batch.
+
+    Returns {"imported": n, "failed": n, "results": [per-row dicts]}.
+    """
+    active_term = Term.get_active_term()
+    if not active_term:
+        raise ValueError("No active term found.")
+
+    # Grades and destinations can be referenced by id (grade_id) or by name (grade)
+    grades = {"id": {}, "name": {}}
+    for grade_id, name in db.session.query(Grade.id, Grade.name):
+        grades["id"][str(grade_id)] = grades["name"][name] = grade_id
+    destinations = {"id": {}, "name": {}}
+    for destination_id, name in db.session.query(
+        BusDestination.id, BusDestination.name
+    ):
+        destinations["id"][str(destination_id)] = destination_id
+        destinations["name"][name] = destination_id
+
+    results, parsed, seen = [], [], set()
+    for number, row in enumerate(rows, 1):
+        try:
+            cleaned = _parse_row(row, grades, destinations)
+            if cleaned["admission_number"] in seen:
+                raise ValueError("Admission number repeated in this batch.")
+            seen.add(cleaned["admission_number"])
+            parsed.append((number, cleaned))
+        except (ValueError, AttributeError) as e:
+            results.append({"line": number, "ok": False, "error": str(e)})
+
+    admission_numbers = list(seen)
+    existing = set()
+    for i in range(0, len(admission_numbers), IN_CHUNK_SIZE):
+        chunk = admission_numbers[i:i + IN_CHUNK_SIZE]
+        existing.update(
+            number
+            for (number,) in db.session.query(Student.admission_number).filter(
+                Student.admission_number.in_(chunk)
+            )
+        )
+
+    by_grade = {}
+    for number, cleaned in parsed:
+        if cleaned["admission_number"] in existing:
+            results.append({
+                "line": number,
+                "ok": False,
+                "error": "Admission number already exists.",
+            })
+            continue
+        by_grade.setdefault(cleaned["grade_id"], []).append((number, cleaned))
+
+    accepted = []
+    for grade_id, grade_rows in by_grade.items():
+        try:
+            balances = fee_schedule.opening_balances(
+                grade_id,
+                active_term.id,
+                [(cleaned["is_boarding"], 0) for _, cleaned in grade_rows],
+            )
+        except ValueError as e:
+            results += [
+                {"line": number, "ok": False, "error": str(e)}
+                for number, _ in grade_rows
+            ]
+            continue
+        for (number, cleaned), (balance, prepayment) in zip(
+            grade_rows, balances, strict=True
+        ):
+            cleaned["balance"], cleaned["prepayment"] = balance, prepayment
+            accepted.append((number, cleaned))
+
+    failed = len(results)
+    if (atomic and failed) or not accepted:
+        results.sort(key=lambda result: result["line"])
+        return {"imported": 0, "failed": failed, "results": results}
+
+    accepted.sort(key=lambda item: item[0])
+    hash_passwords([cleaned for _, cleaned in accepted])
+
+    try:
+        ids = dict(
+            db.session.execute(
+                db.insert(Student).returning(Student.admission_number, Student.id),
+                [cleaned for _, cleaned in accepted],
+            ).all()
+        )
+        entries = _opening_entries(
+            ((ids[cleaned["admission_number"]], cleaned) for _, cleaned in accepted),
+            active_term.id,
+        )
+        if entries:
+            db.session.execute(db.insert(LedgerEntry), entries)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    results += [{
+        "line": number,
+        "ok": True,
+        "student_id": ids[cleaned["admission_number"]],
+        "admission_number": cleaned["admission_number"],
+        "balance": from_cents(cleaned["balance"]),
+    } for number, cleaned in accepted]
+    results.sort(key=lambda result: result["line"])
+    return {"imported": len(accepted), "failed": failed, "results": results}
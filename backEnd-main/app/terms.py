@@ -0,0 +1,93 @@
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import g, has_request_context
+
+from app.cache import Cache
+
+
+class ActiveTerm(namedtuple('ActiveTerm', ['id', 'name', 'start_date', 'end_date'])):
+    """Detached snapshot of the active Term, safe to share between requests."""
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "start_date": self.start_date.isoformat(),
+            "end_date": self.end_date.isoformat()
+        }
+
+
+class ActiveTermCache:
+    """
+    Cache of the active term, kept in the shared cache backend (see app.cache).
+
+    An entry lives until the term's end_date has passed or until the next UTC
+    midnight, whichever is sooner, so date boundaries never serve a stale term.
+    Within a request the result is also memoised on flask.g.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = Cache('active_term', max_entries=1)
+        self.request_hits = 0
+
+    def get(self, loader):
+        if has_request_context() and '_active_term' in g:
+            with self._lock:
+                self.request_hits += 1
+            return g._active_term
+
+        now = datetime.utcnow()
+
+        def load():
+            term = loader()
+            return (
+                ActiveTerm(term.id, term.name, term.start_date, term.end_date)
+                if term
+                else None
+            )
+
+        term = self._cache.get_or_load(
+            'active',
+            load,
+            ttl=lambda term: (self._expiry(term, now) - now).total_seconds(),
+        )
+
+        if has_request_context():
+            g._active_term = term
+        return term
+
+    @staticmethod
+    def _expiry(term, now):
+        expires_at = datetime.combine(
+            now.date() + timedelta(days=1), datetime.min.time()
+        )
+        if term:
+            term_over = datetime.combine(
+                term.end_date + timedelta(days=1), datetime.min.time()
+            )
+            expires_at = min(expires_at, term_over)
+        return expires_at
+
+    def invalidate(self):
+        self._cache.invalidate()
+        if has_request_context():
+            g.pop('_active_term', None)
+
+    def stats(self):
+        stats = self._cache.stats()
+        with self._lock:
+            request_hits = self.request_hits
+        lookups = request_hits + stats["hits"] + stats["misses"]
+        return {
+            "request_hits": request_hits,
+            **stats,
+            "hit_rate": (
+                round((request_hits + stats["hits"]) / lookups, 4) if lookups else None
+            ),
+        }
+
+
+active_term_cache = ActiveTermCache()
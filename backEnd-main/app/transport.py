@@ -0,0 +1,280 @@
+from datetime import datetime
+
+from app.cache import Cache
+from app.ledger import BUS
+from app.models import BusDestination, BusPayment, Grade, LedgerEntry, Student, Term, db
+
+
+def rider_filters():
+    """Students who ride the bus: with a destination, flagged use_bus and enrolled."""
+    return [
+        Student.use_bus.is_(True),
+        Student.destination_id.isnot(None),
+        Student.is_archived.is_(False),
+    ]
+
+
+def rosters(destination_id=None):
+    """
+    Riders per destination from one joined query, as a list of destination dicts.
+
+    Destinations without riders are included with an empty roster. Amounts are
+    in cents.
+    """
+    riders = db.and_(Student.destination_id == BusDestination.id, *rider_filters())
+    query = (
+        db.session.query(
+            BusDestination.id,
+            BusDestination.name,
+            BusDestination.charge,
+            Student.id,
+            Student.name,
+            Student.admission_number,
+            Grade.name,
+            Student.bus_balance,
+        )
+        .outerjoin(Student, riders)
+        .outerjoin(Grade, Grade.id == Student.grade_id)
+    )
+    if destination_id is not None:
+        query = query.filter(BusDestination.id == destination_id)
+
+    result = {}
+    for (
+        destination_id_,
+        destination,
+        charge,
+        student_id,
+        name,
+        admission_number,
+        grade,
+        bus_balance,
+    ) in query.order_by(
+        BusDestination.name, BusDestination.id, Student.name, Student.id
+    ):
+        roster = result.setdefault(
+            destination_id_,
+            {
+                "id": destination_id_,
+                "name": destination,
+                "charge": charge,
+                "students": [],
+            },
+        )
+        if student_id is not None:
+            roster["students"].append({
+                "id": student_id,
+                "name": name,
+                "admission_number": admission_number,
+                "grade": grade,
+                "bus_balance": bus_balance or 0,
+            })
+    return list(result.values())
+
+
+def _already_billed(term_id):
+    return db.exists().where(
+        LedgerEntry.student_id == Student.id,
+        LedgerEntry.account == BUS,
+        LedgerEntry.kind == 'charge',
+        LedgerEntry.term_id == term_id,
+    )
+
+
+def bill_term(term_id, dry_run=False):
+    """
+    Charge every rider their destination's termly fare for `term_id`.
+
+    Riders already billed for the term are skipped, so a re-run only picks up
+    students who started riding since. The charge is added to bus_balance with
+    a single UPDATE and recorded with a single INSERT ... SELECT into the
+    ledger, in one transaction. Returns a per-destination summary (cents), or
+    None when the term doesn't exist.
+    """
+    term = db.session.get(Term, term_id)
+    if not term:
+        return None
+
+    pending = [*rider_filters(), ~_already_billed(term_id)]
+    preview = (
+        db.session.query(
+            BusDestination.id,
+            BusDestination.name,
+            BusDestination.charge,
+            db.func.count(Student.id),
+        )
+        .join(Student, Student.destination_id == BusDestination.id)
+        .filter(*pending)
+        .group_by(BusDestination.id, BusDestination.name, BusDestination.charge)
+        .order_by(BusDestination.name)
+        .all()
+    )
+
+    result = {
+        "term": term.to_dict(),
+        "dry_run": dry_run,
+        "destinations": [
+            {
+                "destination_id": destination_id,
+                "destination": name,
+                "charge": charge,
+                "students": count,
+                "total": charge * count,
+            }
+            for destination_id, name, charge, count in preview
+        ],
+        "students_billed": 0,
+    }
+    if dry_run or not preview:
+        return result
+
+    charge = (
+        db.select(BusDestination.charge)
+        .where(BusDestination.id == Student.destination_id)
+        .scalar_subquery()
+    )
+    entries = (
+        db.select(
+            Student.id,
+            db.literal(BUS),
+            db.literal('charge'),
+            BusDestination.charge,
+            db.literal(term_id),
+            db.literal(datetime.utcnow()),
+            db.literal(f"Bus fare {term.name}"),
+        )
+        .join(BusDestination, BusDestination.id == Student.destination_id)
+        .where(*pending)
+    )
+    try:
+        # Update first: the pending filter looks for this term's ledger entries,
+        # which the INSERT then adds
+        result["students_billed"] = Student.query.filter(*pending).update({
+            Student.bus_balance: db.func.coalesce(Student.bus_balance, 0) + charge,
+            Student.version: Student.version + 1,
+        }, synchronize_session=False)
+        db.session.execute(
+            db.insert(LedgerEntry).from_select(
+                [
+                    'student_id',
+                    'account',
+                    'kind',
+                    'amount',
+                    'term_id',
+                    'posted_at',
+                    'description',
+                ],
+                entries,
+            )
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    transport_summary_cache.invalidate()
+    return result
+
+
+def outstanding(destination_id=None):
+    """Riders who owe bus fare, largest balance first; amounts in cents."""
+    query = (
+        db.session.query(
+            Student.id,
+            Student.name,
+            Student.admission_number,
+            BusDestination.id,
+            BusDestination.name,
+            Student.bus_balance,
+        )
+        .join(BusDestination, BusDestination.id == Student.destination_id)
+        .filter(*rider_filters(), Student.bus_balance > 0)
+    )
+    if destination_id is not None:
+        query = query.filter(BusDestination.id == destination_id)
+    return [{
+        "student_id": student_id,
+        "name": name,
+        "admission_number": admission_number,
+        "destination_id": destination_id_,
+        "destination": destination,
+        "bus_balance": bus_balance,
+    } for student_id, name, admission_number, destination_id_, destination, bus_balance
+        in query.order_by(Student.bus_balance.desc(), Student.id)]
+
+
+def destination_summary(term_id):
+    """
+    Per-destination riders, outstanding balances, fares billed and fares
+    collected for a term.
+
+    Three grouped queries regardless of the number of riders; amounts in cents.
+    """
+    riders = db.and_(Student.destination_id == BusDestination.id, *rider_filters())
+    owing = db.case((Student.bus_balance > 0, 1), else_=0)
+    rows = db.session.query(
+        BusDestination.id, BusDestination.name, BusDestination.charge,
+        db.func.count(Student.id),
+        db.func.coalesce(db.func.sum(Student.bus_balance), 0),
+        db.func.coalesce(db.func.sum(owing), 0),
+    ).outerjoin(Student, riders) \
+        .group_by(BusDestination.id, BusDestination.name, BusDestination.charge) \
+        .order_by(BusDestination.name, BusDestination.id) \
+        .all()
+
+    billed = dict(
+        db.session.query(Student.destination_id, db.func.sum(LedgerEntry.amount))
+        .join(Student, Student.id == LedgerEntry.student_id)
+        .filter(
+            LedgerEntry.account == BUS,
+            LedgerEntry.kind == 'charge',
+            LedgerEntry.term_id == term_id,
+        )
+        .group_by(Student.destination_id)
+        .all()
+    )
+    collected = dict(
+        db.session.query(BusPayment.destination_id, db.func.sum(BusPayment.amount))
+        .filter(BusPayment.term_id == term_id)
+        .group_by(BusPayment.destination_id)
+        .all()
+    )
+
+    return [{
+        "destination_id": destination_id,
+        "destination": name,
+        "charge": charge,
+        "riders": riders_,
+        "students_owing": int(students_owing),
+        "outstanding": int(balance),
+        "billed": int(billed.get(destination_id) or 0),
+        "collected": int(collected.get(destination_id) or 0),
+    } for destination_id, name, charge, riders_, balance, students_owing in rows]
+
+
+class TransportSummaryCache:
+    """
+    Cache of destination_summary() per term, in the shared cache backend
+    (see app.cache).
+
+    Entries expire after TRANSPORT_SUMMARY_TTL seconds and are dropped early by
+    invalidate(), which billing, bus payments and bus assignments call. Drivers
+    and the bursar poll the summary; it only needs to be fresh to within a minute.
+    """
+
+    def __init__(self):
+        self._cache = Cache(
+            'transport_summary', ttl='TRANSPORT_SUMMARY_TTL', max_entries=32
+        )
+
+    def get(self, term_id):
+        return self._cache.get_or_load(term_id, lambda: destination_summary(term_id))
+
+    def invalidate(self):
+        self._cache.invalidate()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+transport_summary_cache = TransportSummaryCache()
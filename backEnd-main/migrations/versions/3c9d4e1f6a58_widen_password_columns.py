@@ -0,0 +1,40 @@
+"""widen password hash columns
+
+Revision ID: 3c9d4e1f6a58
+Revises: e5a2f8c31b07
+Create Date: 2026-10-18 12:41:19.804472
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3c9d4e1f6a58'
+down_revision = 'e5a2f8c31b07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # scrypt hashes are ~160 characters, longer than the old String(100)
+    with op.batch_alter_table('staff', schema=None) as batch_op:
+        batch_op.alter_column(
+            'password', existing_type=sa.String(length=100), type_=sa.String(length=255)
+        )
+
+    with op.batch_alter_table('student', schema=None) as batch_op:
+        batch_op.alter_column(
+            'password', existing_type=sa.String(length=100), type_=sa.String(length=255)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('student', schema=None) as batch_op:
+        batch_op.alter_column(
+            'password', existing_type=sa.String(length=255), type_=sa.String(length=100)
+        )
+
+    with op.batch_alter_table('staff', schema=None) as batch_op:
+        batch_op.alter_column(
+            'password', existing_type=sa.String(length=255), type_=sa.String(length=100)
+        )
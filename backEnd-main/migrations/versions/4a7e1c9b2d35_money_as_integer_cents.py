@@ -0,0 +1,84 @@
+"""store money as integer cents
+
+Revision ID: 4a7e1c9b2d35
+Revises: d82c6e4a1f90
+Create Date: 2026-10-18 16:20:41.183527
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '4a7e1c9b2d35'
+down_revision = 'd82c6e4a1f90'
+branch_labels = None
+depends_on = None
+
+
+# (table, column, nullable) for every money column
+MONEY_COLUMNS = [
+    ('student', 'balance', True),
+    ('student', 'arrears', True),
+    ('student', 'prepayment', True),
+    ('student', 'bus_balance', True),
+    ('payment', 'amount', False),
+    ('payment', 'balance_after_payment', False),
+    ('payment_daily_rollup', 'total', False),
+    ('fees', 'amount', False),
+    ('boarding_fee', 'extra_fee', False),
+    ('bus_destination', 'charge', False),
+    ('bus_payment', 'amount', False),
+]
+
+
+def _tables():
+    tables = {}
+    for table, column, nullable in MONEY_COLUMNS:
+        tables.setdefault(table, []).append((column, nullable))
+    return tables
+
+
+def upgrade():
+    # Batch mode can't carry expression indexes across the SQLite table rebuild
+    op.drop_index('ix_student_admission_number_lower', table_name='student')
+    for table, columns in _tables().items():
+        # Round to whole cents while the columns are still floating point
+        op.execute(
+            f"UPDATE {table} SET "
+            + ", ".join(f"{column} = ROUND({column} * 100)" for column, _ in columns)
+        )
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column, nullable in columns:
+                batch_op.alter_column(
+                    column,
+                    existing_type=sa.Float(),
+                    type_=sa.BigInteger(),
+                    existing_nullable=nullable,
+                )
+    op.create_index(
+        'ix_student_admission_number_lower',
+        'student',
+        [sa.text('lower(admission_number)')],
+    )
+
+
+def downgrade():
+    op.drop_index('ix_student_admission_number_lower', table_name='student')
+    for table, columns in _tables().items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column, nullable in columns:
+                batch_op.alter_column(
+                    column,
+                    existing_type=sa.BigInteger(),
+                    type_=sa.Float(),
+                    existing_nullable=nullable,
+                )
+        op.execute(
+            f"UPDATE {table} SET "
+            + ", ".join(f"{column} = {column} / 100.0" for column, _ in columns)
+        )
+    op.create_index(
+        'ix_student_admission_number_lower',
+        'student',
+        [sa.text('lower(admission_number)')],
+    )
@@ -0,0 +1,82 @@
+"""ledger entries and balance snapshots
+
+Revision ID: 5b8d2f6e9a41
+Revises: 4a7e1c9b2d35
+Create Date: 2026-10-18 17:02:37.904215
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5b8d2f6e9a41'
+down_revision = '4a7e1c9b2d35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ledger_entry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('account', sa.String(length=10), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('amount', sa.BigInteger(), nullable=False),
+    sa.Column('term_id', sa.Integer(), nullable=True),
+    sa.Column('payment_id', sa.Integer(), nullable=True),
+    sa.Column('posted_at', sa.DateTime(), nullable=False),
+    sa.Column('description', sa.String(length=255), nullable=True),
+    sa.ForeignKeyConstraint(['payment_id'], ['payment.id'], ),
+    sa.ForeignKeyConstraint(['student_id'], ['student.id'], ),
+    sa.ForeignKeyConstraint(['term_id'], ['term.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_ledger_entry_student_id_id', 'ledger_entry', ['student_id', 'id']
+    )
+
+    op.create_table(
+        'balance_snapshot',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('last_entry_id', sa.Integer(), nullable=False),
+        sa.Column('as_of', sa.DateTime(), nullable=False),
+        sa.Column('fees_owed', sa.BigInteger(), nullable=False),
+        sa.Column('bus_owed', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['student_id'], ['student.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint(
+            'student_id',
+            'last_entry_id',
+            name='uq_balance_snapshot_student_id_last_entry_id',
+        ),
+    )
+    op.create_index(
+        'ix_balance_snapshot_student_id_as_of',
+        'balance_snapshot',
+        ['student_id', 'as_of'],
+    )
+
+    # Open every existing student's ledger at their current balances so it sums
+    # to what they owe today
+    owed = "COALESCE(arrears, 0) + COALESCE(balance, 0) - COALESCE(prepayment, 0)"
+    op.execute(
+        "INSERT INTO ledger_entry"
+        " (student_id, account, kind, amount, posted_at, description) "
+        f"SELECT id, 'fees', 'opening', {owed}, CURRENT_TIMESTAMP, 'Opening balance' "
+        f"FROM student WHERE {owed} <> 0"
+    )
+    op.execute(
+        "INSERT INTO ledger_entry"
+        " (student_id, account, kind, amount, posted_at, description) "
+        "SELECT id, 'bus', 'opening', bus_balance, CURRENT_TIMESTAMP,"
+        " 'Opening bus balance' "
+        "FROM student WHERE COALESCE(bus_balance, 0) <> 0"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_balance_snapshot_student_id_as_of', table_name='balance_snapshot')
+    op.drop_table('balance_snapshot')
+    op.drop_index('ix_ledger_entry_student_id_id', table_name='ledger_entry')
+    op.drop_table('ledger_entry')
@@ -0,0 +1,71 @@
+"""grade progression and archived students
+
+Revision ID: 7bb175c69af1
+Revises: 1e1aa275a41a
+Create Date: 2026-10-18 09:12:31.402118
+
+"""
+from itertools import pairwise
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '7bb175c69af1'
+down_revision = '1e1aa275a41a'
+branch_labels = None
+depends_on = None
+
+# The progression promote_students() used to hard-code; the last grade had no
+# next grade and its students stayed put
+LEGACY_GRADE_ORDER = ['baby', 'pp1', 'pp2', *(str(n) for n in range(1, 10))]
+
+
+def upgrade():
+    with op.batch_alter_table('grade', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('next_grade_id', sa.Integer(), nullable=True))
+        batch_op.add_column(
+            sa.Column(
+                'is_final', sa.Boolean(), nullable=False, server_default=sa.false()
+            )
+        )
+        batch_op.create_foreign_key(
+            'fk_grade_next_grade_id', 'grade', ['next_grade_id'], ['id']
+        )
+
+    with op.batch_alter_table('student', schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                'is_archived', sa.Boolean(), nullable=False, server_default=sa.false()
+            )
+        )
+
+    # Carry the old hard-coded chain over to the grades that exist
+    grade = sa.table(
+        'grade',
+        sa.column('id', sa.Integer),
+        sa.column('name', sa.String),
+        sa.column('next_grade_id', sa.Integer),
+    )
+    bind = op.get_bind()
+    ids = {
+        (name or '').strip().lower(): grade_id
+        for grade_id, name in bind.execute(sa.select(grade.c.id, grade.c.name))
+    }
+    for current, following in pairwise(LEGACY_GRADE_ORDER):
+        if current in ids and following in ids:
+            bind.execute(
+                grade.update()
+                .where(grade.c.id == ids[current])
+                .values(next_grade_id=ids[following])
+            )
+
+
+def downgrade():
+    with op.batch_alter_table('student', schema=None) as batch_op:
+        batch_op.drop_column('is_archived')
+
+    with op.batch_alter_table('grade', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_grade_next_grade_id', type_='foreignkey')
+        batch_op.drop_column('is_final')
+        batch_op.drop_column('next_grade_id')
@@ -0,0 +1,45 @@
+"""rollup school-local days
+
+Revision ID: 8c1f4d2a6b7e
+Revises: 5b8d2f6e9a41
+Create Date: 2026-10-18 20:41:12.503817
+
+"""
+from alembic import op
+from flask import current_app
+
+# revision identifiers, used by Alembic.
+revision = '8c1f4d2a6b7e'
+down_revision = '5b8d2f6e9a41'
+branch_labels = None
+depends_on = None
+
+
+def rebucket(offset_minutes):
+    """
+    Rebuild payment_daily_rollup with payments bucketed by their date shifted
+    offset_minutes east of UTC.
+    """
+    if op.get_bind().dialect.name == 'sqlite':
+        day = f"date(payment.date, '{offset_minutes:+d} minutes')"
+    else:
+        day = f"CAST(payment.date + INTERVAL '{offset_minutes} minutes' AS DATE)"
+    grade_id = "COALESCE(payment.grade_id, student.grade_id)"
+    op.execute("DELETE FROM payment_daily_rollup")
+    op.execute(
+        "INSERT INTO payment_daily_rollup"
+        " (date, term_id, grade_id, method, count, total) "
+        f"SELECT {day}, payment.term_id, {grade_id}, payment.method,"
+        " count(payment.id), sum(payment.amount) "
+        "FROM payment JOIN student ON student.id = payment.student_id "
+        f"GROUP BY {day}, payment.term_id, {grade_id}, payment.method"
+    )
+
+
+def upgrade():
+    # Rollup days were UTC; reports in the school's timezone can now be answered from it
+    rebucket(current_app.config.get('SCHOOL_TZ_OFFSET_MINUTES', 180))
+
+
+def downgrade():
+    rebucket(0)
@@ -0,0 +1,29 @@
+"""case-insensitive login lookup indexes
+
+Revision ID: 9f3a7b2c5d14
+Revises: 3c9d4e1f6a58
+Create Date: 2026-10-18 13:30:44.271906
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '9f3a7b2c5d14'
+down_revision = '3c9d4e1f6a58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_student_admission_number_lower',
+        'student',
+        [sa.text('lower(admission_number)')],
+    )
+    op.create_index('ix_staff_name_lower', 'staff', [sa.text('lower(name)')])
+
+
+def downgrade():
+    op.drop_index('ix_staff_name_lower', table_name='staff')
+    op.drop_index('ix_student_admission_number_lower', table_name='student')
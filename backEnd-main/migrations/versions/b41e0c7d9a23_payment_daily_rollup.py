@@ -0,0 +1,58 @@
+"""payment daily rollup
+
+Revision ID: b41e0c7d9a23
+Revises: 7bb175c69af1
+Create Date: 2026-10-18 10:04:52.118305
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'b41e0c7d9a23'
+down_revision = '7bb175c69af1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('grade_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            'fk_payment_grade_id', 'grade', ['grade_id'], ['id']
+        )
+
+    # Existing payments take the student's current grade
+    op.execute(
+        "UPDATE payment SET grade_id = "
+        "(SELECT student.grade_id FROM student WHERE student.id = payment.student_id)"
+    )
+
+    op.create_table('payment_daily_rollup',
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('term_id', sa.Integer(), nullable=False),
+    sa.Column('grade_id', sa.Integer(), nullable=False),
+    sa.Column('method', sa.String(length=20), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['grade_id'], ['grade.id'], ),
+    sa.ForeignKeyConstraint(['term_id'], ['term.id'], ),
+    sa.PrimaryKeyConstraint('date', 'term_id', 'grade_id', 'method')
+    )
+
+    op.execute(
+        "INSERT INTO payment_daily_rollup"
+        " (date, term_id, grade_id, method, count, total) "
+        "SELECT date(date), term_id, grade_id, method, count(id), sum(amount) "
+        "FROM payment "
+        "WHERE grade_id IS NOT NULL "
+        "GROUP BY date(date), term_id, grade_id, method"
+    )
+
+
+def downgrade():
+    op.drop_table('payment_daily_rollup')
+
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_payment_grade_id', type_='foreignkey')
+        batch_op.drop_column('grade_id')
@@ -0,0 +1,66 @@
+"""indexes for hot foreign keys and filter columns
+
+Revision ID: d82c6e4a1f90
+Revises: 9f3a7b2c5d14
+Create Date: 2026-10-18 14:05:12.660381
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'd82c6e4a1f90'
+down_revision = '9f3a7b2c5d14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the oldest fee for any duplicated (grade, term); the fee schedule
+    # already used it
+    op.execute(
+        "DELETE FROM fees WHERE id NOT IN "
+        "(SELECT min(id) FROM fees GROUP BY grade_id, term_id)"
+    )
+    with op.batch_alter_table('fees', schema=None) as batch_op:
+        batch_op.create_unique_constraint(
+            'uq_fees_grade_id_term_id', ['grade_id', 'term_id']
+        )
+        batch_op.create_index('ix_fees_term_id', ['term_id'])
+
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.create_index('ix_payment_student_id_date', ['student_id', 'date'])
+        batch_op.create_index('ix_payment_term_id', ['term_id'])
+        batch_op.create_index('ix_payment_date', ['date'])
+
+    with op.batch_alter_table('bus_payment', schema=None) as batch_op:
+        batch_op.create_index('ix_bus_payment_student_id', ['student_id'])
+        batch_op.create_index('ix_bus_payment_term_id', ['term_id'])
+
+    with op.batch_alter_table('student', schema=None) as batch_op:
+        batch_op.create_index('ix_student_grade_id', ['grade_id'])
+        batch_op.create_index('ix_student_destination_id', ['destination_id'])
+
+    with op.batch_alter_table('term', schema=None) as batch_op:
+        batch_op.create_index('ix_term_start_date_end_date', ['start_date', 'end_date'])
+
+
+def downgrade():
+    with op.batch_alter_table('term', schema=None) as batch_op:
+        batch_op.drop_index('ix_term_start_date_end_date')
+
+    with op.batch_alter_table('student', schema=None) as batch_op:
+        batch_op.drop_index('ix_student_destination_id')
+        batch_op.drop_index('ix_student_grade_id')
+
+    with op.batch_alter_table('bus_payment', schema=None) as batch_op:
+        batch_op.drop_index('ix_bus_payment_term_id')
+        batch_op.drop_index('ix_bus_payment_student_id')
+
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.drop_index('ix_payment_date')
+        batch_op.drop_index('ix_payment_term_id')
+        batch_op.drop_index('ix_payment_student_id_date')
+
+    with op.batch_alter_table('fees', schema=None) as batch_op:
+        batch_op.drop_index('ix_fees_term_id')
+        batch_op.drop_constraint('uq_fees_grade_id_term_id', type_='unique')
@@ -0,0 +1,39 @@
+"""payment idempotency key and student version
+
+Revision ID: e5a2f8c31b07
+Revises: b41e0c7d9a23
+Create Date: 2026-10-18 11:20:07.553190
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e5a2f8c31b07'
+down_revision = 'b41e0c7d9a23'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('student', schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column('version', sa.Integer(), nullable=False, server_default='1')
+        )
+
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column('idempotency_key', sa.String(length=64), nullable=True)
+        )
+        batch_op.create_unique_constraint(
+            'uq_payment_idempotency_key', ['idempotency_key']
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_payment_idempotency_key', type_='unique')
+        batch_op.drop_column('idempotency_key')
+
+    with op.batch_alter_table('student', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -1,6 +1,7 @@
 from datetime import datetime
 from app import create_app, db
 from app.models import Student, Staff, Fee, Grade, Term, BusDestination, BoardingFee, Class, Payment
+from app.money import to_cents
 import random
 
 def seed_data():
@@ -25,7 +26,7 @@ def seed_data():
     db.session.commit()
     print("Seeded grades:", ", ".join(grade_names))
 
-    # Seed fees for each term and grade
+    # Seed fees for each term and grade (shillings; stored as cents)
     term_fees = {
         "0": {term1.id: 6500, term2.id: 6700},
         "22": {term1.id: 7500, term2.id: 7700},
@@ -38,7 +39,9 @@ def seed_data():
 
     for grade_name, fee_data in term_fees.items():
         for term_id, amount in fee_data.items():
-            fee = Fee(term_id=term_id, grade_id=grades[grade_name].id, amount=amount)
+            fee = Fee(
+                term_id=term_id, grade_id=grades[grade_name].id, amount=to_cents(amount)
+            )
             db.session.add(fee)
     db.session.commit()
     print("Seeded fees for each term and grade.")
@@ -50,12 +53,14 @@ def seed_data():
         {"name": "Sigor", "charge": 1000},
     ]
     for destination in bus_destinations:
-        db.session.add(BusDestination(name=destination["name"], charge=destination["charge"]))
+        db.session.add(BusDestination(
+            name=destination["name"], charge=to_cents(destination["charge"])
+        ))
     db.session.commit()
     print("Seeded bus destinations.")
 
     # Seed boarding fee
-    boarding_fee = BoardingFee(extra_fee=4500)
+    boarding_fee = BoardingFee(extra_fee=to_cents(4500))
     db.session.add(boarding_fee)
     db.session.commit()
     print("Seeded boarding fee.")
@@ -92,10 +97,9 @@ def seed_data():
                     admission_number=f"ADM{grade.id}{stream[0]}{i:02d}",
                     grade_id=grade.id,
                     phone=f"07200000{i}",
-                    term_fee=term_fees[grade_name][term1.id],
                     use_bus=random.choice([True, False]),
-                    arrears=random.uniform(0, 1000),
-                    bus_balance=random.uniform(0, 500)
+                    arrears=to_cents(random.uniform(0, 1000)),
+                    bus_balance=to_cents(random.uniform(0, 500))
                 )
                 student.set_password(f"ADM{grade.id}{stream[0]}{i:02d}")
                 
@@ -0,0 +1,19 @@
+import pytest
+
+from app import create_app, db
+from app.diagnostics import ScratchConfig
+
+
+@pytest.fixture
+def app():
+    app = create_app(ScratchConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,110 @@
+from datetime import date, timedelta
+
+from app.ledger import BUS, ledger_mismatches, record_entry
+from app.models import BusDestination, BusPayment, Grade, Student, Term, db
+
+
+def seed_riders():
+    today = date.today()
+    term = Term(
+        name="Term 1",
+        start_date=today - timedelta(days=30),
+        end_date=today + timedelta(days=30),
+    )
+    grade = Grade(name="Grade 1")
+    near = BusDestination(name="Sigor", charge=100000)
+    far = BusDestination(name="Olesoi", charge=128800)
+    db.session.add_all([term, grade, near, far])
+    db.session.flush()
+    riders = []
+    for number, destination in (("A1", near), ("A2", far)):
+        student = Student(
+            name=number,
+            admission_number=number,
+            grade_id=grade.id,
+            phone="0700000000",
+            use_bus=True,
+            destination_id=destination.id,
+            bus_balance=destination.charge,
+            password="-",
+        )
+        db.session.add(student)
+        record_entry(student, 'charge', destination.charge, account=BUS)
+        riders.append(student)
+    db.session.commit()
+    return term, riders
+
+
+def bus_balances():
+    db.session.expire_all()
+    return {
+        student.admission_number: student.bus_balance
+        for student in Student.query.order_by(Student.admission_number)
+    }
+
+
+def test_bus_payment_defaults_to_the_active_term_and_own_destination(client):
+    term, (near_rider, far_rider) = seed_riders()
+    assert [row["admission_number"] for row in client.get(
+        '/transport/outstanding'
+    ).get_json()["students"]] == ["A2", "A1"]
+
+    response = client.post(
+        '/bus-payments', json={"student_id": near_rider.id, "amount": "1000"}
+    )
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["bus_balance"] == 0
+    assert body["bus_payment"]["term_id"] == term.id
+    assert body["bus_payment"]["destination_id"] == near_rider.destination_id
+    assert bus_balances() == {"A1": 0, "A2": 128800}
+    assert ledger_mismatches() == []
+
+    # Paid-up riders drop off the outstanding list straight away
+    assert [row["admission_number"] for row in client.get(
+        '/transport/outstanding'
+    ).get_json()["students"]] == ["A2"]
+
+    for body in (
+        {"student_id": far_rider.id, "amount": 0},
+        {"student_id": far_rider.id, "amount": "ten"},
+        {"student_id": 999, "amount": 100},
+        {"student_id": far_rider.id, "amount": 100, "term_id": 999},
+    ):
+        assert client.post('/bus-payments', json=body).status_code == 400
+    assert BusPayment.query.count() == 1
+
+
+def test_bulk_bus_payments(client):
+    term, _ = seed_riders()
+    csv = (
+        "admission_number,amount,date\n"
+        "A1,400,2026-02-01\n"
+        "A2,1288,\n"
+        "A1,100.50,2026-02-03T10:00:00\n"
+        "ZZ,100,\n"
+        "A2,-5,\n"
+    )
+    headers = {"Content-Type": "text/csv"}
+
+    atomic = client.post('/bus-payments/bulk?atomic=true', data=csv, headers=headers)
+    assert atomic.status_code == 400
+    assert atomic.get_json()["imported"] == 0
+    assert bus_balances() == {"A1": 100000, "A2": 128800}
+
+    response = client.post('/bus-payments/bulk', data=csv, headers=headers)
+    assert response.status_code == 201
+    body = response.get_json()
+    assert (body["imported"], body["failed"]) == (3, 2)
+    assert [result["line"] for result in body["results"] if not result["ok"]] == [4, 5]
+    assert bus_balances() == {"A1": 49950, "A2": 0}
+    assert ledger_mismatches() == []
+
+    totals = client.get(
+        f'/bus-payments/totals?by=destination&term_id={term.id}'
+    ).get_json()
+    assert {
+        (group["destination"], group["count"], group["total"])
+        for group in totals["groups"]
+    } == {("Sigor", 2, 500.5), ("Olesoi", 1, 1288.0)}
+    assert (totals["count"], totals["total"]) == (3, 1788.5)
@@ -0,0 +1,22 @@
+import pytest
+
+from app.cache import Cache
+
+
+@pytest.mark.parametrize("backend", ['memory', 'sqlite'])
+def test_load_racing_an_invalidation_is_not_served(app, tmp_path, backend):
+    from app.cache import create_backend
+
+    app.config.update(CACHE_BACKEND=backend, CACHE_PATH=str(tmp_path / "cache.sqlite3"))
+    app.extensions['cache'] = create_backend(app.config, app.instance_path)
+    cache = Cache('race')
+
+    def stale_load():
+        # Another worker writes and invalidates while this load is in flight
+        cache.invalidate()
+        return "stale"
+
+    assert cache.get_or_load('key', stale_load) == "stale"
+    assert cache.get('key') is None
+    assert cache.get_or_load('key', lambda: "fresh") == "fresh"
+    assert cache.get('key') == "fresh"
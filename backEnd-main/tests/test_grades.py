@@ -0,0 +1,33 @@
+from app.models import Grade, db
+
+
+def seed_chain():
+    grades = [Grade(name=name) for name in ("pp2", "1", "2")]
+    db.session.add_all(grades)
+    db.session.flush()
+    grades[0].next_grade_id = grades[1].id
+    grades[1].next_grade_id = grades[2].id
+    db.session.commit()
+    return grades
+
+
+def test_next_grade_may_not_loop_back(client):
+    pp2, one, two = seed_chain()
+
+    for grade, next_grade in ((two, pp2), (two, one), (one, one)):
+        response = client.put(
+            f'/grades/{grade.id}', json={"next_grade_id": next_grade.id}
+        )
+        assert response.status_code == 400
+
+    db.session.expire_all()
+    assert two.next_grade_id is None
+    assert one.next_grade_id == two.id
+
+
+def test_next_grade_can_skip_ahead(client):
+    pp2, _, two = seed_chain()
+
+    response = client.put(f'/grades/{pp2.id}', json={"next_grade_id": two.id})
+    assert response.status_code == 200
+    assert response.get_json()["grade"]["next_grade_id"] == two.id
@@ -0,0 +1,49 @@
+from app.http_cache import response_cache
+from app.models import BusDestination, Grade, db
+
+
+def test_unchanged_reference_data_is_answered_with_304(client):
+    db.session.add(Grade(name="Grade 1"))
+    db.session.commit()
+
+    first = client.get('/grades')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert 'no-cache' in first.headers['Cache-Control']
+    assert first.headers['Last-Modified']
+
+    not_modified = response_cache.stats()["not_modified"]
+    repeat = client.get('/grades', headers={"If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.data == b""
+    assert repeat.headers['ETag'] == etag
+    assert response_cache.stats()["not_modified"] == not_modified + 1
+
+    other = client.get('/grades', headers={"If-None-Match": '"something-else"'})
+    assert other.status_code == 200
+    assert other.data == first.data
+
+
+def test_a_write_retires_the_cached_body_and_its_etag(client):
+    db.session.add(Grade(name="Grade 1"))
+    db.session.commit()
+    etag = client.get('/grades').headers['ETag']
+
+    assert client.post('/grades', json={"name": "Grade 2"}).status_code == 201
+
+    response = client.get('/grades', headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [grade["grade"] for grade in response.get_json()] == ["Grade 1", "Grade 2"]
+
+
+def test_only_successful_bodies_are_cached(client):
+    missing = client.get('/destinations')
+    assert missing.status_code == 404
+    assert 'ETag' not in missing.headers
+
+    db.session.add(BusDestination(name="Sigor", charge=100000))
+    db.session.commit()
+    found = client.get('/destinations')
+    assert found.status_code == 200
+    assert [row["name"] for row in found.get_json()] == ["Sigor"]
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.ledger import BUS, FEES, balance_as_of, compact_ledger
+from app.models import BalanceSnapshot, Grade, LedgerEntry, Student, db
+
+START = datetime(2026, 1, 5, 8, 0)
+
+
+def seed_history(days=10):
+    """A student charged 1000 a day and paying 400 a day, plus one bus charge."""
+    grade = Grade(name="Grade 1")
+    db.session.add(grade)
+    db.session.flush()
+    student = Student(
+        name="A1",
+        admission_number="A1",
+        grade_id=grade.id,
+        phone="0700000000",
+        password="-",
+    )
+    db.session.add(student)
+    db.session.flush()
+    entries = [
+        LedgerEntry(
+            student_id=student.id, account=BUS, kind='charge', amount=50000,
+            posted_at=START,
+        )
+    ]
+    for day in range(days):
+        posted_at = START + timedelta(days=day)
+        entries += [
+            LedgerEntry(
+                student_id=student.id, account=FEES, kind='charge', amount=100000,
+                posted_at=posted_at,
+            ),
+            LedgerEntry(
+                student_id=student.id, account=FEES, kind='payment', amount=-40000,
+                posted_at=posted_at + timedelta(hours=1),
+            ),
+        ]
+    db.session.add_all(entries)
+    db.session.commit()
+    return student
+
+
+def owed(student, when):
+    result = balance_as_of(student.id, when)
+    return result["fees_owed"], result["bus_owed"]
+
+
+@pytest.mark.usefixtures('app')
+def test_balance_as_of_replays_entries_up_to_the_moment():
+    student = seed_history()
+
+    assert owed(student, START - timedelta(seconds=1)) == (0, 0)
+    assert owed(student, START) == (100000, 50000)
+    assert owed(student, START + timedelta(hours=1)) == (60000, 50000)
+    assert owed(student, START + timedelta(days=2, minutes=30)) == (220000, 50000)
+    assert owed(student, START + timedelta(days=30)) == (600000, 50000)
+    assert balance_as_of(student.id)["snapshot_id"] is None
+
+
+def test_compaction_bounds_the_replay_without_changing_answers(app):
+    student = seed_history()
+    moments = [START + timedelta(days=day, minutes=30) for day in range(-1, 12)]
+    before = [owed(student, when) for when in moments]
+
+    result = compact_ledger(max_replay=5)
+    assert result == {"max_replay": 5, "snapshots": 1, "entries_compacted": 21}
+    # Nothing new to compact until another five entries arrive
+    assert compact_ledger(max_replay=5)["snapshots"] == 0
+
+    assert [owed(student, when) for when in moments] == before
+    latest = balance_as_of(student.id, START + timedelta(days=30))
+    assert latest["snapshot_id"] is not None
+    assert latest["replayed_entries"] == 0
+    assert LedgerEntry.query.count() == 21
+
+    snapshot = BalanceSnapshot.query.one()
+    assert (snapshot.fees_owed, snapshot.bus_owed) == (600000, 50000)
+    app.config['LEDGER_SNAPSHOT_INTERVAL'] = 2
+    db.session.add(LedgerEntry(
+        student_id=student.id, account=FEES, kind='adjustment', amount=-1000,
+        posted_at=START + timedelta(days=20),
+    ))
+    db.session.add(LedgerEntry(
+        student_id=student.id, account=BUS, kind='payment', amount=-50000,
+        posted_at=START + timedelta(days=20),
+    ))
+    db.session.commit()
+    assert compact_ledger()["snapshots"] == 1
+    assert owed(student, START + timedelta(days=30)) == (599000, 0)
+    assert balance_as_of(student.id, START + timedelta(days=30))[
+        "replayed_entries"
+    ] == 0
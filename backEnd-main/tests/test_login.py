@@ -0,0 +1,42 @@
+from app.models import Grade, Staff, Student, db
+from app.passwords import hash_password
+
+
+def test_staff_login_when_name_matches_an_admission_number(app, client):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    grade = Grade(name="Grade 1")
+    db.session.add(grade)
+    db.session.flush()
+    db.session.add_all([
+        Student(
+            name="Kip",
+            admission_number="kip",
+            grade_id=grade.id,
+            phone="0700000000",
+            password=hash_password("student-pw"),
+        ),
+        Staff(
+            name="Kip",
+            phone="0700000000",
+            role="admin",
+            password=hash_password("staff-pw"),
+        ),
+    ])
+    db.session.commit()
+
+    staff = client.post('/login', json={"identifier": "Kip", "password": "staff-pw"})
+    assert staff.status_code == 200
+    assert staff.get_json()["role"] == "admin"
+
+    student = client.post(
+        '/login', json={"identifier": "Kip", "password": "student-pw"}
+    )
+    assert student.status_code == 200
+    assert student.get_json()["role"] == "student"
+
+    assert (
+        client.post(
+            '/login', json={"identifier": "Kip", "password": "wrong"}
+        ).status_code
+        == 401
+    )
@@ -0,0 +1,32 @@
+import pytest
+
+from app.money import from_cents, to_cents
+
+
+@pytest.mark.parametrize(
+    ("value", "cents"),
+    [
+        (6500, 650000),
+        ("1288", 128800),
+        (" 12.5 ", 1250),
+        (0.1 + 0.2, 30),
+        ("0.005", 1),
+        ("-0.005", -1),
+        (43.665, 4367),
+    ],
+)
+def test_shillings_become_whole_cents(value, cents):
+    assert to_cents(value) == cents
+    assert isinstance(to_cents(value), int)
+
+
+@pytest.mark.parametrize("value", ["", "abc", "nan", "inf", None, True, [1]])
+def test_non_numbers_are_rejected(value):
+    with pytest.raises(ValueError):
+        to_cents(value)
+
+
+def test_cents_round_trip_to_shillings():
+    assert from_cents(128850) == 1288.5
+    assert from_cents(None) is None
+    assert to_cents(from_cents(987654321)) == 987654321
@@ -0,0 +1,18 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app.passwords import needs_rehash
+
+
+@pytest.mark.parametrize(
+    "method", ['scrypt', 'scrypt:32768:8:1', 'pbkdf2:sha256', 'pbkdf2:sha256:600000']
+)
+def test_hash_made_with_configured_method_is_kept(app, method):
+    app.config['PASSWORD_HASH_METHOD'] = method
+    assert not needs_rehash(generate_password_hash("secret", method=method))
+
+
+def test_hash_with_other_parameters_is_upgraded(app):
+    app.config['PASSWORD_HASH_METHOD'] = 'scrypt'
+    assert needs_rehash(generate_password_hash("secret", method='pbkdf2:sha256:1000'))
+    assert needs_rehash(None)
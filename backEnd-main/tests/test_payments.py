@@ -0,0 +1,191 @@
+from datetime import date, timedelta
+
+import pytest
+import sqlalchemy as sa
+
+from app import create_app, payments
+from app.diagnostics import ScratchConfig
+from app.ledger import ledger_mismatches, record_entry
+from app.models import (
+    Grade,
+    LedgerEntry,
+    Payment,
+    PaymentDailyRollup,
+    Student,
+    Term,
+    db,
+)
+from app.payments import apply_payment, import_payments
+
+
+def seed_student():
+    today = date.today()
+    term = Term(
+        name="Term 1",
+        start_date=today - timedelta(days=30),
+        end_date=today + timedelta(days=30),
+    )
+    grade = Grade(name="Grade 1")
+    db.session.add_all([term, grade])
+    db.session.flush()
+    student = Student(
+        name="A1",
+        admission_number="A1",
+        grade_id=grade.id,
+        phone="0700000000",
+        balance=500000,
+        arrears=0,
+        prepayment=0,
+        password="-",
+    )
+    db.session.add(student)
+    db.session.commit()
+    return term, student
+
+
+def buckets():
+    return {
+        (row.date, row.count, row.total) for row in PaymentDailyRollup.query.all()
+    }
+
+
+def test_imported_payment_lands_in_the_school_local_day(client):
+    term, _ = seed_student()
+
+    # 22:00 UTC on 31 March is already 1 April in the school's timezone
+    result = import_payments([{
+        "admission_number": "A1",
+        "amount": "10",
+        "method": "Bank",
+        "term_id": term.id,
+        "date": "2026-03-31T22:00:00",
+    }])
+    assert result["imported"] == 1
+    assert buckets() == {(date(2026, 4, 1), 1, 1000)}
+
+    payment = Payment.query.one()
+    response = client.delete(f'/payments/{payment.id}')
+    assert response.status_code == 200
+    assert buckets() == set()
+
+
+def test_edits_and_deletes_keep_balance_ledger_and_rollup_in_step(client):
+    term, student = seed_student()
+    record_entry(student, 'charge', 500000, term_id=term.id)
+    db.session.commit()
+
+    def stored():
+        db.session.expire_all()
+        row = db.session.get(Student, student.id)
+        return row.balance, row.prepayment
+
+    posted = client.post('/payments', json={
+        "student_id": student.id, "amount": 2000, "method": "Cash", "term_id": term.id
+    })
+    payment_id = posted.get_json()["payment_id"]
+    assert stored() == (300000, 0)
+
+    assert client.put(
+        f'/payments/{payment_id}', json={"amount": 6000}
+    ).status_code == 200
+    assert stored() == (0, 100000)
+    assert {total for _, _, total in buckets()} == {600000}
+    assert ledger_mismatches() == []
+
+    assert client.put(
+        f'/payments/{payment_id}', json={"amount": 1000}
+    ).status_code == 200
+    assert stored() == (400000, 0)
+    assert {total for _, _, total in buckets()} == {100000}
+    assert ledger_mismatches() == []
+
+    assert client.delete(f'/payments/{payment_id}').status_code == 200
+    assert stored() == (500000, 0)
+    assert buckets() == set()
+    assert ledger_mismatches() == []
+    corrections = LedgerEntry.query.filter(
+        LedgerEntry.kind.in_(('payment_adjustment', 'payment_reversal'))
+    )
+    assert sorted((entry.kind, entry.amount) for entry in corrections) == [
+        ('payment_adjustment', -400000),
+        ('payment_adjustment', 500000),
+        ('payment_reversal', 100000),
+    ]
+    assert all(entry.payment_id is None for entry in LedgerEntry.query)
+
+
+def test_payment_edits_are_validated(client):
+    term, student = seed_student()
+    payment, _ = payments.post_payment(student.id, 1000, "Cash", term.id)
+
+    for body in ({"amount": 0}, {"amount": "ten"}, {"term_id": 999}):
+        assert client.put(f'/payments/{payment.id}', json=body).status_code == 400
+    assert client.put('/payments/999', json={"amount": 10}).status_code == 404
+    assert client.delete('/payments/999').status_code == 404
+    db.session.expire_all()
+    assert db.session.get(Payment, payment.id).amount == 100000
+
+
+def test_repeated_idempotency_key_returns_the_first_payment(client):
+    term, student = seed_student()
+    body = {
+        "student_id": student.id, "amount": 1500, "method": "Cash", "term_id": term.id
+    }
+    headers = {"Idempotency-Key": "receipt-0001"}
+
+    first = client.post('/payments', json=body, headers=headers)
+    second = client.post('/payments', json=body, headers=headers)
+
+    assert first.status_code == 201
+    assert second.status_code == 200
+    assert second.get_json()["payment_id"] == first.get_json()["payment_id"]
+    assert Payment.query.count() == 1
+    assert LedgerEntry.query.filter_by(kind='payment').count() == 1
+    db.session.expire_all()
+    assert db.session.get(Student, student.id).balance == 350000
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    # A file database, so a second connection can commit between the payment's
+    # read and its write the way another worker would
+    class FileConfig(ScratchConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'payments.db'}"
+
+    app = create_app(FileConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.mark.usefixtures('file_app')
+def test_post_payment_retries_after_a_concurrent_update(monkeypatch):
+    term, student = seed_student()
+    calls = []
+
+    def racing_apply_payment(account, amount):
+        calls.append(amount)
+        if len(calls) == 1:
+            # Another cashier posts 1000 and commits first
+            with db.engine.begin() as conn:
+                conn.execute(
+                    sa.update(Student)
+                    .where(Student.id == account.id)
+                    .values(
+                        balance=Student.balance - 100000, version=Student.version + 1
+                    )
+                )
+        apply_payment(account, amount)
+
+    monkeypatch.setattr(payments, 'apply_payment', racing_apply_payment)
+    payment, created = payments.post_payment(student.id, 1500, "Cash", term.id)
+
+    assert created
+    assert len(calls) == 2
+    assert Payment.query.count() == 1
+    db.session.expire_all()
+    # Both payments count: neither overwrote the other
+    assert db.session.get(Student, student.id).balance == 250000
+    assert payment.balance_after_payment == 250000
@@ -0,0 +1,98 @@
+import pytest
+
+from app import create_app, db
+from app.diagnostics import ScratchConfig
+from app.models import Grade
+from app.profiling import request_metrics
+
+TOKEN = "scrape-secret"
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    apps = []
+
+    def make(**settings):
+        config = type('ProfiledConfig', (ScratchConfig,), {
+            "PROFILING_ENABLED": True,
+            "PROFILE_SAMPLE_RATE": 0.0,
+            "PROFILE_SLOW_MS": 60_000,
+            "PROFILE_DIR": str(tmp_path / "profiles"),
+            "METRICS_TOKEN": TOKEN,
+            **settings,
+        })
+        app = create_app(config)
+        with app.app_context():
+            db.create_all()
+            db.session.add(Grade(name="Grade 1"))
+            db.session.commit()
+        apps.append(app)
+        return app
+
+    request_metrics.reset()
+    yield make
+    for app in apps:
+        with app.app_context():
+            db.drop_all()
+    request_metrics.reset()
+
+
+def scrape(client, token=TOKEN):
+    return client.get('/metrics', headers={"Authorization": f"Bearer {token}"})
+
+
+def test_metrics_require_the_token(make_app):
+    client = make_app().test_client()
+    client.get('/grades')
+
+    for headers in ({}, {"Authorization": "Bearer wrong"}, {"Authorization": TOKEN}):
+        response = client.get('/metrics', headers=headers)
+        assert response.status_code == 401
+        assert response.headers['WWW-Authenticate'] == "Bearer"
+
+    response = scrape(client)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert (
+        'http_requests_total{method="GET",endpoint="/grades",status="200"} 1' in text
+    )
+    route = '{method="GET",endpoint="/grades"}'
+    assert f'http_request_duration_seconds_count{route} 1' in text
+
+
+def test_metrics_are_not_served_without_a_token(make_app):
+    client = make_app(METRICS_TOKEN=None).test_client()
+    assert client.get('/metrics').status_code == 404
+    assert scrape(client).status_code == 404
+
+
+def test_responses_carry_server_timing(make_app):
+    response = make_app().test_client().get('/grades')
+
+    timing = response.headers['Server-Timing']
+    assert timing.startswith("app;dur=")
+    assert 'db;dur=' in timing and 'queries"' in timing
+    assert response.headers['Timing-Allow-Origin'] == '*'
+
+
+def test_slow_sampled_requests_keep_their_newest_profiles(make_app, tmp_path):
+    client = make_app(
+        PROFILE_SAMPLE_RATE=1.0, PROFILE_SLOW_MS=0, PROFILE_KEEP=2
+    ).test_client()
+
+    for _ in range(3):
+        assert client.get('/grades').status_code == 200
+
+    saved = sorted(path.name for path in (tmp_path / "profiles").glob('*.prof'))
+    assert len(saved) == 2
+    assert all("GET_grades" in name for name in saved)
+    text = scrape(client).get_data(as_text=True)
+    assert "http_request_profiles_total 3" in text
+    assert 'http_slow_requests_total{method="GET",endpoint="/grades"} 3' in text
+
+
+def test_profiling_off_by_default(app, client):
+    assert not app.config['PROFILING_ENABLED']
+    assert 'Server-Timing' not in client.get('/grades').headers
+    assert client.get('/metrics').status_code == 404
@@ -0,0 +1,8 @@
+from app.diagnostics import LIST_ENDPOINTS, check_query_scaling
+
+
+def test_list_endpoints_do_not_query_per_row():
+    counts, growing = check_query_scaling(sizes=(10, 50))
+
+    assert set(counts) == set(LIST_ENDPOINTS)
+    assert growing == [], counts
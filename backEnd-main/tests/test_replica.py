@@ -0,0 +1,82 @@
+import pytest
+import sqlalchemy as sa
+from flask import g
+
+from app import create_app
+from app.diagnostics import ScratchConfig
+from app.models import Grade, Student, db
+from app.replica import REPLICA
+
+
+def add_student(session, admission_number):
+    grade = Grade(name="Grade 1")
+    session.add(grade)
+    session.flush()
+    session.add(Student(
+        id=1,
+        name=f"Student {admission_number}",
+        admission_number=admission_number,
+        grade_id=grade.id,
+        phone="0700000000",
+        password="-",
+    ))
+    session.commit()
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    # Two files standing in for a primary and its replica, holding different
+    # rows so each query shows which one answered
+    class ReplicaConfig(ScratchConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+        DATABASE_REPLICA_URL = f"sqlite:///{tmp_path / 'replica.db'}"
+
+    app = create_app(ReplicaConfig)
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines[REPLICA])
+        add_student(db.session, "P1")
+        with sa.orm.Session(db.engines[REPLICA]) as session:
+            add_student(session, "R1")
+    # Requests get an app context (and g) of their own, as in production
+    yield app
+    with app.app_context():
+        db.drop_all()
+        db.metadata.drop_all(db.engines[REPLICA])
+
+
+def listed(client):
+    response = client.get('/students?fields=admission_number')
+    return [row["admission_number"] for row in response.get_json()]
+
+
+def test_report_views_read_from_the_replica(replica_app):
+    client = replica_app.test_client()
+
+    assert listed(client) == ["R1"]
+    # Views without replica_reads keep reading the primary
+    statement = client.get('/students/1/statement').get_data(as_text=True)
+    assert "Student P1" in statement
+
+
+def test_writes_and_raw_sql_stay_on_the_primary(replica_app):
+    with replica_app.test_request_context():
+        g._use_replica = True
+        assert db.session.scalars(sa.select(Student.admission_number)).all() == ["R1"]
+        assert db.session.execute(
+            sa.text("SELECT admission_number FROM student")
+        ).scalars().all() == ["P1"]
+        db.session.execute(sa.update(Student).values(phone="0711111111"))
+        db.session.commit()
+
+        phones = {}
+        for name, engine in (("primary", db.engine), ("replica", db.engines[REPLICA])):
+            with engine.connect() as conn:
+                phones[name] = conn.scalar(sa.text("SELECT phone FROM student"))
+    assert phones == {"primary": "0711111111", "replica": "0700000000"}
+
+
+def test_without_a_replica_everything_reads_the_primary(client):
+    # Runs after the replica apps above: their bind must not leak into this one
+    add_student(db.session, "P1")
+    assert listed(client) == ["P1"]
@@ -0,0 +1,66 @@
+from datetime import date, datetime, timedelta
+
+from app.models import Grade, Payment, Student, Term, db
+from app.reports import payment_totals
+from app.rollup import add_payment_to_rollup, rebuild_rollup
+
+
+def seed_payments():
+    today = date.today()
+    term = Term(
+        name="Term 1",
+        start_date=today - timedelta(days=30),
+        end_date=today + timedelta(days=30),
+    )
+    grade = Grade(name="Grade 1")
+    db.session.add_all([term, grade])
+    db.session.flush()
+    student = Student(
+        name="A1",
+        admission_number="A1",
+        grade_id=grade.id,
+        phone="0700000000",
+        password="-",
+    )
+    db.session.add(student)
+    db.session.flush()
+    # Either side of midnight in EAT (21:00 UTC), and of the UTC month end
+    for when, amount in (
+        (datetime(2026, 3, 31, 20, 30), 1000),
+        (datetime(2026, 3, 31, 21, 30), 2000),
+        (datetime(2026, 4, 1, 9, 0), 4000),
+    ):
+        payment = Payment(
+            student_id=student.id,
+            amount=amount,
+            date=when,
+            method="cash",
+            term_id=term.id,
+            grade_id=grade.id,
+            balance_after_payment=0,
+        )
+        db.session.add(payment)
+        add_payment_to_rollup(payment)
+    db.session.commit()
+
+
+def test_school_timezone_reports_match_payment_scan(app):
+    app.config['SCHOOL_TZ_OFFSET_MINUTES'] = 180
+    seed_payments()
+
+    from_rollup = payment_totals(["day"], tz_offset_minutes=180)
+    assert from_rollup == [
+        {"day": "2026-03-31", "count": 1, "total": 1000},
+        {"day": "2026-04-01", "count": 2, "total": 6000},
+    ]
+    assert payment_totals(["month"], tz_offset_minutes=180) == [
+        {"month": "2026-03", "count": 1, "total": 1000},
+        {"month": "2026-04", "count": 2, "total": 6000},
+    ]
+
+    # The same report computed from the payment table, and after rebuilding the rollup
+    app.config['SCHOOL_TZ_OFFSET_MINUTES'] = 0
+    assert payment_totals(["day"], tz_offset_minutes=180) == from_rollup
+    app.config['SCHOOL_TZ_OFFSET_MINUTES'] = 180
+    rebuild_rollup()
+    assert payment_totals(["day"], tz_offset_minutes=180) == from_rollup
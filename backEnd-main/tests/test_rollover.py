@@ -0,0 +1,98 @@
+from datetime import date, timedelta
+
+from app.ledger import FEES
+from app.models import Fee, Grade, LedgerEntry, Student, Term, db
+
+
+def seed_terms():
+    today = date.today()
+    ending = Term(
+        name="Term 1",
+        start_date=today - timedelta(days=100),
+        end_date=today - timedelta(days=10),
+    )
+    following = Term(
+        name="Term 2",
+        start_date=today - timedelta(days=5),
+        end_date=today + timedelta(days=80),
+    )
+    grade = Grade(name="Grade 1")
+    db.session.add_all([ending, following, grade])
+    db.session.flush()
+    db.session.add(Fee(term_id=following.id, grade_id=grade.id, amount=200000))
+    return ending, following, grade
+
+
+def add_student(grade, admission_number, balance, arrears=0):
+    student = Student(
+        name=admission_number,
+        admission_number=admission_number,
+        grade_id=grade.id,
+        phone="0700000000",
+        balance=balance,
+        arrears=arrears,
+        prepayment=0,
+        password="-",
+    )
+    db.session.add(student)
+    return student
+
+
+def balances():
+    return {
+        s.admission_number: (s.balance, s.arrears, s.prepayment)
+        for s in Student.query.order_by(Student.id)
+    }
+
+
+def test_second_rollover_changes_nothing(client):
+    _, following, grade = seed_terms()
+    add_student(grade, "A1", balance=150000)
+    add_student(grade, "A2", balance=300000, arrears=0)
+    # Admitted straight into the next term: already charged its fee
+    admitted = add_student(grade, "A3", balance=200000)
+    db.session.flush()
+    db.session.add(
+        LedgerEntry(
+            student_id=admitted.id,
+            account=FEES,
+            kind='charge',
+            amount=200000,
+            term_id=following.id,
+            description="Term fees",
+        )
+    )
+    db.session.commit()
+
+    first = client.post('/process-rollover')
+    assert first.status_code == 200
+    assert first.get_json()["rows_updated"] == 2
+    after_first = balances()
+    assert after_first["A1"] == (200000, 150000, 0)
+    assert after_first["A2"] == (200000, 300000, 0)
+    assert after_first["A3"] == (200000, 0, 0)
+
+    second = client.post('/process-rollover')
+    assert second.status_code == 200
+    assert second.get_json()["rows_updated"] == 0
+    db.session.expire_all()
+    assert balances() == after_first
+    assert LedgerEntry.query.filter_by(kind='rollover').count() == 2
+
+
+def test_dry_run_flag_sent_as_a_string(client):
+    _, _, grade = seed_terms()
+    add_student(grade, "A1", balance=150000)
+    db.session.commit()
+
+    dry = client.post('/process-rollover', json={"dry_run": "true"})
+    assert dry.status_code == 200
+    assert dry.get_json()["message"] == "Term rollover dry run completed"
+    db.session.expire_all()
+    assert balances()["A1"] == (150000, 0, 0)
+
+    real = client.post('/process-rollover', json={"dry_run": "false"})
+    assert real.status_code == 200
+    assert real.get_json()["message"] == "Term rollover processed successfully"
+    db.session.expire_all()
+    assert balances()["A1"] == (200000, 150000, 0)
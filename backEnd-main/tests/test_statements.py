@@ -0,0 +1,99 @@
+import io
+import zipfile
+from datetime import date, timedelta
+
+import pytest
+
+from app import payments, statements
+from app.ledger import record_entry
+from app.models import Grade, Student, Term, db
+from app.statements import generate_statements, load_statement_data
+
+
+def seed_school():
+    today = date.today()
+    term = Term(
+        name="Term 1",
+        start_date=today - timedelta(days=30),
+        end_date=today + timedelta(days=30),
+    )
+    grades = [Grade(name="Grade 1"), Grade(name="Grade 2")]
+    db.session.add_all([term, *grades])
+    db.session.flush()
+    students = [
+        Student(
+            name=f"Student {number}",
+            admission_number=number,
+            grade_id=grade.id,
+            phone="0700000000",
+            balance=500000,
+            arrears=20000,
+            prepayment=0,
+            password="-",
+        )
+        for grade, number in ((grades[0], "A1"), (grades[0], "A2"), (grades[1], "B1"))
+    ]
+    db.session.add_all(students)
+    db.session.flush()
+    for student in students:
+        record_entry(student, 'opening', 20000)
+        record_entry(student, 'charge', 500000, term_id=term.id)
+    db.session.commit()
+    return term, grades, students
+
+
+@pytest.mark.usefixtures('app')
+def test_statement_data_separates_charges_from_payments():
+    term, grades, (first, *_) = seed_school()
+    payment, _ = payments.post_payment(first.id, 1000, "Cash", term.id)
+    # An edited payment shows at its new amount and leaves the charge alone
+    payments.revise_payment(payment.id, {"amount": 3000})
+    payments.post_payment(first.id, 500, "Bank", term.id)
+
+    data = {row["admission_number"]: row for row in load_statement_data(grades[0].id)}
+    assert list(data) == ["A1", "A2"]
+    (statement_term,) = data["A1"]["terms"]
+    assert data["A1"]["brought_forward"] == 20000
+    assert statement_term["charged"] == 500000
+    assert [p["amount"] for p in statement_term["payments"]] == [300000, 50000]
+    assert statement_term["paid"] == 350000
+    assert data["A1"]["balance"] == 170000
+
+
+def test_single_statement_route(client):
+    _, _, (first, *_) = seed_school()
+
+    response = client.get(f'/students/{first.id}/statement')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/html'
+    html = response.get_data(as_text=True)
+    assert "Student A1" in html
+    assert "5,000.00" in html
+    assert client.get('/students/999/statement').status_code == 404
+
+
+@pytest.mark.usefixtures('app')
+def test_statements_are_written_per_grade(tmp_path):
+    seed_school()
+
+    result = generate_statements(str(tmp_path))
+    assert (result["grades"], result["statements"]) == (2, 3)
+    written = sorted(
+        str(path.relative_to(tmp_path)) for path in tmp_path.rglob('*.html')
+    )
+    assert written == ["Grade_1/A1.html", "Grade_1/A2.html", "Grade_2/B1.html"]
+
+
+def test_statements_route_renders_in_process(client, monkeypatch):
+    _, grades, _ = seed_school()
+    monkeypatch.setattr(statements, 'POOL_THRESHOLD', 0)
+
+    def no_pool(*_args, **_kwargs):
+        raise AssertionError("process pool started inside a request")
+
+    monkeypatch.setattr(statements, 'ProcessPoolExecutor', no_pool)
+    response = client.get(f'/statements?grade_id={grades[1].id}')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert archive.namelist() == ["Grade_2/B1.html"]
@@ -0,0 +1,50 @@
+from datetime import date, timedelta
+
+from app.models import Fee, Grade, Student, Term, db
+from app.students import POOL_THRESHOLD
+
+
+def seed_grade():
+    today = date.today()
+    term = Term(
+        name="Term 1",
+        start_date=today - timedelta(days=30),
+        end_date=today + timedelta(days=30),
+    )
+    grade = Grade(name="Grade 1")
+    db.session.add_all([term, grade])
+    db.session.flush()
+    db.session.add(Fee(term_id=term.id, grade_id=grade.id, amount=200000))
+    db.session.commit()
+    return grade
+
+
+def test_default_passwords_get_the_intake_hash_until_first_login(app, client):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    grade = seed_grade()
+    rows = [
+        {"name": f"S{n}", "admission_number": f"S{n}", "phone": "0700000000",
+         "grade_id": grade.id}
+        for n in range(POOL_THRESHOLD + 8)
+    ]
+    rows[0]["password"] = "chosen-pw"
+
+    response = client.post('/students/bulk', json=rows)
+    assert response.status_code == 201
+    assert response.get_json()["imported"] == len(rows)
+
+    hashes = dict(db.session.query(Student.admission_number, Student.password))
+    assert hashes["S0"].startswith('pbkdf2:sha256:2000$')
+    assert all(
+        hashes[row["admission_number"]].startswith('pbkdf2:sha256:1000$')
+        for row in rows[1:]
+    )
+
+    login = client.post('/login', json={"identifier": "S1", "password": "S1"})
+    assert login.status_code == 200
+    db.session.expire_all()
+    upgraded = Student.query.filter_by(admission_number="S1").one().password
+    assert upgraded.startswith('pbkdf2:sha256:2000$')
+    assert client.post(
+        '/login', json={"identifier": "S0", "password": "chosen-pw"}
+    ).status_code == 200
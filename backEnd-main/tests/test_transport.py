@@ -0,0 +1,95 @@
+from datetime import date, timedelta
+
+from app.ledger import BUS
+from app.models import BusDestination, Grade, LedgerEntry, Student, Term, db
+
+
+def seed_riders():
+    today = date.today()
+    term = Term(
+        name="Term 1",
+        start_date=today - timedelta(days=30),
+        end_date=today + timedelta(days=30),
+    )
+    grade = Grade(name="Grade 1")
+    near = BusDestination(name="Sigor", charge=100000)
+    far = BusDestination(name="Olesoi", charge=128800)
+    db.session.add_all([term, grade, near, far])
+    db.session.flush()
+
+    def student(number, destination, use_bus=True, is_archived=False):
+        return Student(
+            name=number,
+            admission_number=number,
+            grade_id=grade.id,
+            phone="0700000000",
+            use_bus=use_bus,
+            destination_id=destination.id if destination else None,
+            is_archived=is_archived,
+            bus_balance=0,
+            password="-",
+        )
+
+    db.session.add_all([
+        student("A1", near),
+        student("A2", far),
+        student("A3", far),
+        student("A4", near, use_bus=False),
+        student("A5", far, is_archived=True),
+        student("A6", None, use_bus=False),
+    ])
+    db.session.commit()
+    return term
+
+
+def bus_balances():
+    db.session.expire_all()
+    return {
+        student.admission_number: student.bus_balance
+        for student in Student.query.order_by(Student.admission_number)
+    }
+
+
+def test_dry_run_sent_as_a_string_is_honoured(client):
+    term = seed_riders()
+
+    response = client.post(
+        '/transport/bill', json={"term_id": term.id, "dry_run": "true"}
+    )
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["dry_run"] is True
+    assert [
+        (row["destination"], row["students"], row["total"])
+        for row in body["destinations"]
+    ] == [("Olesoi", 2, 2576), ("Sigor", 1, 1000)]
+    assert set(bus_balances().values()) == {0}
+    assert LedgerEntry.query.count() == 0
+
+    # "false" is a non-empty string, but it must not mean a dry run
+    response = client.post(
+        '/transport/bill', json={"term_id": term.id, "dry_run": "false"}
+    )
+    assert response.get_json()["dry_run"] is False
+    assert response.get_json()["students_billed"] == 3
+
+
+def test_billing_charges_each_rider_once_per_term(client):
+    term = seed_riders()
+
+    first = client.post('/transport/bill?dry_run=no', json={"term_id": term.id})
+    assert first.status_code == 200
+    assert first.get_json()["students_billed"] == 3
+    expected = {
+        "A1": 100000, "A2": 128800, "A3": 128800, "A4": 0, "A5": 0, "A6": 0
+    }
+    assert bus_balances() == expected
+    entries = LedgerEntry.query.filter_by(account=BUS, kind='charge', term_id=term.id)
+    assert sorted(entry.amount for entry in entries) == [100000, 128800, 128800]
+
+    again = client.post('/transport/bill', json={"term_id": term.id})
+    assert again.get_json()["students_billed"] == 0
+    assert again.get_json()["destinations"] == []
+    assert bus_balances() == expected
+
+    assert client.post('/transport/bill', json={"term_id": 999}).status_code == 404
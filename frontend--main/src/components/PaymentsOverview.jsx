@@ -2,27 +2,25 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 
 const PaymentsOverview = () => {
-    const [payments, setPayments] = useState([]);
+    const [dailyTotals, setDailyTotals] = useState([]);
     const [monthlyTotals, setMonthlyTotals] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState('');
 
     useEffect(() => {
-        const fetchPayments = async () => {
+        const fetchTotals = async () => {
             setLoading(true);
             setError(''); // Reset error message before fetching
 
             try {
-                const response = await axios.get('/api/payments');
-                setPayments(response.data);
-
-                // Calculate total payments per month
-                const totals = response.data.reduce((acc, payment) => {
-                    const month = new Date(payment.date).toLocaleString('default', { month: 'short', year: 'numeric' });
-                    acc[month] = (acc[month] || 0) + payment.amount;
-                    return acc;
-                }, {});
-                setMonthlyTotals(Object.entries(totals).map(([month, total]) => ({ month, total })));
+                // Totals are grouped on the server in the browser's time zone
+                const tz_offset = -new Date().getTimezoneOffset();
+                const [dayResponse, monthResponse] = await Promise.all([
+                    axios.get('/api/payments/summary', { params: { by: 'day', tz_offset } }),
+                    axios.get('/api/payments/summary', { params: { by: 'month', tz_offset } }),
+                ]);
+                setDailyTotals(dayResponse.data.groups);
+                setMonthlyTotals(monthResponse.data.groups);
             } catch (error) {
                 console.error('Error fetching payments', error);
                 setError('Failed to load payments. Please try again later.');
@@ -31,7 +29,7 @@ const PaymentsOverview = () => {
             }
         };
 
-        fetchPayments();
+        fetchTotals();
     }, []);
 
     if (loading) {
@@ -51,10 +49,10 @@ const PaymentsOverview = () => {
                     </tr>
                 </thead>
                 <tbody>
-                    {payments.map(payment => (
-                        <tr key={payment.id}>
-                            <td>{new Date(payment.date).toLocaleDateString()}</td>
-                            <td>{payment.amount.toFixed(2)}</td>
+                    {dailyTotals.map(({ day, total }) => (
+                        <tr key={day}>
+                            <td>{new Date(day).toLocaleDateString()}</td>
+                            <td>{total.toFixed(2)}</td>
                         </tr>
                     ))}
                 </tbody>
@@ -5,26 +5,30 @@ import Header from './Header';
 import { useNavigate } from "react-router-dom";
 const StudentList = ({ role, onSelectStudent }) => {
   const [students, setStudents] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [error, setError] = useState(null);
   const navigate = useNavigate();
 
-  useEffect(() => {
-    const fetchStudents = async () => {
-      try {
-        let url = "https://7f47d908-dbee-420b-bbaa-bb243aa6b89a-00-3i21golrk2i7y.spock.replit.dev:5000/students"; // Default for Admin & Bursar
-
-        if (role === "teacher") {
-          const staffId = localStorage.getItem("staffId"); // Assuming staffId is stored after login
-          url = `https://7f47d908-dbee-420b-bbaa-bb243aa6b89a-00-3i21golrk2i7y.spock.replit.dev:5000/staff/${staffId}/students`;
-        }
+  const fetchStudents = async (after = null) => {
+    try {
+      let url = "https://7f47d908-dbee-420b-bbaa-bb243aa6b89a-00-3i21golrk2i7y.spock.replit.dev:5000/students"; // Default for Admin & Bursar
 
-        const response = await axios.get(url);
-        setStudents(response.data);
-      } catch (err) {
-        console.error(err);
-        setError("Failed to fetch students. Please try again.");
+      if (role === "teacher") {
+        const staffId = localStorage.getItem("staffId"); // Assuming staffId is stored after login
+        url = `https://7f47d908-dbee-420b-bbaa-bb243aa6b89a-00-3i21golrk2i7y.spock.replit.dev:5000/staff/${staffId}/students`;
       }
-    };
+
+      // The list is paginated; the server returns the next page's cursor in a header
+      const response = await axios.get(url, { params: after ? { after } : {} });
+      setStudents((current) => (after ? [...current, ...response.data] : response.data));
+      setNextCursor(response.headers["x-next-cursor"] || null);
+    } catch (err) {
+      console.error(err);
+      setError("Failed to fetch students. Please try again.");
+    }
+  };
+
+  useEffect(() => {
     fetchStudents();
   }, [role]);
   const handleAddStudent = () => {
@@ -58,6 +62,11 @@ const StudentList = ({ role, onSelectStudent }) => {
 ))}
 
       </div>
+      {nextCursor && (
+        <button className="add-student-btn" onClick={() => fetchStudents(nextCursor)}>
+          Load more
+        </button>
+      )}
     </div>
   );
 };